@@ -10,10 +10,17 @@
 #          project. If both the user AND the project are new to the Domain
 #           EVERYTHING will be created
 #          Warning - Don't lose the passwords - they are NOT written anywhere
-#           other then the console
+#           other then the console and the batch results file
+#          Completed steps are checkpointed (see k5Checkpoints.py) so a
+#           failed user or batch can simply be run again
+#          Names are resolved from the local inventory (see k5Inventory.py)
+#           where it is fresh, and new objects are added to it
 #          Command line parameters -
 #          -u user_email_address
 #          -p project_name
+#          or
+#          -f batch_file [-o results_file] [-w workers]
+#          -c forgets the checkpoints of the user/project or batch first
 
 #
 # Prerequisites: k5contractsettings.py & k5APIwrappers.py files in the same
@@ -35,19 +42,26 @@
 from random import choice
 
 from k5APIwrappersV19 import (
-                        get_itemid,
                         add_new_user,
-                        get_keystoneobject_list,
                         assign_role_to_group_and_project,
                         assign_user_to_group,
                         assign_role_to_user_and_project,
-                        get_re_unscoped_token,
                         create_new_group,
                         create_new_project
                         )
+from k5Resolver import resolve_id, prime
+from k5Parallel import parallel_map
+from k5Waiters import retry_until, keystone_probe, all_of
+from k5Checkpoints import Checkpoint
+import k5Checkpoints
+import k5Inventory
+import k5TokenCache
+import csv
 import getopt
+import json
+import os
 import string
-from time import sleep
+import sys
 
 
 def get_password():
@@ -80,518 +94,747 @@ def breakdown_user_from_email(useremail):
     return (firstname, surname, username, useremail, password, status)
 
 
-def adduser_to_K5(idtoken, globaltoken, regionaltoken, contractid, contract,
-                  region, email, userProject):
-    """Summary
+def assigned(result):
+    """Summary - true if a keystone role or group assignment call worked
+
+    Args:
+        result (TYPE): response from one of the assign_* wrappers
+
+    Returns:
+        bool: True for a 204 response
+    """
+    return getattr(result, 'status_code', None) == 204
+
+
+def report_status(progress, userProject, status):
+    """Summary - print an onboarding status line and pass it on to the
+    progress callback, if there is one
+
+    Args:
+        progress (function): None or callback taking (userProject, status)
+        userProject (TYPE): project the status applies to
+        status (TYPE): 'Step N - ...' status string
+    """
+    print status
+    if progress is not None:
+        progress(userProject, status)
+
+
+def use_inventory(regionaltoken, region, contractid, sync=False):
+    """Summary - resolve names from the local inventory instead of
+    keystone. Object types the inventory hasn't synced recently are left
+    to keystone lookups, or re-synced first when sync is set
+
+    Args:
+        regionaltoken (TYPE): Description
+        region (TYPE): Description
+        contractid (TYPE): Description
+        sync (bool): incrementally re-sync stale object types first
+
+    Returns:
+        list: object types loaded from the inventory
+    """
+    try:
+        if sync:
+            k5Inventory.sync(regionaltoken, region, contractid,
+                             k5Inventory.OBJECT_TYPES,
+                             k5Inventory.inventory_max_age)
+        return k5Inventory.seed_resolver(region, contractid)
+    except Exception:
+        # no usable inventory - every name is looked up in keystone
+        return []
+
+
+def update_inventory(regionaltoken, region, contractid, objecttype, name):
+    """Summary - add a newly created object to the local inventory and
+    reload that object type into the resolver, whose index the create
+    wrappers clear
+
+    Args:
+        regionaltoken (TYPE): Description
+        region (TYPE): Description
+        contractid (TYPE): Description
+        objecttype (TYPE): users/projects/groups
+        name (TYPE): name of the new object
+    """
+    try:
+        k5Inventory.refresh(regionaltoken, region, contractid, objecttype,
+                            name)
+        k5Inventory.seed_resolver(region, contractid, [objecttype])
+    except Exception:
+        # the inventory catches up at its next sync
+        pass
+
+
+def add_user_to_portal(idtoken, regionaltoken, contractid, contract,
+                       region, email, userProject, progress=None):
+    """Summary - Steps 1 to 9 - make sure the user exists in the central
+    portal and, for a new user, is a _member_ of the default project.
+    This is the shared part of onboarding and only needs to run once per
+    user however many projects they're added to. Completed steps are
+    checkpointed so a re-run skips them.
 
     Args:
         idtoken (TYPE): Description
-        globaltoken (TYPE): Description
         regionaltoken (TYPE): Description
         contractid (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
         email (TYPE): Description
         userProject (TYPE): Description
+        progress (function): optional progress callback, see report_status
 
     Returns:
-        TYPE: Description
+        tuple: (userDetails, userStatus) - userStatus is True if the
+        user is ready to be added to projects
     """
-    UserStatusReport = {}
-    userCounter = 0
+    checkpoint = Checkpoint(contractid, region, email=email)
     userDetails = breakdown_user_from_email(email)
-    newuserid = get_itemid(get_keystoneobject_list(
-        regionaltoken, region, contractid, 'users'), userDetails[2], 'users')
-
-    # Check new user login is available, if not try adding '1' to it and
-    # testing again, repeat one more time for '2' before failing the user
-    userStatus = False
     status = 'Step 1 - Initialise ...'
-    UserStatusReport[email] = status, userDetails, userProject
-    userDetails = (userDetails[0], userDetails[1], userDetails[2],
-                   userDetails[3], userDetails[4], status)
-    print status
+    userDetails = set_status(userDetails, status)
+    report_status(progress, userProject, status)
 
-    # if the username already exist warn and carry on
-    if (newuserid != 'None'):
-        userStatus = True
+    portalUser = checkpoint.done('portal_user')
+    if portalUser is None:
+        newuserid = resolve_id(
+            regionaltoken, region, contractid, 'users', userDetails[2])
+
+        # if the username already exist warn and carry on
+        if (newuserid != 'None'):
+            portalUser = 'existing'
+        else:
+            # make rest api call to add new user
+            print "\n\nDEBUG : Adding New User - \n\n", idtoken, contractid, region, userDetails
+            result = add_new_user(idtoken, contractid, region, userDetails)
+            print "\n\nDEBUG : Result \n\n"
+
+            # if the add new user api call failed report and exit
+            if getattr(result, 'status_code', None) != 200:
+                status = 'Step 4 - Failed to Add User to Portal - Error, STOP!'
+                userDetails = set_status(userDetails, status)
+                report_status(progress, userProject, status)
+                return userDetails, False
+
+            portalUser = 'created'
+            status = 'Step 3 - User Added to Portal - continue ...'
+            userDetails = set_status(userDetails, status)
+            report_status(progress, userProject, status)
+        checkpoint.record('portal_user', portalUser)
+    elif portalUser == 'created':
+        # the password was only reported by the run that created the user
+        userDetails = (userDetails[0], userDetails[1],
+                       userDetails[2], userDetails[3],
+                       "PasswordIssuedInEarlierRun", userDetails[5])
+
+    if portalUser == 'existing':
         status = 'Step 2 - User Login name already exists - Will add existing User to Project ...'
         userDetails = (userDetails[0], userDetails[1],
                        userDetails[2], userDetails[3],
                        "ExistingUserAddedToProject", status)
-        UserStatusReport[email] = status, userDetails, userProject
-        print status
+        report_status(progress, userProject, status)
+        return userDetails, True
+
+    # Assign _member_ role to user in default project
+    if checkpoint.done('default_member') is None:
+        # generate the default project name from the contract name
+        defaultProject = contract + '-prj'
+
+        defaultProjectid = resolve_id(
+            regionaltoken, region, contractid, 'projects', defaultProject)
+
+        # Unable to locate default project
+        if (defaultProjectid == 'None'):
+            status = 'Step 8 - Unable to locate default -prj project - stop and check contract details supplied...'
+            userDetails = set_status(userDetails, status)
+            report_status(progress, userProject, status)
+            return userDetails, False
+
+        retry_status = 'Step 5 - User details not synced to IaaS portal - waiting for sync - retry ...'
+
+        # wait for the new user to sychronise from the central portal to
+        # the K5 IaaS regional portal, only retrying the role assignment
+        # once the user is visible regionally
+        result = retry_until(
+            lambda: assign_role_to_user_and_project(
+                regionaltoken, contractid, region, userDetails[2],
+                defaultProject, '_member_'),
+            assigned,
+            probe=keystone_probe(regionaltoken, region, contractid,
+                                 'users', userDetails[2]),
+            on_retry=lambda attempt: report_status(
+                progress, userProject, retry_status))
+
+        # if unable to assign user to default project report and exit
+        if not assigned(result):
+            status = 'Step 7 - Unable to  Assign User Member Role - Error, STOP!'
+            userDetails = set_status(userDetails, status)
+            report_status(progress, userProject, status)
+            return userDetails, False
+        checkpoint.record('default_member')
+        # the new user is visible regionally now
+        update_inventory(regionaltoken, region, contractid, 'users',
+                         userDetails[2])
+
+    # the user was successfully assigned the _member_ role in the default
+    # project, continue
+    status = 'Step 6 - User Assigned Member Role - continue ...'
+    userDetails = set_status(userDetails, status)
+    report_status(progress, userProject, status)
+    return userDetails, True
+
+
+def set_status(userDetails, status):
+    """Summary - copy of the userDetails tuple with a new status
 
-    # if the user name does not exist add the new user
-    else:
+    Args:
+        userDetails (TYPE): (firstname, surname, username, email, password,
+        status) tuple
+        status (TYPE): new status string
 
-        # make rest api call to add new user
-        print "\n\nDEBUG : Adding New User - \n\n", idtoken, contractid, region, userDetails
-        result = add_new_user(idtoken, contractid, region, userDetails)
-        print "\n\nDEBUG : Result \n\n"
+    Returns:
+        TYPE: updated userDetails tuple
+    """
+    return (userDetails[0], userDetails[1],
+            userDetails[2], userDetails[3],
+            userDetails[4], status)
 
-        # if the result from the above call is successful
-        if result.status_code == 200:
-            userStatus = True
-            status = 'Step 3 - User Added to Portal - continue ...'
-            UserStatusReport[email] = status, userDetails, userProject
-            userDetails = (userDetails[0], userDetails[1],
-                           userDetails[2], userDetails[3],
-                           userDetails[4], status)
-            print status
 
-        # if the add new user api call failed report and exit
-        else:
-            userStatus = False
-            status = 'Step 4 - Failed to Add User to Portal - Error, STOP!'
-            UserStatusReport[email] = status, userDetails, userProject
-            userDetails = (userDetails[0], userDetails[1],
-                           userDetails[2], userDetails[3],
-                           userDetails[4], status)
-            print status
-            return userDetails
+def prepare_project(globaltoken, regionaltoken, contractid, region,
+                    userProject, progress=None):
+    """Summary - Steps 10 to 23 - make sure the project exists and has an
+    _Admin group holding the cpf_systemowner role on it. Only needs to
+    run once per project however many users are added to it. Completed
+    steps are checkpointed so a re-run skips them.
 
-        # Assign _member_ role to user in default project
-        # if user has been added to authentication portal successfully
-        if userStatus:
-            # generate the default project name from the contract name
-            defaultProject = contract + '-prj'
-
-            defaultProjectid = get_itemid(get_keystoneobject_list(
-                regionaltoken, region, contractid, 'projects'), defaultProject, 'projects')
-            if (defaultProjectid != 'None'):
-                result = assign_role_to_user_and_project(
-                    regionaltoken, contractid, region, userDetails[2], defaultProject, '_member_')
-                portal_sync_delay = 0
-
-                # added a retry/delay routine here to allow sychronisation time
-                # between central portal and K5 IaaS regional portal
-                while (portal_sync_delay < 4) and (result.status_code != 204):
-                    sleep(5)
-                    result = assign_role_to_user_and_project(
-                        regionaltoken, contractid, region, userDetails[2], defaultProject, '_member_')
-                    portal_sync_delay = portal_sync_delay + 1
-                    status = 'Step 5 - User details not synced to IaaS portal - waiting 5 seconds before retrying up to 4 times - pause - retry ...'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-
-                # if the user was successfully assigned the _member_ role in
-                # the default project continue
-                if result.status_code == 204:
-                    userStatus = True
-                    status = 'Step 6 - User Assigned Member Role - continue ...'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    print status
-                # if unable to assign user to default project report and exit
-                else:
-                    userStatus = False
-                    status = 'Step 7 - Unable to  Assign User Member Role - Error, STOP!'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                    return userDetails
-            # Unable to locate default project
-            else:
-                userStatus = False
-                status = 'Step 8 - Unable to locate default -prj project - stop and check contract details supplied...'
-                UserStatusReport[email] = status, userDetails, userProject
-                userDetails = (userDetails[0], userDetails[1],
-                               userDetails[2], userDetails[3],
-                               userDetails[4], status)
-                print status
-                return userDetails
-
-        # if user has not been added to the central authentication portal
-        # report and exit
-        else:
-            status = 'Step 9 - Failed to add user to Central Authentication Portal  - Error, Stop!'
-            UserStatusReport[email] = status, userDetails, userProject
-            userDetails = (userDetails[0], userDetails[1],
-                           userDetails[2], userDetails[3],
-                           userDetails[4], status)
-            print status
-            return userDetails
+    Args:
+        globaltoken (TYPE): Description
+        regionaltoken (TYPE): Description
+        contractid (TYPE): Description
+        region (TYPE): Description
+        userProject (TYPE): Description
+        progress (function): optional progress callback, see report_status
+
+    Returns:
+        tuple: (status, userStatus) - userStatus is True if users can now
+        be added to the project group
+    """
+    checkpoint = Checkpoint(contractid, region, project=userProject)
+    userGroup = userProject + '_Admin'
+    status = 'Step 10 - Project and Group already exist - continue ...'
 
-    # Check if new user's project exists, create if required then add user to group
-    # if user has been successfully added as _member_ to default project
-    if userStatus:
-        # get the project id - this will ne 'None' if the project does not
+    if checkpoint.done('group_role') is not None:
+        report_status(progress, userProject, status)
+        return status, True
+
+    # make sure the project exists, creating it if required
+    if checkpoint.done('project') is None:
+        # get the project id - this will be 'None' if the project does not
         # exist
-        userStatus = False
-        newProjectid = get_itemid(get_keystoneobject_list(
-            regionaltoken, region, contractid, 'projects'), userProject, 'projects')
+        newProjectid = resolve_id(
+            regionaltoken, region, contractid, 'projects', userProject)
 
-        # if the users project already exists
         if (newProjectid != 'None'):
-            # build my 'standard' project group name
-            userGroup = userProject + '_Admin'
-            # get the group id - this will be set to 'None' if the group does
-            # not exist
-            defaultGroupid = get_itemid(
-                                            get_keystoneobject_list(
-                                                            regionaltoken,
-                                                            region,
-                                                            contractid,
-                                                            'groups'),
-                                            userGroup,
-                                            'groups')
-
-            # if the user's group already exists
-            if (defaultGroupid != 'None'):
-                print "Debug - Adding Existing User to Group"
-                result = assign_user_to_group(
-                                            globaltoken,
-                                            regionaltoken,
-                                            contractid,
-                                            region,
-                                            userDetails[2],
-                                            userGroup)
-                print "Assign User to Group response : ", result
-
-                portal_sync_delay = 0
-
-                # added a retry/delay routine here to allow sychronisation time
-                # between central portal and K5 IaaS regional portal
-                while (portal_sync_delay < 4) and (result.status_code != 204):
-                    sleep(5)
-                    result = assign_user_to_group(
-                                                globaltoken,
-                                                regionaltoken,
-                                                contractid,
-                                                region,
-                                                userDetails[2],
-                                                userGroup)
-
-                    portal_sync_delay = portal_sync_delay + 1
-                    status = 'Step 10 - User details not synced to IaaS portal - waiting 5 seconds before retrying up to 4 times - pause - Retry'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-
-                if result.status_code == 204:
-                    status = 'Step 10.1 - User Successfully Added to Group - Finish'
-                    userStatus = True
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                    result = get_re_unscoped_token(regionaltoken, region)
-                else:
-                    status = 'Step 10.2 - Failed to Added User to Group - Finish'
-                    userStatus = False
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                    return userDetails
-
-            # if the users group does not exist
-            else:
-                # create a project admin group - enforce standards
-                status = 'Step 11 - Missing Group  - Creating new user group - continue ...'
-                UserStatusReport[email] = status, userDetails, userProject
-                userStatus = True
-                print status
-                userDetails = (userDetails[0], userDetails[1],
-                               userDetails[2], userDetails[3],
-                               userDetails[4], status)
-                print "Debug User Details", userDetails
-                print "Debug User Project - ", userProject
-                newGroup = create_new_group(
-                    globaltoken, contractid, region, userProject)
-
-                print "DEBUG - NEW GROUP DETAILS - ", newGroup
-
-                # if the new group was created successfully
-                if newGroup == (userProject + '_Admin'):
-                    userStatus = True
-                    status = 'Step 11.1 - Successfully created new group - continue...'
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                else:
-                    userStatus = False
-                    status = 'Step 11.2 - Failed to create new group - STOP...'
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                    return userDetails
-
-                result = assign_role_to_group_and_project(
-                                        regionaltoken,
-                                        contractid,
-                                        region,
-                                        newGroup,
-                                        userProject,
-                                        "cpf_systemowner")
-
-                portal_sync_delay = 0
-                # added a retry/delay routine here to allow sychronisation time
-                # between central portal and K5 IaaS regional portal
-                while (portal_sync_delay < 4) and (result.status_code != 204):
-                    sleep(5)
-                    result = assign_role_to_group_and_project(
-                                            regionaltoken,
-                                            contractid,
-                                            region,
-                                            newGroup,
-                                            userProject,
-                                            "cpf_systemowner")
-                    portal_sync_delay = portal_sync_delay + 1
-                    status = 'Step 12 - Attempt to Assign Role to Group and Project Failed  - pause for portal sync, retrying....'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-
-                # if the new role was successfully assigned to the group and
-                # project
-                if (result.status_code == 204) and (userStatus):
-                    userStatus = True
-                    status = 'Step 13 - Successfully Assigned role to Group  - continue...'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-
-                # failed to assign role to group
-                else:
-                    userStatus = False
-                    status = 'Step 14 - Failed to Assign role to Group - STOP, ERROR!!'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                    return userDetails
-
-                result = assign_user_to_group(
-                                        globaltoken,
-                                        regionaltoken,
-                                        contractid,
-                                        region,
-                                        userDetails[2],
-                                        newGroup)
-
-                # if the new user was successfully assigned to the group
-                if (result.status_code == 204) and (userStatus):
-                    userStatus = True
-                    status = 'Step 15 - Successfully Added User to Group  - continue ...'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-
-                # failed to add new group
-                else:
-                    userStatus = False
-                    status = 'Step 16 - Failed to Add User to Group - Error, STOP!'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                    return userDetails
-
-        # if user project does not exist then create everything!
+            checkpoint.record('project', 'existing')
         else:
-            # create new user project, group, assign role to group, assign
-            # group to project, assign user to project
-
-            # create new project
             result = create_new_project(
                 regionaltoken, contractid, region, userProject)
 
             # check here for project creation status
-            if result.status_code == 201:
-                userStatus = True
-                status = 'Step 17 - Project Created Successfully  - Status Good Continue....'
-                UserStatusReport[email] = status, userDetails, userProject
-                userDetails = (userDetails[0], userDetails[1],
-                               userDetails[2], userDetails[3],
-                               userDetails[4], status)
-                print status
-            else:
-                userStatus = False
+            if getattr(result, 'status_code', None) != 201:
                 status = 'Step 18 - Project Create Failed  - Error, Stop!'
-                UserStatusReport[email] = status, userDetails, userProject
-                userDetails = (userDetails[0], userDetails[1],
-                               userDetails[2], userDetails[3],
-                               userDetails[4], status)
-                print status
-                return userDetails
-
-            if userStatus:
-                newGroup = create_new_group(
-                    globaltoken, contractid, region, userProject)
-
-                if newGroup == (userProject + '_Admin'):
-                    userStatus = True
-                    status = 'Step 19 - New Group Created Successfully  - Status Good Continue....'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                else:
-                    userStatus = False
-                    status = 'Step 20 - Group Create Failed  - Error, Stop!'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                    return userDetails
-
-                print "555 - Getting to assign role to new group and project"
-                # assign role to new group and project
-                result = assign_role_to_group_and_project(
+                report_status(progress, userProject, status)
+                return status, False
+            status = 'Step 17 - Project Created Successfully  - Status Good Continue....'
+            report_status(progress, userProject, status)
+            checkpoint.record('project', 'created')
+            update_inventory(regionaltoken, region, contractid, 'projects',
+                             userProject)
+    newProject = checkpoint.done('project') == 'created'
+
+    # make sure the project admin group exists - enforce standards
+    if checkpoint.done('group') is None:
+        # get the group id - this will be set to 'None' if the group does
+        # not exist
+        defaultGroupid = resolve_id(
                                         regionaltoken,
-                                        contractid,
                                         region,
-                                        newGroup,
-                                        userProject,
-                                        "cpf_systemowner")
-
-                portal_sync_delay = 0
-                # added a retry/delay routine here to allow sychronisation time
-                # between central portal and K5 IaaS regional portal
-                while (portal_sync_delay < 4) and (result.status_code != 204):
-                    sleep(5)
-                    result = assign_role_to_group_and_project(
-                                            regionaltoken,
-                                            contractid,
-                                            region,
-                                            newGroup,
-                                            userProject,
-                                            "cpf_systemowner")
-                    portal_sync_delay = portal_sync_delay + 1
-                    status = 'Step 21 - Attempt to Assigned Role to Group and Project  - pause for portal sync, retrying....'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-
-                # if the new role was successfully assigned to the group and
-                # project
-                if (result.status_code == 204) and (userStatus):
-                    userStatus = True
-                    status = 'Step 22 - Successfully Assigned role to Group  - continue...'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-
-                # failed to assign role to group
-                else:
-                    userStatus = False
-                    status = 'Step 23 - Failed to Assign role to Group - STOP, ERROR!!'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                    return userDetails
-
-            if userStatus:
-                userStatus = False
-                status = 'Step 24 - Attempt to Assigned User to Group  - continue....'
-                UserStatusReport[email] = status, userDetails, userProject
-                userDetails = (userDetails[0], userDetails[1],
-                               userDetails[2], userDetails[3],
-                               userDetails[4], status)
-
-                # assign user to new group
-                result = assign_user_to_group(
-                                        globaltoken,
-                                        regionaltoken,
                                         contractid,
-                                        region,
-                                        userDetails[2],
-                                        newGroup)
-
-                portal_sync_delay = 0
-
-                # added a retry/delay routine here to allow sychronisation time
-                # between central portal and K5 IaaS regional portal
-                while (portal_sync_delay < 4) and (result.status_code != 204):
-                    sleep(5)
-                    result = assign_user_to_group(
-                                            globaltoken,
-                                            regionaltoken,
-                                            contractid,
-                                            region,
-                                            userDetails[2],
-                                            newGroup)
-                    portal_sync_delay = portal_sync_delay + 1
-                    status = 'Step 25 - Attempt to Assigned User to Group  - pause, retrying....'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                # check here for new group creation status
-                if result.status_code == 204:
-                    userStatus = True
-                    status = 'Step 26 - Assigned User Successfully  - Continue....'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
+                                        'groups',
+                                        userGroup)
+
+        if (defaultGroupid != 'None'):
+            checkpoint.record('group', 'existing')
+            # if the project and its group already existed there is
+            # nothing to do
+            if not newProject:
+                checkpoint.record('group_role', 'existing')
+                report_status(progress, userProject, status)
+                return status, True
+        else:
+            if not newProject:
+                status = 'Step 11 - Missing Group  - Creating new user group - continue ...'
+                report_status(progress, userProject, status)
+            newGroup = create_new_group(
+                globaltoken, contractid, region, userProject)
+
+            if newGroup != userGroup:
+                if newProject:
+                    status = 'Step 20 - Group Create Failed  - Error, Stop!'
                 else:
-                    userStatus = False
-                    status = 'Step 27 - Failed to Assign User  - Error, Stop!'
-                    UserStatusReport[email] = status, userDetails, userProject
-                    userDetails = (userDetails[0], userDetails[1],
-                                   userDetails[2], userDetails[3],
-                                   userDetails[4], status)
-                    print status
-                    return userDetails
-
-    # if user addition to default project failed
+                    status = 'Step 11.2 - Failed to create new group - STOP...'
+                report_status(progress, userProject, status)
+                return status, False
+            if newProject:
+                status = 'Step 19 - New Group Created Successfully  - Status Good Continue....'
+            else:
+                status = 'Step 11.1 - Successfully created new group - continue...'
+            report_status(progress, userProject, status)
+            checkpoint.record('group', 'created')
+            update_inventory(regionaltoken, region, contractid, 'groups',
+                             userGroup)
+
+    if newProject:
+        retry_status = 'Step 21 - Attempt to Assigned Role to Group and Project  - pause for portal sync, retrying....'
+        success_status = 'Step 22 - Successfully Assigned role to Group  - continue...'
+        failure_status = 'Step 23 - Failed to Assign role to Group - STOP, ERROR!!'
     else:
-        status = 'Step 28 - Failed to assign Role to user - User Bad - Manually Complete User Addition'
-        userStatus = False
-        UserStatusReport[email] = status, userDetails, userProject
-        userDetails = (userDetails[0], userDetails[1],
-                       userDetails[2], userDetails[3],
-                       userDetails[4], status)
-        print status
-        return userDetails
+        retry_status = 'Step 12 - Attempt to Assign Role to Group and Project Failed  - pause for portal sync, retrying....'
+        success_status = 'Step 13 - Successfully Assigned role to Group  - continue...'
+        failure_status = 'Step 14 - Failed to Assign role to Group - STOP, ERROR!!'
+
+    # assign role to new group and project, waiting for the group to
+    # sychronise from the central portal to the K5 IaaS regional portal
+    result = retry_until(
+        lambda: assign_role_to_group_and_project(
+                                regionaltoken,
+                                contractid,
+                                region,
+                                userGroup,
+                                userProject,
+                                "cpf_systemowner"),
+        assigned,
+        probe=all_of(
+            keystone_probe(regionaltoken, region, contractid,
+                           'groups', userGroup),
+            keystone_probe(regionaltoken, region, contractid,
+                           'projects', userProject)),
+        on_retry=lambda attempt: report_status(
+            progress, userProject, retry_status))
+
+    # if the new role was successfully assigned to the group and project
+    if assigned(result):
+        checkpoint.record('group_role', 'created')
+        report_status(progress, userProject, success_status)
+        return success_status, True
+
+    # failed to assign role to group
+    report_status(progress, userProject, failure_status)
+    return failure_status, False
+
+
+def add_user_to_project_group(globaltoken, regionaltoken, contractid, region,
+                              userDetails, userProject, progress=None):
+    """Summary - Steps 24 to 27 - add the portal user to the project's
+    _Admin group. prepare_project must have succeeded first.
+
+    Args:
+        globaltoken (TYPE): Description
+        regionaltoken (TYPE): Description
+        contractid (TYPE): Description
+        region (TYPE): Description
+        userDetails (TYPE): user details returned by add_user_to_portal
+        userProject (TYPE): Description
+        progress (function): optional progress callback, see report_status
+
+    Returns:
+        TYPE: userDetails with the final status
+    """
+    checkpoint = Checkpoint(contractid, region, email=userDetails[3],
+                            project=userProject)
+    userGroup = userProject + '_Admin'
+
+    if checkpoint.done('group_member') is None:
+        status = 'Step 24 - Attempt to Assigned User to Group  - continue....'
+        userDetails = set_status(userDetails, status)
+        report_status(progress, userProject, status)
+        retry_status = 'Step 25 - Attempt to Assigned User to Group  - pause, retrying....'
+
+        # assign user to the project group, waiting for the user and group
+        # to sychronise from the central portal to the K5 IaaS regional
+        # portal
+        result = retry_until(
+            lambda: assign_user_to_group(
+                                    globaltoken,
+                                    regionaltoken,
+                                    contractid,
+                                    region,
+                                    userDetails[2],
+                                    userGroup),
+            assigned,
+            probe=all_of(
+                keystone_probe(regionaltoken, region, contractid,
+                               'users', userDetails[2]),
+                keystone_probe(regionaltoken, region, contractid,
+                               'groups', userGroup)),
+            on_retry=lambda attempt: report_status(
+                progress, userProject, retry_status))
+
+        # check here for group membership status
+        if not assigned(result):
+            status = 'Step 27 - Failed to Assign User  - Error, Stop!'
+            userDetails = set_status(userDetails, status)
+            report_status(progress, userProject, status)
+            return userDetails
+        checkpoint.record('group_member')
+
+    status = 'Step 26 - Assigned User Successfully  - Continue....'
+    userDetails = set_status(userDetails, status)
+    report_status(progress, userProject, status)
 
     status = 'Success'
-    userDetails = (userDetails[0], userDetails[1],
-                   userDetails[2], userDetails[3],
-                   userDetails[4], status)
+    userDetails = set_status(userDetails, status)
+    report_status(progress, userProject, status)
     print userDetails
     return userDetails
 
 
-def main():
+def add_user_to_project(globaltoken, regionaltoken, contractid, region,
+                        userDetails, userProject, progress=None):
+    """Summary - Steps 10 to 27 - create the project, its _Admin group and
+    role if required then add the portal user to the group
+
+    Args:
+        globaltoken (TYPE): Description
+        regionaltoken (TYPE): Description
+        contractid (TYPE): Description
+        region (TYPE): Description
+        userDetails (TYPE): user details returned by add_user_to_portal
+        userProject (TYPE): Description
+        progress (function): optional progress callback, see report_status
+
+    Returns:
+        TYPE: Description
+    """
+    status, userStatus = prepare_project(globaltoken, regionaltoken,
+                                         contractid, region, userProject,
+                                         progress)
+    if not userStatus:
+        return set_status(userDetails, status)
+
+    return add_user_to_project_group(globaltoken, regionaltoken, contractid,
+                                     region, userDetails, userProject,
+                                     progress)
+
+
+def adduser_to_K5(idtoken, globaltoken, regionaltoken, contractid, contract,
+                  region, email, userProject, progress=None):
     """Summary
 
+    Args:
+        idtoken (TYPE): Description
+        globaltoken (TYPE): Description
+        regionaltoken (TYPE): Description
+        contractid (TYPE): Description
+        contract (TYPE): Description
+        region (TYPE): Description
+        email (TYPE): Description
+        userProject (TYPE): Description
+        progress (function): optional progress callback, see report_status
+
     Returns:
         TYPE: Description
     """
+    use_inventory(regionaltoken, region, contractid)
+    userDetails, userStatus = add_user_to_portal(idtoken, regionaltoken,
+                                                 contractid, contract, region,
+                                                 email, userProject, progress)
+    if not userStatus:
+        return userDetails
+
+    return add_user_to_project(globaltoken, regionaltoken, contractid, region,
+                               userDetails, userProject, progress)
+
+
+def adduser_to_K5_projects(idtoken, globaltoken, regionaltoken, contractid,
+                           contract, region, email, userProjects,
+                           progress=None):
+    """Summary - Add one user to several projects. The portal user is
+    created once up front and then the per project steps for each project
+    run concurrently, so the time taken is close to that of one project.
+
+    Args:
+        idtoken (TYPE): Description
+        globaltoken (TYPE): Description
+        regionaltoken (TYPE): Description
+        contractid (TYPE): Description
+        contract (TYPE): Description
+        region (TYPE): Description
+        email (TYPE): Description
+        userProjects (list): project names
+        progress (function): optional progress callback, see report_status
+
+    Returns:
+        list: userDetails tuple for each project, in the order given
+    """
+    use_inventory(regionaltoken, region, contractid)
+    userDetails, userStatus = add_user_to_portal(idtoken, regionaltoken,
+                                                 contractid, contract, region,
+                                                 email, userProjects[0],
+                                                 progress)
+    if not userStatus:
+        return [userDetails for userProject in userProjects]
+
+    return parallel_map(lambda userProject: add_user_to_project(
+                            globaltoken, regionaltoken, contractid, region,
+                            userDetails, userProject, progress),
+                        userProjects)
+
+
+def read_batch_file(batch_path):
+    """Summary - read (email, project) rows from a csv or json lines file.
+    csv files have an email and a project column, with or without a
+    header row; .jsonl/.json files hold one {"email": .., "project": ..}
+    object per line
+
+    Args:
+        batch_path (TYPE): path to the batch file
+
+    Returns:
+        list: (email, project) tuples in file order
+    """
+    rows = []
+    with open(batch_path, 'rb') as batch_file:
+        if batch_path.endswith(('.jsonl', '.json')):
+            for line in batch_file:
+                if line.strip():
+                    row = json.loads(line)
+                    rows.append((row['email'].strip(), row['project'].strip()))
+        else:
+            for row in csv.reader(batch_file):
+                if len(row) < 2 or not row[0].strip():
+                    continue
+                if row[0].strip().lower() == 'email':
+                    continue
+                rows.append((row[0].strip().decode('utf-8'),
+                             row[1].strip().decode('utf-8')))
+    return rows
+
+
+def write_batch_results(results, results_path):
+    """Summary - write one result per row as csv or json lines, depending
+    on the file extension. The file holds new user passwords so it is
+    created readable by the owner only.
+
+    Args:
+        results (list): result dicts from bulk_adduser_to_K5
+        results_path (TYPE): output file path
+    """
+    fields = ['email', 'project', 'login', 'password', 'ok', 'status']
+    handle = os.open(results_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                     0600)
+    with os.fdopen(handle, 'wb') as results_file:
+        if results_path.endswith(('.jsonl', '.json')):
+            for result in results:
+                results_file.write(json.dumps(result) + '\n')
+        else:
+            writer = csv.writer(results_file)
+            writer.writerow(fields)
+            for result in results:
+                writer.writerow([unicode(result[field]).encode('utf-8')
+                                 for field in fields])
+
+
+def clear_checkpoints(contractid, region, rows):
+    """Summary - forget the checkpoints of the given users and projects so
+    every step is checked against K5 again, e.g. after users or projects
+    were deleted by hand
 
-    pass
+    Args:
+        contractid (TYPE): Description
+        region (TYPE): Description
+        rows (list): (email, project) tuples
+
+    Returns:
+        int: number of checkpoints removed
+    """
+    removed = 0
+    for email in set(email for email, project in rows):
+        removed = removed + k5Checkpoints.clear(contractid, region,
+                                                email=email)
+    for project in set(project for email, project in rows):
+        removed = removed + k5Checkpoints.clear(contractid, region,
+                                                email='', project=project)
+    return removed
+
+
+def bulk_adduser_to_K5(idtoken, globaltoken, regionaltoken, contractid,
+                       contract, region, rows, workers=None, progress=None):
+    """Summary - onboard a whole cohort of (email, project) rows.
+    All existing users, projects, groups and roles are indexed once up
+    front, from the local inventory when it can be synced. Each distinct project is prepared once and each distinct user
+    is created in the portal once, then the group memberships are added.
+    Every phase runs with at most `workers` concurrent calls.
+
+    Args:
+        idtoken (TYPE): Description
+        globaltoken (TYPE): Description
+        regionaltoken (TYPE): Description
+        contractid (TYPE): Description
+        contract (TYPE): Description
+        region (TYPE): Description
+        rows (list): (email, project) tuples
+        workers (int): maximum concurrent K5 calls per phase
+        progress (function): optional progress callback, see report_status
+
+    Returns:
+        list: one result dict per row, in the order given
+    """
+    seeded = use_inventory(regionaltoken, region, contractid, sync=True)
+    prime(regionaltoken, region, contractid,
+          [objecttype for objecttype in ['users', 'projects', 'groups',
+                                         'roles'] if objecttype not in seeded])
+
+    def safely(func):
+        def wrapper(item):
+            try:
+                return func(item)
+            except Exception:
+                return ('Failed - ' + repr(sys.exc_info()[1]), False)
+        return wrapper
+
+    # create missing projects and groups once per distinct project
+    projects = sorted(set(project for email, project in rows))
+    prepared = dict(zip(projects, parallel_map(
+        safely(lambda userProject: prepare_project(
+            globaltoken, regionaltoken, contractid, region, userProject,
+            progress)),
+        projects, workers)))
+
+    # create each distinct user in the portal once
+    firstProject = {}
+    emails = []
+    for email, project in rows:
+        if email not in firstProject:
+            firstProject[email] = project
+            emails.append(email)
+    portal = dict(zip(emails, parallel_map(
+        safely(lambda email: add_user_to_portal(
+            idtoken, regionaltoken, contractid, contract, region, email,
+            firstProject[email], progress)),
+        emails, workers)))
+
+    def onboard_row(row):
+        email, project = row
+        result = {'email': email, 'project': project, 'login': '',
+                  'password': '', 'ok': False}
+        userDetails, userStatus = portal[email]
+        if isinstance(userDetails, tuple):
+            result['login'] = userDetails[2]
+            result['password'] = userDetails[4]
+            result['status'] = userDetails[5]
+        else:
+            result['status'] = userDetails
+        if not userStatus:
+            return result
+        status, projectStatus = prepared[project]
+        if not projectStatus:
+            result['status'] = status
+            return result
+        try:
+            userDetails = add_user_to_project_group(
+                globaltoken, regionaltoken, contractid, region, userDetails,
+                project, progress)
+            result['status'] = userDetails[5]
+            result['ok'] = userDetails[5] == 'Success'
+        except Exception:
+            result['status'] = 'Failed - ' + repr(sys.exc_info()[1])
+        return result
+
+    return parallel_map(onboard_row, rows, workers)
+
+
+def usage():
+    """Summary - print command line help
+    """
+    print """Usage:
+    AddUserToProjectv3.py -u user_email_address -p project_name [-c]
+    AddUserToProjectv3.py -f batch_file [-o results_file] [-w workers] [-c]
+
+    batch_file   - csv (email,project) or .jsonl ({"email":..,"project":..})
+    results_file - .csv or .jsonl, default batch_file + '.results.jsonl'
+    workers      - maximum concurrent K5 calls, default 8
+    -c           - forget the checkpoints of these users and projects first,
+                   so every step is checked against K5 again. Checkpoints
+                   older than K5_CHECKPOINT_MAX_AGE seconds are always
+                   ignored
+
+    K5 admin credentials are read from the K5_USERNAME, K5_PASSWORD,
+    K5_CONTRACT and K5_REGION environment variables."""
+
+
+def main():
+    """Summary - command line entry point for single user or batch
+    onboarding
+
+    Returns:
+        TYPE: Description
+    """
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hu:p:f:o:w:c')
+    except getopt.GetoptError as err:
+        print err
+        usage()
+        sys.exit(2)
+
+    options = dict(opts)
+    if '-h' in options or not ('-f' in options or
+                               ('-u' in options and '-p' in options)):
+        usage()
+        sys.exit(0 if '-h' in options else 2)
+
+    adminUser = os.getenv('K5_USERNAME')
+    adminPassword = os.getenv('K5_PASSWORD')
+    contract = os.getenv('K5_CONTRACT')
+    region = os.getenv('K5_REGION', 'uk-1')
+
+    regional_token = k5TokenCache.get_unscoped_token(
+        adminUser, adminPassword, contract, region)
+    if isinstance(regional_token, str) or \
+            regional_token.status_code != 201:
+        print 'Unable to authenticate with K5 - check credentials'
+        sys.exit(1)
+    contractid = regional_token.json()['token']['project']['domain'].get('id')
+    defaultid = regional_token.json()['token']['project'].get('id')
+    global_token = k5TokenCache.get_globally_scoped_token(
+        adminUser, adminPassword, contract, defaultid, region)
+    idtoken = k5TokenCache.get_unscoped_idtoken(
+        adminUser, adminPassword, contract)
+    regionaltoken = regional_token.headers['X-Subject-Token']
+    globaltoken = global_token.headers['X-Subject-Token']
+
+    k5Checkpoints.expire()
+    if '-f' in options:
+        rows = read_batch_file(options['-f'])
+    else:
+        rows = [(options['-u'], options['-p'])]
+    if '-c' in options:
+        print clear_checkpoints(contractid, region, rows), \
+            'checkpoints cleared'
+
+    if '-f' in options:
+        batch_path = options['-f']
+        results_path = options.get('-o', batch_path + '.results.jsonl')
+        results = bulk_adduser_to_K5(idtoken, globaltoken, regionaltoken,
+                                     contractid, contract, region, rows,
+                                     int(options.get('-w', 8)))
+        write_batch_results(results, results_path)
+        succeeded = len([result for result in results if result['ok']])
+        print succeeded, 'of', len(results), 'rows onboarded - results in', \
+            results_path
+        sys.exit(0 if succeeded == len(results) else 1)
+
+    print adduser_to_K5(idtoken, globaltoken, regionaltoken, contractid,
+                        contract, region, options['-u'], options['-p'])
 
 
 if __name__ == "__main__":
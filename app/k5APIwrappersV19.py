@@ -11,12 +11,25 @@ Blog: https://allthingscloud.eu
 
 """
 
-import requests
 import sys
+import os
 import json
 #from k5contractsettingsV10 import *
+import ntpath
 import random
 import string
+import threading
+from urlparse import urljoin
+
+import k5HTTPPool as k5http
+import k5Resolver
+from k5Parallel import parallel_map
+
+# objects requested per page by the iter_* generators
+page_size = int(os.getenv('K5_PAGE_SIZE', '200'))
+
+# bytes read and sent per chunk by the streaming object storage uploads
+upload_chunk_size = int(os.getenv('K5_UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
 
 def randomword(length):
     return ''.join(random.choice(string.lowercase) for i in range(length))
@@ -39,7 +52,7 @@ def get_globally_scoped_token(adminUser, adminPassword, contract,
     """
     identityURL = 'https://identity.gls.cloud.global.fujitsu.com/v3/auth/tokens'
     try:
-        response = requests.post(identityURL,
+        response = k5http.post(identityURL,
                                  headers={'Content-Type': 'application/json',
                                           'Accept': 'application/json'},
                                  json={"auth":
@@ -72,7 +85,7 @@ def get_globally_rescoped_token(globaltoken, defaultid):
     """
     identityURL = 'https://identity.gls.cloud.global.fujitsu.com/v3/auth/tokens'
     try:
-        response = requests.post(identityURL,
+        response = k5http.post(identityURL,
                                  headers={'Content-Type': 'application/json',
                                           'Accept': 'application/json'},
                                  json={
@@ -122,7 +135,7 @@ def get_re_unscoped_token(k5token, region):
         }
     }
     try:
-        response = requests.post(identityURL,
+        response = k5http.post(identityURL,
                                  headers={'Content-Type': 'application/json',
                                           'Accept': 'application/json'},
                                  json=tokenbody)
@@ -145,7 +158,7 @@ def get_rescoped_token(k5token, projectid, region):
     identityURL = 'https://identity.' + region + \
         '.cloud.global.fujitsu.com/v3/auth/tokens'
     try:
-        response = requests.post(identityURL,
+        response = k5http.post(identityURL,
                                  headers={'Content-Type': 'application/json',
                                           'Accept': 'application/json'},
                                  json={
@@ -188,7 +201,7 @@ def get_scoped_token(adminUser, adminPassword, contract, projectid, region):
         '.cloud.global.fujitsu.com/v3/auth/tokens'
 
     try:
-        response = requests.post(identityURL,
+        response = k5http.post(identityURL,
                                  headers={'Content-Type': 'application/json',
                                           'Accept': 'application/json'},
                                  json={"auth":
@@ -225,7 +238,7 @@ def get_unscoped_token(adminUser, adminPassword, contract, region):
     identityURL = 'https://identity.' + region + \
         '.cloud.global.fujitsu.com/v3/auth/tokens'
     try:
-        response = requests.post(identityURL,
+        response = k5http.post(identityURL,
                                  headers={'Content-Type': 'application/json',
                                           'Accept': 'application/json'},
                                  json={"auth":
@@ -254,7 +267,7 @@ def get_unscoped_idtoken(adminUser, adminPassword, contract):
         contract (TYPE): k5 contract
     """
     try:
-        response = requests.post('https://auth-api.jp-east-1.paas.cloud.global.fujitsu.com/API/paas/auth/token',
+        response = k5http.post('https://auth-api.jp-east-1.paas.cloud.global.fujitsu.com/API/paas/auth/token',
                                  headers={'Content-Type': 'application/json'},
                                  json={"auth":
                                        {"identity":
@@ -288,16 +301,16 @@ def assign_user_to_group(global_token, regional_token, contractid, region,
     """
     try:
         # if user exists return its id otherwise return 'None'
-        userid = get_itemid(get_keystoneobject_list(
-            regional_token, region, contractid, 'users'), username, 'users')
+        userid = k5Resolver.resolve_id(
+            regional_token, region, contractid, 'users', username)
         # if group exists return its id otherwise return 'None'
-        groupid = get_itemid(get_keystoneobject_list(
-            regional_token, region, contractid, 'groups'), groupname, 'groups')
+        groupid = k5Resolver.resolve_id(
+            regional_token, region, contractid, 'groups', groupname)
         region = 'gls'
         identityURL = 'https://identity.' + region + \
             '.cloud.global.fujitsu.com/v3/groups/' + groupid + '/users/' + userid
         # make the put rest request
-        response = requests.put(identityURL,
+        response = k5http.put(identityURL,
                                 headers={'X-Auth-Token': global_token,
                                          'Content-Type': 'application/json'})
         return response
@@ -320,16 +333,16 @@ def assign_role_to_group_on_domain(k5token, contractid, region, group, role):
     """
     try:
         # if group exists return its id otherwisw return 'None'
-        groupid = get_itemid(get_keystoneobject_list(
-            k5token, region, contractid, 'groups'), group, 'groups')
+        groupid = k5Resolver.resolve_id(
+            k5token, region, contractid, 'groups', group)
         # if role exists return its id otherwise return 'None'
-        roleid = get_itemid(get_keystoneobject_list(
-            k5token, region, contractid, 'roles'), role, 'roles')
+        roleid = k5Resolver.resolve_id(
+            k5token, region, contractid, 'roles', role)
         # the regional rather than global api is required for this call
         identityURL = 'https://identity.' + region + '.cloud.global.fujitsu.com/v3/domains/' + \
             contractid + '/groups/' + groupid + '/roles/' + roleid
         # make the put rest api request
-        response = requests.put(identityURL, headers={
+        response = k5http.put(identityURL, headers={
                                 'X-Auth-Token': k5token,
                                 'Content-Type': 'application/json',
                                 'Accept': 'application/json'})
@@ -355,18 +368,18 @@ def assign_role_to_user_and_project(k5token, contractid, region, username,
     """
     try:
         # if user exists return its id otherwise return 'None'
-        userid = get_itemid(get_keystoneobject_list(
-            k5token, region, contractid, 'users'), username, 'users')
+        userid = k5Resolver.resolve_id(
+            k5token, region, contractid, 'users', username)
         # if project exists return its id otherwise return 'None'
-        projectid = get_itemid(get_keystoneobject_list(
-            k5token, region, contractid, 'projects'), project, 'projects')
+        projectid = k5Resolver.resolve_id(
+            k5token, region, contractid, 'projects', project)
         # if role exists return its id otherwise return 'None'
-        roleid = get_itemid(get_keystoneobject_list(
-            k5token, region, contractid, 'roles'), role, 'roles')
+        roleid = k5Resolver.resolve_id(
+            k5token, region, contractid, 'roles', role)
         identityURL = 'https://identity.' + region + '.cloud.global.fujitsu.com/v3/projects/' + \
             projectid + '/users/' + userid + '/roles/' + roleid
 
-        response = requests.put(identityURL,
+        response = k5http.put(identityURL,
                                 headers={
                                     'X-Auth-Token': k5token,
                                     'Content-Type': 'application/json',
@@ -393,17 +406,17 @@ def assign_role_to_group_and_project(k5token, contractid, region, group,
     """
     try:
         # if group exists return its id otherwise return 'None'
-        groupid = get_itemid(get_keystoneobject_list(
-            k5token, region, contractid, 'groups'), group, 'groups')
+        groupid = k5Resolver.resolve_id(
+            k5token, region, contractid, 'groups', group)
         # if project exists return its id otherwise return 'None'
-        projectid = get_itemid(get_keystoneobject_list(
-            k5token, region, contractid, 'projects'), project, 'projects')
+        projectid = k5Resolver.resolve_id(
+            k5token, region, contractid, 'projects', project)
         # if role exists return its id otherwise return 'None'
-        roleid = get_itemid(get_keystoneobject_list(
-            k5token, region, contractid, 'roles'), role, 'roles')
+        roleid = k5Resolver.resolve_id(
+            k5token, region, contractid, 'roles', role)
         identityURL = 'https://identity.' + region + '.cloud.global.fujitsu.com/v3/projects/' + \
             projectid + '/groups/' + groupid + '/roles/' + roleid
-        response = requests.put(identityURL,
+        response = k5http.put(identityURL,
                                 headers={
                                     'X-Auth-Token': k5token,
                                     'Content-Type': 'application/json',
@@ -429,7 +442,7 @@ def list_projects(k5token, userid, region):
     try:
         identityURL = 'https://identity.' + region + \
             '.cloud.global.fujitsu.com/v3/users/' + userid + '/projects'
-        response = requests.get(identityURL,
+        response = k5http.get(identityURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -459,7 +472,7 @@ def list_images(k5token, region):
         imageURL = 'https://image.' + region + \
             '.cloud.global.fujitsu.com/v2/images?limit=1000'
         print imageURL
-        response = requests.get(imageURL,
+        response = k5http.get(imageURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -470,13 +483,15 @@ def list_images(k5token, region):
 
 
 
-def list_servers(k5token, project_id, region):
+def list_servers(k5token, project_id, region, changes_since=None):
     """Summary - list  K5 projects
 
     Args:
         k5token (TYPE): valid regional domain scoped token
         project_id (TYPE): Description
         region (TYPE): K5 region
+        changes_since (TYPE): optional ISO 8601 time - only list servers
+        changed (including deleted) since then
 
     Returns:
         TYPE: http response object
@@ -489,7 +504,11 @@ def list_servers(k5token, project_id, region):
 
         serverURL = 'https://compute.' + region + \
             '.cloud.global.fujitsu.com/v2/' + project_id + '/servers/detail'
-        response = requests.get(serverURL,
+        params = None
+        if changes_since is not None:
+            params = {'changes-since': changes_since}
+        response = k5http.get(serverURL,
+                                params=params,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -517,7 +536,7 @@ def show_server(k5token, server_id, project_id, region):
 
         serverURL = 'https://compute.' + region + \
             '.cloud.global.fujitsu.com/v2/' + project_id + '/servers/' + server_id
-        response = requests.get(serverURL,
+        response = k5http.get(serverURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -544,7 +563,7 @@ def delete_server(k5token, server_id, project_id, region):
     try:
         DserverURL = 'https://compute.' + region + \
             '.cloud.global.fujitsu.com/v2/' + project_id + '/servers/' + server_id
-        response = requests.delete(DserverURL,
+        response = k5http.delete(DserverURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -568,7 +587,7 @@ def delete_server(k5token, server_id, project_id, region):
 #     try:
 #         DserverURL = 'https://compute.' + region + \
 #             '.cloud.global.fujitsu.com/v2' + project_id + '/servers/' + server_id
-#         response = requests.delete(DserverURL,
+#         response = k5http.delete(DserverURL,
 #                                    headers={
 #                                      'X-Auth-Token': k5token,
 #                                      'Content-Type': 'application/json',
@@ -648,7 +667,7 @@ def list_keypairs(k5token, project_id, region):
 
         serverURL = 'https://compute.' + region + \
             '.cloud.global.fujitsu.com/v2/' + project_id + '/os-keypairs'
-        response = requests.get(serverURL,
+        response = k5http.get(serverURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -676,7 +695,7 @@ def show_keypair(k5token, keypair_name, project_id, region):
 
         serverURL = 'https://compute.' + region + \
             '.cloud.global.fujitsu.com/v2/' + project_id + '/os-keypairs/' + keypair_name
-        response = requests.get(serverURL,
+        response = k5http.get(serverURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -705,7 +724,7 @@ def delete_keypair(k5token, keypair_name, project_id, region):
 
         serverURL = 'https://compute.' + region + \
             '.cloud.global.fujitsu.com/v2/' + project_id + '/os-keypairs/' + keypair_name
-        response = requests.delete(serverURL,
+        response = k5http.delete(serverURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -735,7 +754,7 @@ def create_keypair(k5token, keypair_name, project_id, az, region):
 
         serverURL = 'https://compute.' + region + \
             '.cloud.global.fujitsu.com/v2/' + project_id + '/os-keypairs'
-        response = requests.post(serverURL,
+        response = k5http.post(serverURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -771,7 +790,7 @@ def list_volumes(k5token, project_id, region):
     try:
         volumeURL = 'https://blockstorage.' + region + \
             '.cloud.global.fujitsu.com/v1/' + project_id + '/volumes'
-        response = requests.get(volumeURL,
+        response = k5http.get(volumeURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -799,7 +818,7 @@ def delete_volume(k5token, volume_id, project_id, region):
     try:
         volumeURL = 'https://blockstorage.' + region + \
             '.cloud.global.fujitsu.com/v1/' + project_id + '/volumes/' + volume_id
-        response = requests.delete(volumeURL,
+        response = k5http.delete(volumeURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -826,7 +845,7 @@ def list_snapshots(k5token, project_id, region):
     try:
         snapshotURL = 'https://blockstorage.' + region + \
             '.cloud.global.fujitsu.com/v1/' + project_id + '/snapshots'
-        response = requests.get(snapshotURL,
+        response = k5http.get(snapshotURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -854,7 +873,7 @@ def delete_snapshot(k5token, snapshot_id, project_id, region):
     try:
         snapshotURL = 'https://blockstorage.' + region + \
             '.cloud.global.fujitsu.com/v1/' + project_id + '/snapshots/' + snapshot_id
-        response = requests.delete(snapshotURL,
+        response = k5http.delete(snapshotURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -864,12 +883,14 @@ def delete_snapshot(k5token, snapshot_id, project_id, region):
         return 'Failed to delete snapshot'
 
 
-def list_global_ips(projectscopedk5token, region):
+def list_global_ips(projectscopedk5token, region, fields=None):
     """Summary - list  K5 projects
 
     Args:
         projectscopedk5token (TYPE): Description
         region (TYPE): K5 region
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'floating_ip_address'] - default all attributes
 
     Returns:
         TYPE: http response object
@@ -881,7 +902,8 @@ def list_global_ips(projectscopedk5token, region):
     try:
         floatingURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/floatingips'
-        response = requests.get(floatingURL,
+        response = k5http.get(floatingURL,
+                                params=field_projection(fields),
                                 headers={
                                      'X-Auth-Token': projectscopedk5token,
                                      'Content-Type': 'application/json',
@@ -908,7 +930,7 @@ def create_global_ip(k5token, ext_netid, port_id, az, region):
     try:
         floatingURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/floatingips'
-        response = requests.post(floatingURL,
+        response = k5http.post(floatingURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -943,7 +965,7 @@ def delete_global_ip(projectscopedk5token, floating_ip_id, region):
     try:
         floatingURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/floatingips/' + floating_ip_id
-        response = requests.delete(floatingURL,
+        response = k5http.delete(floatingURL,
                                 headers={
                                      'X-Auth-Token': projectscopedk5token,
                                      'Content-Type': 'application/json',
@@ -967,7 +989,7 @@ def create_new_project(k5token, contractid, region, project):
     try:
         identityURL = 'https://identity.' + region + \
             '.cloud.global.fujitsu.com/v3/projects?domain_id=' + contractid
-        response = requests.post(identityURL,
+        response = k5http.post(identityURL,
                                 headers={
                                      'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={"project":
@@ -977,6 +999,8 @@ def create_new_project(k5token, contractid, region, project):
                                         "is_domain": False,
                                         "name": project
                                         }})
+        # cached project name -> id lookups are now out of date
+        k5Resolver.invalidate(contractid, 'projects')
         return response
     except:
         return 'Failed to create a new project'
@@ -998,7 +1022,7 @@ def create_new_group(global_k5token, contractid, region, project):
         groupname = project + '_Admin'
 
         groupURL = 'https://identity.gls.cloud.global.fujitsu.com/v3/groups'
-        response = requests.post(groupURL,
+        response = k5http.post(groupURL,
                                  headers={'X-Auth-Token': global_k5token,
                                           'Content-Type': 'application/json'},
                                  json={"group":
@@ -1006,6 +1030,7 @@ def create_new_group(global_k5token, contractid, region, project):
                                         "domain_id": contractid,
                                         "name": groupname
                                         }})
+        k5Resolver.invalidate(contractid, 'groups')
         groupDetail = response.json()
 
         return groupDetail['group']['name']
@@ -1031,7 +1056,7 @@ def get_keystoneobject_list(k5token, region, contractid, objecttype):
     try:
         identityURL = 'https://identity.' + region + \
             '.cloud.global.fujitsu.com/v3/' + objecttype + '?domain_id=' + contractid
-        response = requests.get(identityURL,
+        response = k5http.get(identityURL,
                                 headers={
                                     'X-Auth-Token': k5token,
                                     'Content-Type': 'application/json',
@@ -1065,6 +1090,311 @@ def get_itemid(itemlist, itemname, itemtype):
         return 'Failed to get item id'
 
 
+def field_projection(fields):
+    """Summary - neutron ?fields= query parameters for a list call, so only
+    the named attributes of each object are returned
+
+    Args:
+        fields (TYPE): list of attribute names or None for everything
+
+    Returns:
+        TYPE: requests params dict or None
+    """
+    if not fields:
+        return None
+    return {'fields': list(fields)}
+
+
+def _next_page_url(url, body, key):
+    """Summary - find the next page link in a K5 list response - nova and
+    neutron use <key>_links, keystone uses links.next and glance uses a
+    relative next url
+
+    Returns:
+        TYPE: absolute url of the next page or None
+    """
+    for link in body.get(key + '_links') or []:
+        if link.get('rel') == 'next':
+            return link.get('href')
+    links = body.get('links')
+    if isinstance(links, dict) and links.get('next'):
+        return links.get('next')
+    if isinstance(body.get('next'), basestring):
+        return urljoin(url, body.get('next'))
+    return None
+
+
+def iterate_k5_collection(k5token, url, key, limit=None, params=None,
+                          marker_paging=True):
+    """Summary - generator over every object of a paginated K5 list call.
+    Pages are requested limit objects at a time and followed through the
+    next links, or with marker=<last id> when the service returns a full
+    page without links. Only one page is held in memory and the caller
+    can stop early without the remaining pages being fetched.
+
+    A page that starts with an object of the previous page means the
+    service ignored the marker and sent the same objects again, so it is
+    dropped and the listing ends. Only the previous page's ids are kept
+    for this check.
+
+    Args:
+        k5token (TYPE): valid K5 token for the service
+        url (TYPE): list url
+        key (TYPE): response key holding the objects e.g. 'servers'
+        limit (TYPE): page size, default K5_PAGE_SIZE
+        params (TYPE): extra query parameters e.g. filters
+        marker_paging (TYPE): False for services that ignore limit and
+        marker (keystone) - only next links are followed
+
+    Returns:
+        TYPE: generator of python dicts
+
+    Raises:
+        RuntimeError: if a page request fails
+    """
+    limit = limit or page_size
+    headers = {'X-Auth-Token': k5token,
+               'Content-Type': 'application/json',
+               'Accept': 'application/json'}
+    query = dict(params or {})
+    if marker_paging:
+        query['limit'] = limit
+    previous = set()
+    while url is not None:
+        response = k5http.get(url, params=query, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError('Failed to list ' + key + ' - ' +
+                               str(response.status_code))
+        body = response.json()
+        page = body.get(key, [])
+        if not page or (page[0].get('id') is not None and
+                        page[0].get('id') in previous):
+            break
+        previous = set(item.get('id') for item in page
+                       if item.get('id') is not None)
+        for item in page:
+            yield item
+        next_url = _next_page_url(url, body, key)
+        if next_url is not None:
+            # the next link already carries limit, marker and filters
+            url, query = next_url, None
+        elif marker_paging and len(page) >= limit and page[-1].get('id'):
+            query = dict(params or {})
+            query.update({'limit': limit, 'marker': page[-1].get('id')})
+        else:
+            url = None
+
+
+def iter_keystoneobjects(k5token, region, contractid, objecttype,
+                         limit=None):
+    """Summary - paginated generator version of get_keystoneobject_list
+
+    Args:
+        k5token (TYPE): K5 regional domain scoped token
+        region (TYPE): K5 region
+        contractid (TYPE): K5 Contract ID
+        objecttype (TYPE): groups/users/roles/projects
+        limit (TYPE): page size
+
+    Returns:
+        TYPE: generator of keystone object dicts
+    """
+    return iterate_k5_collection(
+        k5token,
+        'https://identity.' + region + '.cloud.global.fujitsu.com/v3/' +
+        objecttype, objecttype, limit, {'domain_id': contractid},
+        marker_paging=False)
+
+
+def iter_images(k5token, region, limit=None):
+    """Summary - paginated generator of K5 images
+
+    Args:
+        k5token (TYPE): valid regional token
+        region (TYPE): K5 region
+        limit (TYPE): page size
+
+    Returns:
+        TYPE: generator of image dicts
+    """
+    return iterate_k5_collection(
+        k5token,
+        'https://image.' + region + '.cloud.global.fujitsu.com/v2/images',
+        'images', limit)
+
+
+def iter_servers(k5token, project_id, region, limit=None):
+    """Summary - paginated generator of a project's servers (detail view)
+
+    Args:
+        k5token (TYPE): valid project scoped token
+        project_id (TYPE): project id
+        region (TYPE): K5 region
+        limit (TYPE): page size
+
+    Returns:
+        TYPE: generator of server dicts
+    """
+    return iterate_k5_collection(
+        k5token,
+        'https://compute.' + region + '.cloud.global.fujitsu.com/v2/' +
+        project_id + '/servers/detail', 'servers', limit)
+
+
+def iter_volumes(k5token, project_id, region, limit=None):
+    """Summary - paginated generator of a project's volumes
+
+    Args:
+        k5token (TYPE): valid project scoped token
+        project_id (TYPE): project id
+        region (TYPE): K5 region
+        limit (TYPE): page size
+
+    Returns:
+        TYPE: generator of volume dicts
+    """
+    return iterate_k5_collection(
+        k5token,
+        'https://blockstorage.' + region + '.cloud.global.fujitsu.com/v1/' +
+        project_id + '/volumes', 'volumes', limit)
+
+
+def iter_snapshots(k5token, project_id, region, limit=None):
+    """Summary - paginated generator of a project's volume snapshots
+
+    Args:
+        k5token (TYPE): valid project scoped token
+        project_id (TYPE): project id
+        region (TYPE): K5 region
+        limit (TYPE): page size
+
+    Returns:
+        TYPE: generator of snapshot dicts
+    """
+    return iterate_k5_collection(
+        k5token,
+        'https://blockstorage.' + region + '.cloud.global.fujitsu.com/v1/' +
+        project_id + '/snapshots', 'snapshots', limit)
+
+
+def iter_networking(k5token, resource, region, limit=None, params=None,
+                    fields=None):
+    """Summary - paginated generator over a neutron collection
+
+    Args:
+        k5token (TYPE): valid regional token
+        resource (TYPE): collection path e.g. 'ports', 'security-groups'
+        region (TYPE): K5 region
+        limit (TYPE): page size
+        params (TYPE): extra query parameters e.g. filters
+        fields (TYPE): optional list of attributes to return - 'id' is
+        always added as it is needed for marker pagination
+
+    Returns:
+        TYPE: generator of python dicts
+    """
+    params = dict(params or {})
+    if fields:
+        params.update(field_projection(list(fields) + ['id']))
+    return iterate_k5_collection(
+        k5token,
+        'https://networking.' + region +
+        '.cloud.global.fujitsu.com/v2.0/' + resource,
+        resource.replace('-', '_'), limit, params)
+
+
+def iter_ports(k5token, region, limit=None, fields=None):
+    """Summary - paginated generator of the ports visible to the token
+
+    Args:
+        k5token (TYPE): valid regional token
+        region (TYPE): K5 region
+        limit (TYPE): page size
+        fields (TYPE): optional list of attributes to return
+
+    Returns:
+        TYPE: generator of port dicts
+    """
+    return iter_networking(k5token, 'ports', region, limit, fields=fields)
+
+
+def iter_networks(k5token, region, limit=None, fields=None):
+    """Summary - paginated generator of the networks visible to the token
+
+    Args:
+        k5token (TYPE): valid regional token
+        region (TYPE): K5 region
+        limit (TYPE): page size
+        fields (TYPE): optional list of attributes to return
+
+    Returns:
+        TYPE: generator of network dicts
+    """
+    return iter_networking(k5token, 'networks', region, limit, fields=fields)
+
+
+def iter_subnets(k5token, region, limit=None, fields=None):
+    """Summary - paginated generator of the subnets visible to the token
+
+    Args:
+        k5token (TYPE): valid regional token
+        region (TYPE): K5 region
+        limit (TYPE): page size
+        fields (TYPE): optional list of attributes to return
+
+    Returns:
+        TYPE: generator of subnet dicts
+    """
+    return iter_networking(k5token, 'subnets', region, limit, fields=fields)
+
+
+def iter_routers(k5token, region, limit=None, fields=None):
+    """Summary - paginated generator of the routers visible to the token
+
+    Args:
+        k5token (TYPE): valid regional token
+        region (TYPE): K5 region
+        limit (TYPE): page size
+        fields (TYPE): optional list of attributes to return
+
+    Returns:
+        TYPE: generator of router dicts
+    """
+    return iter_networking(k5token, 'routers', region, limit, fields=fields)
+
+
+def iter_security_groups(k5token, region, limit=None, fields=None):
+    """Summary - paginated generator of the security groups visible to the token
+
+    Args:
+        k5token (TYPE): valid regional token
+        region (TYPE): K5 region
+        limit (TYPE): page size
+        fields (TYPE): optional list of attributes to return
+
+    Returns:
+        TYPE: generator of security group dicts
+    """
+    return iter_networking(k5token, 'security-groups', region, limit,
+                           fields=fields)
+
+
+def iter_global_ips(k5token, region, limit=None, fields=None):
+    """Summary - paginated generator of the global IPs visible to the token
+
+    Args:
+        k5token (TYPE): valid regional token
+        region (TYPE): K5 region
+        limit (TYPE): page size
+        fields (TYPE): optional list of attributes to return
+
+    Returns:
+        TYPE: generator of global IP dicts
+    """
+    return iter_networking(k5token, 'floatingips', region, limit,
+                           fields=fields)
+
+
 def add_new_user(idtoken, contract, region, userDetails):
     """Summary - K5 add a new user to the K5 central authentication portal
 
@@ -1093,11 +1423,12 @@ def add_new_user(idtoken, contract, region, userDetails):
                                        }
         print "\n\nDEBUG adduser JSON data - \n\n", jsonData
 
-        response = requests.post(centralIdUrl,
+        response = k5http.post(centralIdUrl,
                                  headers={'Token': idtoken,
                                           'Content-Type': 'application/json',
                                           'Accept': 'application/json'},
                                  json=jsonData)
+        k5Resolver.invalidate(contract, 'users')
         print "\n\nDEBUG - Add USER response \n", response
         print "\n\nDEBUG - Add USER response.json() \n", response.json()
         return response
@@ -1121,7 +1452,7 @@ def delete_user(idtoken, userid):
         centralIdUrl = 'https://k5-apiportal.paas.cloud.global.fujitsu.com/API/v1/api/users/?login_id=' + userid
 
         #print centralIdUrl
-        response = requests.delete(centralIdUrl,
+        response = k5http.delete(centralIdUrl,
                                  headers={'Token': idtoken,
                                           'Content-Type': 'application/json'})
         return response
@@ -1146,7 +1477,7 @@ def delete_user(idtoken, userid):
 #         portURL = 'https://networking.' + region + \
 #             '.cloud.global.fujitsu.com/v2.0/ports?fields=id&fields=status&fields=device_id&fields=device_owner&fields=name'
 #         #print portURL
-#         response = requests.get(portURL,
+#         response = k5http.get(portURL,
 #                                 headers={
 #                                      'X-Auth-Token': projectscopedk5token,
 #                                      'Content-Type': 'application/json',
@@ -1173,7 +1504,7 @@ def list_flavors(k5token, project_id, region):
     try:
         serverURL = 'https://compute.' + region + \
             '.cloud.global.fujitsu.com/v2/' + project_id + '/flavors/detail'
-        response = requests.get(serverURL,
+        response = k5http.get(serverURL,
                                 headers={
                                      'X-Auth-Token': k5token,
                                      'Content-Type': 'application/json',
@@ -1200,7 +1531,7 @@ def create_network_connector(k5token, projectid, connector_name, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/network_connectors'
     try:
-        response = requests.post(connectorURL,
+        response = k5http.post(connectorURL,
                                  headers={
                                      'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={"network_connector":
@@ -1231,7 +1562,7 @@ def create_network_connector_endpoint(k5token, projectid, ep_name, nc_id, az_nam
     try:
         connectorURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/network_connector_endpoints'
-        response = requests.post(connectorURL,
+        response = k5http.post(connectorURL,
                                  headers={
                                      'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={"network_connector_endpoint": {
@@ -1264,7 +1595,7 @@ def connect_network_connector_endpoint(k5token, ep_id, port_id, region):
     try:
         connectorURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/network_connector_endpoints/' + ep_id + '/connect'
-        response = requests.put(connectorURL,
+        response = k5http.put(connectorURL,
                                 headers={
                                     'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                 json={"interface":
@@ -1293,7 +1624,7 @@ def disconnect_network_connector_endpoint(k5token, ep_id, port_id, region):
     try:
         connectorURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/network_connector_endpoints/' + ep_id + '/disconnect'
-        response = requests.put(connectorURL,
+        response = k5http.put(connectorURL,
                                 headers={
                                     'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                 json={"interface":
@@ -1304,7 +1635,7 @@ def disconnect_network_connector_endpoint(k5token, ep_id, port_id, region):
         return ("\nUnexpected error:", sys.exc_info())
 
 
-def list_network_connectors(k5token, region):
+def list_network_connectors(k5token, region, fields=None):
     """Summary
 
     Args:
@@ -1314,6 +1645,8 @@ def list_network_connectors(k5token, region):
         projectid (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'name'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -1321,14 +1654,15 @@ def list_network_connectors(k5token, region):
     try:
         connectorURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/network_connectors'
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
         return ("\nUnexpected error:", sys.exc_info())
 
 
-def list_network_connector_endpoints(k5token, region):
+def list_network_connector_endpoints(k5token, region, fields=None):
     """Summary
 
     Args:
@@ -1338,6 +1672,8 @@ def list_network_connector_endpoints(k5token, region):
         projectid (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'network_connector_id'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -1345,7 +1681,8 @@ def list_network_connector_endpoints(k5token, region):
     try:
         connectorURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/network_connector_endpoints'
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1368,7 +1705,7 @@ def show_network_connector_ep_interfaces(k5token, endpoint_id, region):
     try:
         connectorURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/network_connector_endpoints/' + endpoint_id + '/interfaces'
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1392,7 +1729,7 @@ def show_network_connector_details(k5token, connector_id, contract, region):
     try:
         connectorURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/network_connectors/' + connector_id
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1416,7 +1753,7 @@ def show_network_connector_ep_details(k5token, endpoint_id, region):
     try:
         connectorURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/network_connector_endpoints/' + endpoint_id
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1440,7 +1777,7 @@ def delete_network_connector_ep(k5token, endpoint_id, region):
     try:
         connectorURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/network_connector_endpoints/' + endpoint_id
-        response = requests.delete(connectorURL,
+        response = k5http.delete(connectorURL,
                                    headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1465,7 +1802,7 @@ def delete_network_connector(k5token, connector_id, region):
     try:
         connectorURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/network_connectors/' + connector_id
-        response = requests.delete(connectorURL,
+        response = k5http.delete(connectorURL,
                                    headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1495,7 +1832,7 @@ def create_port(k5token, name, netid, sg_id, az, region):
     portURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/ports'
     try:
-        response = requests.post(portURL,
+        response = k5http.post(portURL,
                                  headers={
                                      'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={"port":
@@ -1536,7 +1873,7 @@ def create_fixed_ip_port_on_network(k5token, az_name, port_name, ip_address, net
     portURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/ports'
     try:
-        response = requests.post(portURL,
+        response = k5http.post(portURL,
                                  headers={
                                      'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={"port":
@@ -1571,7 +1908,7 @@ def attach_interface_to_server(k5token, project_id, net_id, server_id, region):
     serverURL = 'https://compute.' + region + '.cloud.global.fujitsu.com/v2/' + \
         project_id + '/servers/' + server_id + '/os-interface'
     try:
-        response = requests.post(serverURL,
+        response = k5http.post(serverURL,
                                  headers={
                                      'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={"interfaceAttachment":
@@ -1582,7 +1919,7 @@ def attach_interface_to_server(k5token, project_id, net_id, server_id, region):
         return ("\nUnexpected error:", sys.exc_info())
 
 
-def list_security_groups(k5token, region):
+def list_security_groups(k5token, region, fields=None):
     """Summary
 
     Args:
@@ -1591,6 +1928,8 @@ def list_security_groups(k5token, region):
         project (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'name'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -1598,7 +1937,8 @@ def list_security_groups(k5token, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/security-groups'
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1623,7 +1963,7 @@ def show_security_group(k5token, sg_id, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/security-groups/' + sg_id
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1647,7 +1987,7 @@ def delete_security_group(k5token, sg_id, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/security-groups/' + sg_id
     try:
-        response = requests.delete(connectorURL,
+        response = k5http.delete(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1670,7 +2010,7 @@ def create_security_group(k5token, name, description, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/security-groups'
     try:
-        response = requests.post(connectorURL,
+        response = k5http.post(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                 json={
                                         "security_group": {
@@ -1685,7 +2025,7 @@ def create_security_group(k5token, name, description, region):
 
 
 
-def list_security_group_rules(k5token, region):
+def list_security_group_rules(k5token, region, fields=None, sg_id=None):
     """Summary
 
     Args:
@@ -1694,14 +2034,22 @@ def list_security_group_rules(k5token, region):
         project (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'direction'] - default all attributes
+        sg_id (TYPE): optional security group id - only that group's rules
+        are returned
 
     Returns:
         TYPE: Description
     """
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/security-group-rules'
+    params = field_projection(fields) or {}
+    if sg_id is not None:
+        params['security_group_id'] = sg_id
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
+                                params=params or None,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1726,7 +2074,7 @@ def show_security_group_rule(k5token, sgr_id, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/security-group-rules/' + sgr_id
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1750,14 +2098,15 @@ def delete_security_group_rule(k5token, sgr_id, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/security-group-rules/' + sgr_id
     try:
-        response = requests.delete(connectorURL,
+        response = k5http.delete(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
         return ("\nUnexpected error:", sys.exc_info())
 
 
-def create_security_group_rule(k5token, sgid, direction, portmin, portmax, protocol, region):
+def create_security_group_rule(k5token, sgid, direction, portmin, portmax, protocol, region,
+                               ethertype="IPv4", remote_ip_prefix=None, remote_group_id=None):
     """Summary
 
     Args:
@@ -1767,30 +2116,36 @@ def create_security_group_rule(k5token, sgid, direction, portmin, portmax, proto
         sg_id (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
+        ethertype (TYPE): IPv4 or IPv6
+        remote_ip_prefix (TYPE): optional CIDR the rule applies to
+        remote_group_id (TYPE): optional security group the rule applies to
 
     Returns:
         TYPE: Description
     """
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/security-group-rules'
+    rule = {
+            "direction": direction,
+            "port_range_min": portmin,
+            "ethertype": ethertype,
+            "port_range_max": portmax,
+            "protocol": protocol,
+            "security_group_id": sgid
+            }
+    if remote_ip_prefix is not None:
+        rule["remote_ip_prefix"] = remote_ip_prefix
+    if remote_group_id is not None:
+        rule["remote_group_id"] = remote_group_id
     try:
-        response = requests.post(connectorURL,
+        response = k5http.post(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
-                                json={
-                                        "security_group_rule": {
-                                            "direction": direction,
-                                            "port_range_min": portmin,
-                                            "ethertype": "IPv4",
-                                            "port_range_max": portmax,
-                                            "protocol": protocol,
-                                            "security_group_id": sgid
-                                            }
-                                        })
+                                json={"security_group_rule": rule})
         return response
     except:
         return ("\nUnexpected error:", sys.exc_info())
 
-def list_device_ports(k5token, device, region):
+def list_device_ports(k5token, device, region, fields=None):
     """Summary
 
     Args:
@@ -1799,6 +2154,8 @@ def list_device_ports(k5token, device, region):
         project (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'device_owner'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -1806,13 +2163,14 @@ def list_device_ports(k5token, device, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/ports?device_id=' + device
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
         return ("\nUnexpected error:", sys.exc_info())
 
-def list_ports(k5token, region):
+def list_ports(k5token, region, fields=None):
     """Summary
 
     Args:
@@ -1821,6 +2179,8 @@ def list_ports(k5token, region):
         project (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'device_owner'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -1828,7 +2188,8 @@ def list_ports(k5token, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/ports'
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1852,7 +2213,7 @@ def show_port(k5token, port_id, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/ports/' + port_id
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1877,7 +2238,7 @@ def update_port(k5token, port_id, address_pairs, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/ports/' + port_id
     try:
-        response = requests.put(connectorURL,
+        response = k5http.put(connectorURL,
                                 headers={
                                     'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                 json={"port":
@@ -1904,7 +2265,7 @@ def delete_port(k5token, port_id, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/ports/' + port_id
     try:
-        response = requests.delete(connectorURL,
+        response = k5http.delete(connectorURL,
                                    headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -1930,7 +2291,7 @@ def inter_project_connection_create(k5token, router, port, region):
         '.cloud.global.fujitsu.com/v2.0/routers/' + \
         router + '/add_cross_project_router_interface'
     try:
-        response = requests.put(routerURL,
+        response = k5http.put(routerURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                 json={"port_id": port})
@@ -1959,7 +2320,7 @@ def inter_project_connection_remove(k5token, router, port, region):
         router + '/remove_cross_project_router_interface'
     print routerURL
     try:
-        response = requests.put(routerURL,
+        response = k5http.put(routerURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                 json={"port_id": port})
@@ -1992,7 +2353,7 @@ def add_static_route_to_subnet(k5token, subnetid, routes, region):
     subnetURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/subnets/' + subnetid
     try:
-        response = requests.put(subnetURL,
+        response = k5http.put(subnetURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                 json={"subnet": {"host_routes":  routes}})
@@ -2001,7 +2362,7 @@ def add_static_route_to_subnet(k5token, subnetid, routes, region):
         return ("\nUnexpected error:", sys.exc_info())
 
 
-def list_networks(k5token, region):
+def list_networks(k5token, region, fields=None):
     """Summary
 
     Args:
@@ -2009,6 +2370,8 @@ def list_networks(k5token, region):
         subnetid (TYPE): Description
         routes (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'name'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -2024,7 +2387,8 @@ def list_networks(k5token, region):
     subnetURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/networks'
     try:
-        response = requests.get(subnetURL,
+        response = k5http.get(subnetURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'})
         return response
@@ -2055,7 +2419,7 @@ def create_network(k5token, name, az, region):
     subnetURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/networks'
     try:
-        response = requests.post(subnetURL,
+        response = k5http.post(subnetURL,
                                  headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                  json={
@@ -2093,7 +2457,7 @@ def update_network(k5token, netid, state, region):
     subnetURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/networks/' + netid
     try:
-        response = requests.put(subnetURL,
+        response = k5http.put(subnetURL,
                                  headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                  json={
@@ -2130,7 +2494,7 @@ def show_network(k5token, netid, region):
     subnetURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/networks/' + netid
     try:
-        response = requests.get(subnetURL,
+        response = k5http.get(subnetURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'})
         return response
@@ -2160,7 +2524,7 @@ def delete_network(k5token, netid, region):
     subnetURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/networks/' + netid
     try:
-        response = requests.delete(subnetURL,
+        response = k5http.delete(subnetURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'})
         return response
@@ -2169,7 +2533,7 @@ def delete_network(k5token, netid, region):
 
 
 
-def list_subnets(k5token, region):
+def list_subnets(k5token, region, fields=None):
     """Summary
 
     Args:
@@ -2177,6 +2541,8 @@ def list_subnets(k5token, region):
         subnetid (TYPE): Description
         routes (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'cidr'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -2192,7 +2558,8 @@ def list_subnets(k5token, region):
     subnetURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/subnets'
     try:
-        response = requests.get(subnetURL,
+        response = k5http.get(subnetURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'})
         return response
@@ -2223,7 +2590,7 @@ def show_subnet(k5token, subnetid, region):
     subnetURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/subnets/' + subnetid
     try:
-        response = requests.get(subnetURL,
+        response = k5http.get(subnetURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'})
         return response
@@ -2254,7 +2621,7 @@ def delete_subnet(k5token, subnetid, region):
     subnetURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/subnets/' + subnetid
     try:
-        response = requests.delete(subnetURL,
+        response = k5http.delete(subnetURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'})
         return response
@@ -2280,7 +2647,7 @@ def create_subnet(k5token, name, netid, version, cidr, az, region):
         '.cloud.global.fujitsu.com/v2.0/subnets'
     try:
 
-        response = requests.post(subnetURL,
+        response = k5http.post(subnetURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                 json={
@@ -2321,7 +2688,7 @@ def update_subnet(k5token, subnetid, region):
         '.cloud.global.fujitsu.com/v2.0/subnets/' + subnetid
     try:
 
-        response = requests.put(subnetURL,
+        response = k5http.put(subnetURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                 json={"subnet": {"host_routes":  []}})
@@ -2350,7 +2717,7 @@ def update_subnet(k5token, subnetid, region):
 #     subnetURL = 'https://networking.' + region + \
 #         '.cloud.global.fujitsu.com/v2.0/subnets/' + subnetid
 #     try:
-#         response = requests.get(subnetURL,
+#         response = k5http.get(subnetURL,
 #                             headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
 #         return response
 #     except:
@@ -2378,7 +2745,7 @@ def show_router(k5token, routerid, region):
     try:
         routerURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/routers/' + routerid
-        response = requests.get(routerURL,
+        response = k5http.get(routerURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -2406,20 +2773,22 @@ def delete_router(k5token, routerid, region):
     try:
         routerURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/routers/' + routerid
-        response = requests.delete(routerURL,
+        response = k5http.delete(routerURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
         return ("\nUnexpected error:", sys.exc_info())
 
 
-def list_routers(k5token, region):
+def list_routers(k5token, region, fields=None):
     """Summary
 
     Args:
         k5token (TYPE): Description
         routerid (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'name'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -2434,7 +2803,8 @@ def list_routers(k5token, region):
     try:
         routerURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/routers'
-        response = requests.get(routerURL,
+        response = k5http.get(routerURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -2457,7 +2827,7 @@ def create_router(k5token, name, state, az, region):
     try:
         routerURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/routers'
-        response = requests.post(routerURL,
+        response = k5http.post(routerURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                 json={
@@ -2487,7 +2857,7 @@ def update_router_routes(k5token, routerid, routes, region):
     try:
         routerURL = 'https://networking-ex.' + region + \
             '.cloud.global.fujitsu.com/v2.0/routers/' + routerid
-        response = requests.put(routerURL,
+        response = k5http.put(routerURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                 json={"router": {"routes": routes}})
@@ -2511,7 +2881,7 @@ def update_router_gateway(k5token, routerid, netid, region):
     try:
         routerURL = 'https://networking-ex.' + region + \
             '.cloud.global.fujitsu.com/v2.0/routers/' + routerid
-        response = requests.put(routerURL,
+        response = k5http.put(routerURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                 json={
@@ -2547,7 +2917,7 @@ def remove_interface_from_router(k5token, routerid, port_id, region):
         routerURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/routers/' + routerid + '/remove_router_interface'
         #print routerURL
-        response = requests.put(routerURL,
+        response = k5http.put(routerURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                 json={
@@ -2584,7 +2954,7 @@ def add_port_to_router(k5token, routerid, port_id, region):
         routerURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/routers/' + routerid + '/add_router_interface'
         #print routerURL
-        response = requests.put(routerURL,
+        response = k5http.put(routerURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                 json={
@@ -2621,7 +2991,7 @@ def add_interface_to_router(k5token, routerid, subnet_id, region):
         routerURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/routers/' + routerid + '/add_router_interface'
         #print routerURL
-        response = requests.put(routerURL,
+        response = k5http.put(routerURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'},
                                 json={
@@ -2660,7 +3030,7 @@ def show_router_interfaces(k5token, routerid, region):
         routerURL = 'https://networking.' + region + \
             '.cloud.global.fujitsu.com/v2.0/ports?device_id=' + routerid
         #print routerURL
-        response = requests.get(routerURL,
+        response = k5http.get(routerURL,
                                 headers={'X-Auth-Token': k5token,
                                          'Content-Type': 'application/json'})
         return response
@@ -2676,7 +3046,7 @@ def show_router_interfaces(k5token, routerid, region):
 ################# VPNaaS #################
 
 
-def list_ipsec_policies(k5token, region):
+def list_ipsec_policies(k5token, region, fields=None):
     """Summary
 
     Args:
@@ -2685,6 +3055,8 @@ def list_ipsec_policies(k5token, region):
         project (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'encryption_algorithm'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -2692,7 +3064,8 @@ def list_ipsec_policies(k5token, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ipsecpolicies'
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -2716,7 +3089,7 @@ def show_ipsec_policy(k5token, policy_id, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ipsecpolicies/' + policy_id
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -2744,7 +3117,7 @@ def create_ipsec_policy(k5token, name, protocol, auth_alg, enc_alg, encapmode, p
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ipsecpolicies'
     try:
-        response = requests.post(connectorURL,
+        response = k5http.post(connectorURL,
                                  headers={
                                      'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={
@@ -2787,7 +3160,7 @@ def update_ipsec_policy(k5token, name, protocol, auth_alg, enc_alg, encapmode, p
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ipsecpolicies'
     try:
-        response = requests.put(connectorURL,
+        response = k5http.put(connectorURL,
                                 headers={
                                     'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={
@@ -2826,14 +3199,14 @@ def delete_ipsec_policy(k5token, policy_id, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ipsecpolicies/' + policy_id
     try:
-        response = requests.delete(connectorURL,
+        response = k5http.delete(connectorURL,
                                    headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
         return ("\nUnexpected error:", sys.exc_info())
 
 
-def list_ipsec_site_connections(k5token, region):
+def list_ipsec_site_connections(k5token, region, fields=None):
     """Summary
 
     Args:
@@ -2842,6 +3215,8 @@ def list_ipsec_site_connections(k5token, region):
         project (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'peer_address'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -2849,7 +3224,8 @@ def list_ipsec_site_connections(k5token, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ipsec-site-connections'
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -2873,7 +3249,7 @@ def show_ipsec_site_connection(k5token, connectionid, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ipsec-site-connections/' + connectionid
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -2896,7 +3272,7 @@ def create_ipsec_site_connections(k5token, name, vpnsid, ikepid, secpid, peeradr
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ipsec-site-connections'
     try:
-        response = requests.post(connectorURL,
+        response = k5http.post(connectorURL,
                                  headers={
                                      'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={
@@ -2940,7 +3316,7 @@ def update_ipsec_site_connections(k5token, vpnsid, ikepid, secpid, peeradr, peer
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ipsec-site-connections'
     try:
-        response = requests.put(connectorURL,
+        response = k5http.put(connectorURL,
                                 headers={
                                     'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                 json={
@@ -2985,14 +3361,14 @@ def delete_ipsec_site_connection(k5token, connectionid, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ipsec-site-connections/' + connectionid
     try:
-        response = requests.delete(connectorURL,
+        response = k5http.delete(connectorURL,
                                    headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
         return ("\nUnexpected error:", sys.exc_info())
 
 
-def list_vpn_services(k5token, region):
+def list_vpn_services(k5token, region, fields=None):
     """Summary
 
     Args:
@@ -3001,6 +3377,8 @@ def list_vpn_services(k5token, region):
         project (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'router_id'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -3010,7 +3388,8 @@ def list_vpn_services(k5token, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/vpnservices'
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -3035,7 +3414,7 @@ def show_vpn_service(k5token, serviceid, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/vpnservices/' + serviceid
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -3058,7 +3437,7 @@ def create_vpn_service(k5token, name, routerid, subnetid, az, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/vpnservices'
     try:
-        response = requests.post(connectorURL,
+        response = k5http.post(connectorURL,
                                  headers={
                                      'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={
@@ -3092,7 +3471,7 @@ def update_vpn_service(k5token, name, routerid, subnetid, az, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/vpnservices/' + serviceid
     try:
-        response = requests.put(connectorURL,
+        response = k5http.put(connectorURL,
                                  headers={
                                      'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={
@@ -3126,14 +3505,14 @@ def delete_vpn_service(k5token, serviceid, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/vpnservices/' + serviceid
     try:
-        response = requests.delete(connectorURL,
+        response = k5http.delete(connectorURL,
                                    headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
         return ("\nUnexpected error:", sys.exc_info())
 
 
-def list_ike_policies(k5token, region):
+def list_ike_policies(k5token, region, fields=None):
     """Summary
 
     Args:
@@ -3142,6 +3521,8 @@ def list_ike_policies(k5token, region):
         project (TYPE): Description
         contract (TYPE): Description
         region (TYPE): Description
+        fields (TYPE): optional list of attributes to return e.g.
+        ['id', 'ike_version'] - default all attributes
 
     Returns:
         TYPE: Description
@@ -3149,7 +3530,8 @@ def list_ike_policies(k5token, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ikepolicies'
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
+                                params=field_projection(fields),
                                 headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -3173,7 +3555,7 @@ def show_ike_policy(k5token, policyid, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ikepolicies/' + policyid
     try:
-        response = requests.get(connectorURL,
+        response = k5http.get(connectorURL,
                             headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -3197,7 +3579,7 @@ def delete_ike_policy(k5token, policyid, region):
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ikepolicies/' + policyid
     try:
-        response = requests.delete(connectorURL,
+        response = k5http.delete(connectorURL,
                                    headers={'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'})
         return response
     except:
@@ -3220,7 +3602,7 @@ def create_ike_policies(k5token, name, authalg, encryalg, ikelt, ikev, pfs, neg,
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ikepolicies'
     try:
-        response = requests.post(connectorURL,
+        response = k5http.post(connectorURL,
                                  headers={
                                      'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                  json={
@@ -3259,7 +3641,7 @@ def update_ike_policies(k5token, name, authalg, encryalg, ikelt, ikev, pfs, neg,
     connectorURL = 'https://networking.' + region + \
         '.cloud.global.fujitsu.com/v2.0/vpn/ikepolicies/' + policyid
     try:
-        response = requests.put(connectorURL,
+        response = k5http.put(connectorURL,
                                 headers={
                                     'X-Auth-Token': k5token, 'Content-Type': 'application/json', 'Accept': 'application/json'},
                                 json={
@@ -3282,12 +3664,23 @@ def update_ike_policies(k5token, name, authalg, encryalg, ikelt, ikev, pfs, neg,
         return ("\nUnexpected error:", sys.exc_info())
 
 
+# containers known to exist - (region, projectid, container_name)
+_known_containers = set()
+_known_containers_lock = threading.Lock()
+
+
 # create a container
-def create_new_storage_container(k5token, projectid, container_name):
-    """Summary
+def create_new_storage_container(k5token, projectid, container_name, region, read_acl=None):
+    """Summary - create a container, private unless a read ACL is given.
+    PUT on an existing container replaces its read ACL when one is given
 
     Args:
+        k5token (TYPE): valid project scoped token
+        projectid (TYPE): project id
         container_name (TYPE): Description
+        region (TYPE): K5 region
+        read_acl (TYPE): X-Container-Read value e.g. '.r:*' for world
+        readable, default None sends no read ACL
 
     Returns:
         TYPE: Description
@@ -3295,83 +3688,174 @@ def create_new_storage_container(k5token, projectid, container_name):
     # get a regional domain scoped token to make queries to facilitate conversion of object names to ids
     #scoped_k5token = get_scoped_token()
     objectURL = 'https://objectstorage.' + region + '.cloud.global.fujitsu.com/v1/AUTH_' + projectid + '/' + container_name
-    response = requests.put(objectURL,
-                             headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','X-Container-Read': '.r:*'})
+    headers = {'X-Auth-Token':k5token,'Content-Type': 'application/json'}
+    if read_acl is not None:
+        headers['X-Container-Read'] = read_acl
+    response = k5http.put(objectURL,
+                             headers=headers)
+    if response.status_code in (201, 202, 204):
+        with _known_containers_lock:
+            _known_containers.add((region, projectid, container_name))
 
     return response
 
+
+def ensure_storage_container(k5token, projectid, container_name, region, public=False):
+    """Summary - make sure a container exists the first time it is used by
+    this process - later calls are answered from memory. An existing
+    container is only checked with a HEAD, so its ACL is never changed
+
+    Args:
+        public (TYPE): True to create a missing container world readable,
+        default private
+
+    Returns:
+        TYPE: None if the container exists, otherwise the failed response
+    """
+    with _known_containers_lock:
+        if (region, projectid, container_name) in _known_containers:
+            return None
+    objectURL = 'https://objectstorage.' + region + '.cloud.global.fujitsu.com/v1/AUTH_' + projectid + '/' + container_name
+    response = k5http.head(objectURL,
+                              headers={'X-Auth-Token':k5token})
+    if response.status_code == 404:
+        response = create_new_storage_container(k5token, projectid, container_name, region,
+                                                '.r:*' if public else None)
+    if response.status_code in (200, 201, 202, 204):
+        with _known_containers_lock:
+            _known_containers.add((region, projectid, container_name))
+        return None
+    return response
+
+
+def forget_missing_container(response, projectid, container_name, region):
+    """Summary - a 404 on an object PUT means the container was deleted
+    behind our back, so the next upload recreates it
+    """
+    if response.status_code == 404:
+        with _known_containers_lock:
+            _known_containers.discard((region, projectid, container_name))
+
+
+def file_chunks(fileobj, chunk_size=None):
+    """Summary - read a file in fixed size chunks so an upload streams with
+    constant memory
+
+    Args:
+        fileobj (TYPE): open file or file like object
+        chunk_size (TYPE): bytes per chunk, default K5_UPLOAD_CHUNK_SIZE
+
+    Returns:
+        TYPE: generator of byte strings
+    """
+    chunk_size = chunk_size or upload_chunk_size
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
 # upload a file to a container
-def upload_file_to_container(k5token, projectid, container_name, file_path):
-    """Summary
+def upload_file_to_container(k5token, projectid, container_name, file_path, region):
+    """Summary - stream a file into a container in fixed size chunks
 
     Args:
+        k5token (TYPE): valid project scoped token
+        projectid (TYPE): project id
         container_name (TYPE): Description
         file_path (TYPE): Description
+        region (TYPE): K5 region
 
     Returns:
         TYPE: Description
     """
-    newContainer = create_new_storage_container(k5token, projectid, container_name)
-
-    # get a regional domain scoped token to make quobjecteries to facilitate conversion of object names to ids
-    #scoped_k5token = get_scoped_token()
+    try:
+        newContainer = ensure_storage_container(k5token, projectid, container_name, region, public=True)
+        if newContainer is not None:
+            return newContainer
 
-    uploadfile = open(file_path, 'rb')
-    # extract filename from file path suplied at cli
-    file_name = ntpath.basename(file_path)
-    data = uploadfile.read()
-    objectURL = 'https://objectstorage.' + region + '.cloud.global.fujitsu.com/v1/AUTH_' + projectid + '/' + container_name + '/' + file_name
-    print objectURL
+        # extract filename from file path suplied at cli
+        file_name = ntpath.basename(file_path)
+        objectURL = 'https://objectstorage.' + region + '.cloud.global.fujitsu.com/v1/AUTH_' + projectid + '/' + container_name + '/' + file_name
 
-    response = requests.put(objectURL,
-                              data=data,
-                              headers={'X-Auth-Token':k5token,'Content-Type': 'application/octet-stream','X-Container-Read': '.r:*'})
+        with open(file_path, 'rb') as uploadfile:
+            response = k5http.put(objectURL,
+                                      data=file_chunks(uploadfile),
+                                      headers={'X-Auth-Token':k5token,'Content-Type': 'application/octet-stream','X-Container-Read': '.r:*'})
+        forget_missing_container(response, projectid, container_name, region)
 
-    uploadfile.close
-    return response
+        return response
+    except:
+        return ("\nUnexpected error:", sys.exc_info())
 
 # upload a file to a container
-def upload_object_to_container(k5token, projectid, container_name, storage_object, object_name):
+def upload_object_to_container(k5token, projectid, container_name, storage_object, object_name, region, content_type='application/octet-stream'):
     """Summary
 
     Args:
+        k5token (TYPE): valid project scoped token
+        projectid (TYPE): project id
         container_name (TYPE): Description
-        object (TYPE): Description
+        storage_object (TYPE): bytes, or a file like object which is
+        streamed in fixed size chunks
+        object_name (TYPE): Description
+        region (TYPE): K5 region
+        content_type (TYPE): Content-Type the object is served with
 
     Returns:
         TYPE: Description
     """
-    newContainer = create_new_storage_container(k5token, projectid, container_name)
-
-    # get a regional domain scoped token to make quobjecteries to facilitate conversion of object names to ids
+    try:
+        newContainer = ensure_storage_container(k5token, projectid, container_name, region, public=True)
+        if newContainer is not None:
+            return newContainer
 
-    data = storage_object
-    objectURL = 'https://objectstorage.' + region + '.cloud.global.fujitsu.com/v1/AUTH_' + projectid + '/' + container_name + '/' + object_name
-    print objectURL
+        data = storage_object
+        if hasattr(storage_object, 'read'):
+            data = file_chunks(storage_object)
+        objectURL = 'https://objectstorage.' + region + '.cloud.global.fujitsu.com/v1/AUTH_' + projectid + '/' + container_name + '/' + object_name
 
-    response = requests.put(objectURL,
-                              data=data,
-                              headers={'X-Auth-Token':k5token,'Content-Type': 'application/octet-stream','X-Container-Read': '.r:*'})
+        response = k5http.put(objectURL,
+                                  data=data,
+                                  headers={'X-Auth-Token':k5token,'Content-Type': content_type,'X-Container-Read': '.r:*'})
+        forget_missing_container(response, projectid, container_name, region)
 
-    return response
+        return response
+    except:
+        return ("\nUnexpected error:", sys.exc_info())
 
 
-# list items in a container
-def view_items_in_storage_container(k5token, projectid, container_name, region):
+# list items in a container - one page of up to 10000 names, filtered by
+# prefix/delimiter and starting after marker when given. k5ObjectStorage
+# iter_objects follows every page
+def view_items_in_storage_container(k5token, projectid, container_name, region, prefix=None, delimiter=None, marker=None):
 
-    identityURL = 'https://objectstorage.' + region + '.cloud.global.fujitsu.com/v1/AUTH_' + projectid + '/' + container_name + '?format=json'
-    response = requests.get(identityURL,
+    identityURL = 'https://objectstorage.' + region + '.cloud.global.fujitsu.com/v1/AUTH_' + projectid + '/' + container_name
+    params = {'format': 'json'}
+    for name, value in (('prefix', prefix), ('delimiter', delimiter), ('marker', marker)):
+        if value is not None:
+            params[name] = value
+    response = k5http.get(identityURL,
+                             params=params,
                              headers={'X-Auth-Token':k5token,'Content-Type': 'application/json'})
 
     return response
 
-# download item in a container
-def download_item_in_storage_container(k5token, projectid, container_name, object_name, region):
+# download item in a container - pass stream=True to read the body with
+# response.iter_content() instead of loading it, and byte_range e.g.
+# 'bytes=0-1023' for part of it. k5ObjectStorage has file, resume and
+# parallel downloads
+def download_item_in_storage_container(k5token, projectid, container_name, object_name, region, stream=False, byte_range=None):
 
     identityURL = 'https://objectstorage.' + region + '.cloud.global.fujitsu.com/v1/AUTH_' + projectid + '/' + container_name + '/' + object_name
 
-    response = requests.get(identityURL,
-                             headers={'X-Auth-Token':k5token,'Content-Type': 'application/json'})
+    headers = {'X-Auth-Token':k5token,'Content-Type': 'application/json'}
+    if byte_range is not None:
+        headers['Range'] = byte_range
+    response = k5http.get(identityURL,
+                             stream=stream,
+                             headers=headers)
 
     return response
 
@@ -3391,7 +3875,7 @@ def launch_heat_stack(stack_name,stack_url):
     scoped_k5token = get_scoped_token()
 
     orchestrationURL = 'https://orchestration.' + region + '.cloud.global.fujitsu.com/v1/' + projectid + '/stacks'
-    response = requests.post(orchestrationURL,
+    response = k5http.post(orchestrationURL,
                               headers={'X-Auth-Token':scoped_k5token,'Content-Type': 'application/json','Accept':'application/json'},
                              json={
                                     "disable_rollback": True,
@@ -3412,7 +3896,7 @@ def list_heat_stacks(k5token, projectid, region):
 
     orchestrationURL = 'https://orchestration.' + region + '.cloud.global.fujitsu.com/v1/' + projectid + '/stacks'
     try:
-        response = requests.get(orchestrationURL,
+        response = k5http.get(orchestrationURL,
                                   headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'})
 
         return response
@@ -3421,44 +3905,72 @@ def list_heat_stacks(k5token, projectid, region):
 
 
 # delete heat stacks - pass PURGE in as stackname to delete ALL stacks
+def delete_heat_stack_by_id(k5token, stack_name, stack_id, projectid,
+                            region):
+    """Summary - delete one heat stack whose id is already known, without
+    listing the project's stacks first
+
+    Args:
+        k5token (TYPE): valid project scoped token
+        stack_name (TYPE): stack name
+        stack_id (TYPE): stack id
+        projectid (TYPE): project id
+        region (TYPE): K5 region
+
+    Returns:
+        TYPE: http response object
+    """
+    try:
+        stackURL = 'https://orchestration.' + region + \
+            '.cloud.global.fujitsu.com/v1/' + projectid + '/stacks/' + \
+            stack_name + '/' + stack_id
+        return k5http.delete(stackURL,
+                             headers={'X-Auth-Token': k5token,
+                                      'Content-Type': 'application/json',
+                                      'Accept': 'application/json'})
+    except:
+        return ("\nUnexpected error:", sys.exc_info())
+
+
 def delete_heat_stack(k5token, stack_name, projectid, region):
-    """Summary
+    """Summary - delete a heat stack, or every stack in the project when
+    stack_name is PURGE. The delete requests are sent concurrently.
 
     Args:
-        stack_name (TYPE): Description
+        k5token (TYPE): valid project scoped token
+        stack_name (TYPE): stack name or PURGE for all stacks
+        projectid (TYPE): project id
+        region (TYPE): K5 region
 
     Returns:
-        TYPE: Description
+        TYPE: True if every delete request was accepted, False if one
+        failed or a stack was not yet in a deletable state
+        (True if no stack matched)
     """
     orchestrationURL = 'https://orchestration.' + region + '.cloud.global.fujitsu.com/v1/' + projectid + '/stacks'
     try:
-        stackList = requests.get(orchestrationURL,
+        stackList = k5http.get(orchestrationURL,
                                   headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'}).json()
 
-        # flag to capture if all stack delete requests were sent successfully = 204 response
-        stackDeleteStatus = True
-
-        # check to see if there are any stacks
-        if (len(stackList['stacks']) > 0):
-
-            # loop thru all the stacks
-            for stack in stackList['stacks']:
-                # check if we're deleting ALL stacks - special stackname set to PURGE or just a single stack
-                if (stack_name == "PURGE") or (stack_name == stack.get('stack_name')) :
-                    # ensure the stack has completed or errored before we kill a stack mid build and cause database inconsistencies
-                    # Note: some stacks tack several delete attempts before deleting successfully - heat icehouse bug???
-                    if (stack.get('stack_status') == "CREATE_COMPLETE") or (stack.get('stack_status') == "CREATE_FAILED") or (stack.get('stack_status') == "DELETE_FAILED"):
-                        # flag to capture if all stack delete requests were sent successfully = 204 response
-                        stackDeleteStatus = False
-                        orchestrationURL = 'https://orchestration.' + region + '.cloud.global.fujitsu.com/v1/' + projectid + '/stacks/' + stack.get('stack_name') + '/' + stack.get('id')
-                        deleteStack = requests.delete(orchestrationURL,
-                                  headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'})
-                        if deleteStack.status_code == 204:
-                            # flag to capture if all stack delete requests were sent successfully = 204 response
-                            stackDeleteStatus = True
+        # check if we're deleting ALL stacks - special stackname set to PURGE or just a single stack
+        stacks = [stack for stack in stackList['stacks']
+                  if (stack_name == "PURGE") or (stack_name == stack.get('stack_name'))]
+
+        # ensure the stack has completed or errored before we kill a stack mid build and cause database inconsistencies
+        # Note: some stacks tack several delete attempts before deleting successfully - heat icehouse bug???
+        deletable = [stack for stack in stacks
+                     if stack.get('stack_status') in ("CREATE_COMPLETE", "CREATE_FAILED", "DELETE_FAILED")]
+
+        def delete_stack(stack):
+            deleteStack = delete_heat_stack_by_id(
+                k5token, stack.get('stack_name'), stack.get('id'),
+                projectid, region)
+            return getattr(deleteStack, 'status_code', None) == 204
+
+        results = parallel_map(delete_stack, deletable)
 
         # returns True for success or False for potential debug or recall attempt required
-        return stackDeleteStatus
+        return all(results) and len(deletable) == len(stacks)
     except:
         return ("\nUnexpected error:", sys.exc_info())
 
@@ -3478,7 +3990,7 @@ def create_alexa_server(name):
     metaname = name + "-alexa"
 
 
-    response = requests.post(serverURL,
+    response = k5http.post(serverURL,
                             headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'},
                             json={"server": {
 
@@ -3517,7 +4029,7 @@ def create_server(k5token, name, imageid, flavorid, sshkey, sgname, az, volsize,
     try:
 
 
-        response = requests.post(serverURL,
+        response = k5http.post(serverURL,
                                 headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'},
                                 json={"server": {
 
@@ -3557,7 +4069,7 @@ def server_action(k5token, actionname, actionvalue, serverid, projectid, region)
     try:
 
 
-        response = requests.post(serverURL,
+        response = k5http.post(serverURL,
                                 headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'},
                                 json={ actionname : actionvalue })
 
@@ -3578,7 +4090,7 @@ def create_server_with_port(k5token, name, imageid, flavorid, sshkey, sgname, az
     try:
 
 
-        response = requests.post(serverURL,
+        response = k5http.post(serverURL,
                                 headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'},
                                 json={"server": {
 
@@ -3607,51 +4119,69 @@ def create_server_with_port(k5token, name, imageid, flavorid, sshkey, sgname, az
 
 
 # Add server to project
-def delete_all_servers():
-    """Summary
+def delete_all_servers(k5token, projectid, region):
+    """Summary - delete every server in a project, sending the delete
+    requests concurrently
+
+    Args:
+        k5token (TYPE): valid project scoped token
+        projectid (TYPE): project id
+        region (TYPE): K5 region
 
     Returns:
-        TYPE: Description
+        TYPE: "Success" or a list of the servers that could not be deleted
     """
-    # get a regional domain scoped token to list the objects
-    k5token = get_scoped_token()
-    serverURL = 'https://compute.' + region + '.cloud.global.fujitsu.com/v2/' + projectid + '/servers/detail'
-    serverList = requests.get(serverURL,
-                              headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'})
-
-    servers = serverList.json()
-
-    if (len(servers['servers']) > 0):
-
-        for system in servers['servers']:
-            if (system.get('status') == "ACTIVE"):
-
-                DserverURL = 'https://compute.' + region + '.cloud.global.fujitsu.com/v2/' + projectid + '/servers/' + system.get('id')
-                serverResult = requests.delete(DserverURL, headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'})
-
-    return "Success"
+    try:
+        servers = list(iter_servers(k5token, projectid, region))
+
+        def delete(system):
+            serverResult = delete_server(k5token, system.get('id'),
+                                         projectid, region)
+            return system.get('name'), getattr(serverResult, 'status_code',
+                                               serverResult)
+
+        failed = [result for result in parallel_map(delete, servers)
+                  if result[1] not in (204, 404)]
+        if failed:
+            return failed
+        return "Success"
+    except:
+        return ("\nUnexpected error:", sys.exc_info())
 
 
 # Gets quota limits in project
-def get_quota_limits():
-    """Summary
+def get_quota_limits(k5token, projectid, region, availability_zones=None):
+    """Summary - fetch the compute limits of every availability zone in a
+    project concurrently
+
+    Args:
+        k5token (TYPE): valid project scoped token
+        projectid (TYPE): project id
+        region (TYPE): K5 region
+        availability_zones (TYPE): AZ names, default <region>a and <region>b
 
     Returns:
-        TYPE: Description
+        TYPE: {"Availability_Zones": {az: limits json}} or an error string
     """
-    # get a regional domain scoped token to list the objects
-    k5token = get_scoped_token()
-
     # as a result of the K5 enhancements it's necessary to query both AZs and then sum the totals from each AZ to get a true view of Total Used Resources
-    serverQuotaAZ1URL = 'https://compute.' + region + '.cloud.global.fujitsu.com/v2/' + projectid + '/limits?availability_zone=' + availability_zone1
-    serverQuotaAZ2URL = 'https://compute.' + region + '.cloud.global.fujitsu.com/v2/' + projectid + '/limits?availability_zone=' + availability_zone2
-
-    Quota1 = requests.get(serverQuotaAZ1URL,
-                            headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'})
-    Quota2 = requests.get(serverQuotaAZ2URL,
-                            headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'})
+    # - k5Quotas does the summing
+    availability_zones = availability_zones or [region + 'a', region + 'b']
+    serverQuotaURL = 'https://compute.' + region + '.cloud.global.fujitsu.com/v2/' + projectid + '/limits'
+
+    def get_limits(az):
+        try:
+            return az, k5http.get(serverQuotaURL,
+                                  params={'availability_zone': az},
+                                  headers={'X-Auth-Token':k5token,'Content-Type': 'application/json','Accept':'application/json'})
+        except:
+            return az, ("\nUnexpected error:", sys.exc_info())
 
-    response = {"Availability_Zones": { "AZ1_Limits": Quota1.json() ,"AZ2_Limits": Quota2.json()}}
+    response = {"Availability_Zones": {}}
+    for az, quota in parallel_map(get_limits, availability_zones,
+                                  len(availability_zones)):
+        if isinstance(quota, tuple) or quota.status_code != 200:
+            return 'Failed to get quota limits for ' + az + ' - ' + str(getattr(quota, 'status_code', quota))
+        response["Availability_Zones"][az] = quota.json()
 
     return response
 
@@ -3902,8 +4432,8 @@ def main():
     print "Start"
     #print get_keystoneobject_list(
     #         k5token, region, contractid, 'users')
-    for user in get_keystoneobject_list(
-             k5token, region, contractid, 'users')['users']:
+    for user in iter_keystoneobjects(
+             k5token, region, contractid, 'users'):
          if 'land' in user.get('name'):
             if not 't' in user.get('name'):
                 #if not 'g' in user.get('name'):
@@ -0,0 +1,274 @@
+#!/usr/bin/python
+"""Summary: Launch many K5 servers from one template
+
+    Launching a lab used to take one create_server call per VM, each
+    followed by a manual status check. create_servers submits the create
+    requests concurrently, with the number in flight capped so the
+    compute API's rate limit isn't tripped. A 429 or 5xx response is
+    retried with jittered backoff, honouring Retry-After. The servers
+    are then waited on together with one batched list call per poll,
+    until each is ACTIVE or ERROR.
+
+    Before a create is retried after a 5xx, the project is checked for a
+    server of the same name. If the first request did get through, it is
+    not launched twice.
+
+    Tuning via environment variables:
+        K5_BULK_WORKERS  - create requests in flight at once (default 5)
+        K5_BULK_RETRIES  - retries of a throttled or failed create
+                           (default 5)
+        K5_BULK_DEADLINE - seconds to wait for the servers to become
+                           ACTIVE (default 900)
+"""
+
+import getopt
+import json
+import os
+import re
+import sys
+import time
+
+import k5APIwrappersV19 as K5API
+import k5TokenCache
+from k5Parallel import parallel_map
+from k5Waiters import backoff_delays, wait_for_servers
+
+bulk_workers = int(os.getenv('K5_BULK_WORKERS', '5'))
+bulk_retries = int(os.getenv('K5_BULK_RETRIES', '5'))
+bulk_deadline = float(os.getenv('K5_BULK_DEADLINE', '900'))
+
+
+def retryable(response):
+    """Summary - true for throttled, server side or connection failures
+
+    Args:
+        response (TYPE): wrapper result - a response or an error tuple
+
+    Returns:
+        bool: worth retrying
+    """
+    if isinstance(response, tuple):
+        return True
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except (AttributeError, ValueError):
+        return 0
+
+
+def find_server(k5token, project_id, region, name):
+    """Summary - id of a server with exactly this name, using nova's
+    server side name filter
+
+    Returns:
+        string: server id or None
+    """
+    for server in K5API.iterate_k5_collection(
+            k5token,
+            'https://compute.' + region + '.cloud.global.fujitsu.com/v2/' +
+            project_id + '/servers', 'servers',
+            params={'name': '^' + re.escape(name) + '$'}):
+        if server.get('name') == name:
+            return server.get('id')
+    return None
+
+
+def server_names(names=None, count=None, prefix='server'):
+    """Summary - names for the servers to launch
+
+    Args:
+        names (list): explicit names
+        count (int): number of servers named <prefix>-01, <prefix>-02 ...
+
+    Returns:
+        list: server names
+    """
+    if names:
+        return list(names)
+    width = max(2, len(str(count)))
+    return [prefix + '-' + str(number).zfill(width)
+            for number in range(1, count + 1)]
+
+
+def launch_server(k5token, project_id, region, template, name, port_id=None,
+                  retries=None):
+    """Summary - create one server, retrying throttled and failed requests
+
+    Args:
+        k5token (string): project scoped token
+        project_id (string): project id
+        region (string): K5 region
+        template (dict): imageid, flavorid, sshkey, sgname, az, volsize and
+        networkid
+        name (string): server name
+        port_id (string): existing port to attach instead of networkid
+        retries (int): default K5_BULK_RETRIES
+
+    Returns:
+        dict: {'name', 'id', 'attempts', 'error'}
+    """
+    retries = bulk_retries if retries is None else retries
+    if port_id is None:
+        def create():
+            return K5API.create_server(
+                k5token, name, template['imageid'], template['flavorid'],
+                template['sshkey'], template['sgname'], template['az'],
+                template['volsize'], template['networkid'], project_id,
+                region)
+    else:
+        def create():
+            return K5API.create_server_with_port(
+                k5token, name, template['imageid'], template['flavorid'],
+                template['sshkey'], template['sgname'], template['az'],
+                template['volsize'], port_id, project_id, region)
+
+    result = {'name': name, 'id': None, 'attempts': 0, 'error': None}
+    delays = backoff_delays(initial=1, maximum=30)
+    while True:
+        result['attempts'] = result['attempts'] + 1
+        response = create()
+        if not retryable(response):
+            break
+        throttled = not isinstance(response, tuple) and \
+            response.status_code == 429
+        if throttled and result['attempts'] > retries:
+            break
+        time.sleep(max(next(delays), _retry_after(response)))
+        if throttled:
+            continue
+        # the failed create may still have been accepted - checked after
+        # the last attempt too, so an accepted server is never reported
+        # as failed and launched again by a re-run
+        try:
+            result['id'] = find_server(k5token, project_id, region, name)
+        except RuntimeError:
+            result['id'] = None
+        if result['id'] is not None:
+            return result
+        if result['attempts'] > retries:
+            break
+
+    if not isinstance(response, tuple) and response.status_code == 202:
+        result['id'] = response.json()['server'].get('id')
+    else:
+        result['error'] = getattr(response, 'status_code', response)
+    return result
+
+
+def create_servers(k5token, project_id, region, template, names=None,
+                   count=None, prefix='server', port_ids=None, wait=True,
+                   max_workers=None, deadline=None):
+    """Summary - launch a batch of servers from one template and wait for
+    them to become ACTIVE
+
+    Args:
+        k5token (string): project scoped token
+        project_id (string): project id
+        region (string): K5 region
+        template (dict): imageid, flavorid, sshkey, sgname, az, volsize and
+        networkid, as taken by create_server
+        names (list): server names, or
+        count (int): number of servers named <prefix>-NN
+        prefix (string): name prefix used with count
+        port_ids (list): one existing port per server - the servers are
+        created with create_server_with_port
+        wait (bool): False to return once the creates are accepted
+        max_workers (int): creates in flight, default K5_BULK_WORKERS
+        deadline (float): seconds to wait for ACTIVE, default
+        K5_BULK_DEADLINE
+
+    Returns:
+        dict: {'servers': [{'name', 'id', 'attempts', 'error', 'status'}],
+               'active': n, 'failed': n, 'seconds': elapsed}
+    """
+    started = time.time()
+    names = server_names(names, count, prefix)
+    ports = list(port_ids) if port_ids else [None] * len(names)
+    if len(ports) != len(names):
+        raise ValueError('one port id is needed per server')
+
+    servers = parallel_map(
+        lambda launch: launch_server(k5token, project_id, region, template,
+                                     launch[0], launch[1]),
+        zip(names, ports), max_workers or bulk_workers)
+
+    launched = [server['id'] for server in servers if server['id']]
+    states = {}
+    if wait and launched:
+        states = wait_for_servers(
+            k5token, project_id, region, launched,
+            deadline=bulk_deadline if deadline is None else deadline)
+    for server in servers:
+        server['status'] = states.get(server['id']) if server['id'] \
+            else 'NOT_CREATED'
+
+    return {'servers': servers,
+            'active': len([server for server in servers
+                           if server['status'] == 'ACTIVE']),
+            'failed': len([server for server in servers
+                           if server['status'] in ('ERROR', 'DELETED',
+                                                   'NOT_CREATED')]),
+            'seconds': round(time.time() - started, 3)}
+
+
+def usage():
+    print 'k5BulkServers.py -p <project id> -t <template.json> ' \
+        '(-c <count> [-n <prefix>] | <name> ...) [-w <workers>]'
+    print
+    print '  template.json holds imageid, flavorid, sshkey, sgname, az,'
+    print '  volsize and networkid.'
+    print '  Credentials are read from K5_USERNAME, K5_PASSWORD,'
+    print '  K5_CONTRACT and K5_REGION.'
+
+
+def main():
+    """Summary - launch a batch of servers from the command line
+    """
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hp:t:c:n:w:')
+    except getopt.GetoptError as err:
+        print err
+        usage()
+        sys.exit(2)
+    options = dict(opts)
+    if '-h' in options or '-p' not in options or '-t' not in options or \
+            ('-c' not in options and not args):
+        usage()
+        sys.exit(0 if '-h' in options else 2)
+
+    with open(options['-t']) as template_file:
+        template = json.load(template_file)
+
+    region = os.getenv('K5_REGION', 'uk-1')
+    token = k5TokenCache.get_unscoped_token(
+        os.getenv('K5_USERNAME'), os.getenv('K5_PASSWORD'),
+        os.getenv('K5_CONTRACT'), region)
+    if isinstance(token, str) or token.status_code != 201:
+        print 'Unable to authenticate with K5 - check credentials'
+        sys.exit(1)
+    scoped = k5TokenCache.get_rescoped_token(
+        token.headers['X-Subject-Token'], options['-p'], region)
+    if isinstance(scoped, tuple) or scoped.status_code != 201:
+        print 'Unable to scope a token to project', options['-p']
+        sys.exit(1)
+
+    workers = options.get('-w')
+    summary = create_servers(
+        scoped.headers['X-Subject-Token'], options['-p'], region, template,
+        names=args, count=int(options.get('-c', 0)),
+        prefix=options.get('-n', 'server'),
+        max_workers=int(workers) if workers else None)
+    for server in summary['servers']:
+        print server['name'], server['id'], server['status'], \
+            'attempts', server['attempts'], server['error'] or ''
+    print summary['active'], 'active', summary['failed'], 'failed in', \
+        summary['seconds'], 'seconds'
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/python
+"""Summary: Persisted onboarding checkpoints
+
+    Each onboarding stage records its completion here, for example "user
+    created in the portal", "project exists" or "user is a member of the
+    project group". When a failed user or batch is re-driven it resumes
+    from the first unfinished step and makes no K5 calls for work that is
+    already confirmed.
+
+    A checkpoint is keyed by (contract id, region, email, project, step).
+    Steps that only concern a user leave project empty and steps that only
+    concern a project leave email empty. Only the outcome ('created' or
+    'existing') is stored, never passwords or tokens.
+
+    Checkpoints older than K5_CHECKPOINT_MAX_AGE are ignored, so work
+    that was undone by hand since is eventually checked against K5 again.
+    expire() deletes them and clear() forgets a contract's, user's or
+    project's checkpoints straight away.
+
+    The store is any SQLAlchemy database url, by default a SQLite file
+    next to this module:
+        K5_CHECKPOINT_DB      - database url (default
+                                sqlite:///<module dir>/k5_checkpoints.db)
+        K5_CHECKPOINT_MAX_AGE - seconds a checkpoint is trusted, 0 for
+                                ever (default 604800, one week)
+"""
+
+import datetime
+import os
+import threading
+
+from sqlalchemy import create_engine, Column, DateTime, Integer, String, \
+    UniqueConstraint
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+checkpoint_db = os.getenv('K5_CHECKPOINT_DB', 'sqlite:///' + os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'k5_checkpoints.db'))
+checkpoint_max_age = int(os.getenv('K5_CHECKPOINT_MAX_AGE', '604800'))
+
+Base = declarative_base()
+
+
+class OnboardingStep(Base):
+    """Summary - one completed onboarding step
+    """
+    __tablename__ = 'onboarding_steps'
+    __table_args__ = (UniqueConstraint('contractid', 'region', 'email',
+                                       'project', 'step'),)
+
+    id = Column(Integer, primary_key=True)
+    contractid = Column(String(64), nullable=False)
+    region = Column(String(32), nullable=False)
+    email = Column(String(255), nullable=False, default='')
+    project = Column(String(255), nullable=False, default='')
+    step = Column(String(64), nullable=False)
+    detail = Column(String(255), nullable=False, default='')
+    completed = Column(DateTime, nullable=False,
+                       default=datetime.datetime.utcnow)
+
+
+class CheckpointStore(object):
+    """Summary - thread safe access to the checkpoint table
+    """
+
+    def __init__(self, url=None, max_age=None):
+        self.url = url or checkpoint_db
+        self.max_age = checkpoint_max_age if max_age is None else max_age
+        self._engine = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _sessionmaker(self):
+        if self._session is None:
+            connect_args = {}
+            if self.url.startswith('sqlite'):
+                connect_args['check_same_thread'] = False
+            self._engine = create_engine(self.url, connect_args=connect_args)
+            Base.metadata.create_all(self._engine)
+            self._session = sessionmaker(bind=self._engine)
+        return self._session
+
+    def _filter(self, session, contractid, region, email, project, step):
+        query = session.query(OnboardingStep).filter_by(
+            contractid=contractid, region=region)
+        if email is not None:
+            query = query.filter_by(email=email)
+        if project is not None:
+            query = query.filter_by(project=project)
+        if step is not None:
+            query = query.filter_by(step=step)
+        return query
+
+    def _oldest(self):
+        if not self.max_age:
+            return None
+        return datetime.datetime.utcnow() - \
+            datetime.timedelta(seconds=self.max_age)
+
+    def done(self, contractid, region, email, project, step):
+        """Summary - look up a completed step
+
+        Returns:
+            string: the detail recorded with the step, None if not done or
+            the checkpoint has expired
+        """
+        oldest = self._oldest()
+        with self._lock:
+            session = self._sessionmaker()()
+            try:
+                query = self._filter(session, contractid, region, email,
+                                     project, step)
+                if oldest is not None:
+                    query = query.filter(OnboardingStep.completed >= oldest)
+                row = query.first()
+                return None if row is None else row.detail
+            finally:
+                session.close()
+
+    def record(self, contractid, region, email, project, step, detail=''):
+        """Summary - mark a step as completed
+        """
+        with self._lock:
+            session = self._sessionmaker()()
+            try:
+                row = self._filter(session, contractid, region, email,
+                                   project, step).first()
+                if row is None:
+                    session.add(OnboardingStep(
+                        contractid=contractid, region=region, email=email,
+                        project=project, step=step, detail=detail))
+                else:
+                    row.detail = detail
+                    row.completed = datetime.datetime.utcnow()
+                session.commit()
+            finally:
+                session.close()
+
+    def clear(self, contractid, region, email=None, project=None, step=None):
+        """Summary - forget completed steps so they are run again, e.g.
+        after a user or project was deleted by hand. None matches anything.
+
+        Returns:
+            int: number of checkpoints removed
+        """
+        with self._lock:
+            session = self._sessionmaker()()
+            try:
+                removed = self._filter(session, contractid, region, email,
+                                       project, step).delete(
+                                           synchronize_session=False)
+                session.commit()
+                return removed
+            finally:
+                session.close()
+
+    def expire(self):
+        """Summary - delete checkpoints older than the maximum age
+
+        Returns:
+            int: number of checkpoints removed
+        """
+        oldest = self._oldest()
+        if oldest is None:
+            return 0
+        with self._lock:
+            session = self._sessionmaker()()
+            try:
+                removed = session.query(OnboardingStep).filter(
+                    OnboardingStep.completed < oldest).delete(
+                        synchronize_session=False)
+                session.commit()
+                return removed
+            finally:
+                session.close()
+
+
+_store = CheckpointStore()
+
+
+class Checkpoint(object):
+    """Summary - the checkpoints for one user, one project or one user in
+    one project
+
+    Args:
+        contractid (string): K5 contract id
+        region (string): K5 region
+        email (string): user email, '' for project steps
+        project (string): project name, '' for user steps
+        store (CheckpointStore): defaults to the shared store
+    """
+
+    def __init__(self, contractid, region, email='', project='', store=None):
+        self.key = (contractid, region, email, project)
+        self.store = store or _store
+
+    def done(self, step):
+        """Summary - detail recorded for step, None if it isn't done yet
+        """
+        return self.store.done(*(self.key + (step,)))
+
+    def record(self, step, detail=''):
+        """Summary - mark step as completed
+        """
+        self.store.record(*(self.key + (step, detail)))
+
+    def clear(self, step=None):
+        """Summary - forget one step or all of this scope's steps
+        """
+        return self.store.clear(*(self.key + (step,)))
+
+
+def clear(contractid, region, email=None, project=None):
+    """Summary - forget the checkpoints of a contract, user or project in
+    the shared store
+
+    Returns:
+        int: number of checkpoints removed
+    """
+    return _store.clear(contractid, region, email, project)
+
+
+def expire():
+    """Summary - delete expired checkpoints from the shared store
+
+    Returns:
+        int: number of checkpoints removed
+    """
+    return _store.expire()
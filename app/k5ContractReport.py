@@ -0,0 +1,384 @@
+#!/usr/bin/python
+"""Summary: Parallel contract resource scanner for the bubbles report
+
+    Builds the contract -> AZ -> project -> resource tree read by the d3
+    bubble chart (bubbles.json). It uses the initialise_*/add_* report
+    helpers in k5APIwrappersV19. Each project is scanned on its own
+    thread: the token is rescoped to the project, then its servers,
+    volumes, snapshots and global IPs are listed. The threads share one
+    flavor -> vCPU map. Projects are scanned K5_PARALLEL_WORKERS at a time
+    by default, so a large contract takes about as long as its slowest
+    projects rather than the sum of them all.
+
+    refresh_contract_report is the incremental mode. It keeps each
+    project's totals and fingerprint in a json state file next to the
+    report. On a refresh each project is probed cheaply: servers changed
+    since its last scan (nova changes-since) and a digest of its volumes.
+    Only the projects whose probe differs are rescanned, and every other
+    project reuses its saved totals. Snapshot and global IP changes don't
+    show in the probe, so every project is fully rescanned at least every
+    K5_REPORT_FULL_SCAN_AGE seconds (default 3600).
+
+    Command line -
+        k5ContractReport.py [-o output_file] [-w workers] [-i]
+        -i refreshes incrementally using output_file + '.state'
+    K5 admin credentials are read from the K5_USERNAME, K5_PASSWORD,
+    K5_CONTRACT and K5_REGION environment variables.
+"""
+
+import getopt
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import k5APIwrappersV19 as K5API
+import k5TokenCache
+from k5Parallel import parallel_map
+
+full_scan_age = int(os.getenv('K5_REPORT_FULL_SCAN_AGE', '3600'))
+
+# allowance for clock differences between this host and K5 when asking
+# for servers changed since the last scan
+CLOCK_SKEW = 120
+
+# report resource names in the order they appear under each project
+RESOURCES = ('VMs', 'vCPU', 'Vols', 'Vol Size', 'Snaps', 'Snap Size',
+             'Global IP')
+
+
+def _json(response, key):
+    if isinstance(response, basestring) or response.status_code != 200:
+        raise RuntimeError(key + ' - ' + str(getattr(
+            response, 'status_code', response)))
+    return response.json()[key]
+
+
+class FlavorCache(object):
+    """Summary - flavor id -> vCPU count, fetched once and shared by the
+    project scanning threads
+    """
+
+    def __init__(self):
+        self._vcpus = None
+        self._lock = threading.Lock()
+
+    def vcpus(self, k5token, project_id, region, flavor_id):
+        if self._vcpus is None:
+            with self._lock:
+                if self._vcpus is None:
+                    self._vcpus = dict(
+                        (flavor.get('id'), flavor.get('vcpus'))
+                        for flavor in _json(K5API.list_flavors(
+                            k5token, project_id, region), 'flavors'))
+        return self._vcpus.get(flavor_id, 0)
+
+
+def project_token(k5token, project_id, region):
+    """Summary - project scoped token, rescoped once and then cached until
+    shortly before it expires
+
+    Returns:
+        string: project scoped token
+    """
+    token = k5TokenCache.get_rescoped_token(k5token, project_id, region)
+    if isinstance(token, basestring) or token.status_code != 201:
+        raise RuntimeError('rescope - ' + str(getattr(
+            token, 'status_code', token)))
+    return token.headers['X-Subject-Token']
+
+
+def volume_fingerprint(volumes):
+    """Summary - digest of the volume attributes the report depends on
+
+    Args:
+        volumes (list): volumes from iter_volumes
+
+    Returns:
+        string: hex digest
+    """
+    return hashlib.sha1(json.dumps(sorted(
+        [volume.get('id'), volume.get('status'), volume.get('size'),
+         volume.get('availability_zone')] for volume in volumes))).hexdigest()
+
+
+def scan_project(k5token, region, project, flavors, volumes=None):
+    """Summary - count one project's resources per availability zone
+
+    Args:
+        k5token (string): valid regional token to rescope from
+        region (string): K5 region
+        project (dict): keystone project with 'id' and 'name'
+        flavors (FlavorCache): shared flavor map
+        volumes (list): the project's volumes if already listed
+
+    Returns:
+        dict: availability zone -> {resource name: total}
+    """
+    project_id = project.get('id')
+    projecttoken = project_token(k5token, project_id, region)
+
+    usage = {}
+
+    def add(az, resource, size):
+        totals = usage.setdefault(az, dict.fromkeys(RESOURCES, 0))
+        totals[resource] = totals[resource] + (size or 0)
+
+    for server in K5API.iter_servers(projecttoken, project_id, region):
+        az = server.get('OS-EXT-AZ:availability_zone')
+        add(az, 'VMs', 1)
+        add(az, 'vCPU', flavors.vcpus(projecttoken, project_id, region,
+                                      server.get('flavor', {}).get('id')))
+
+    if volumes is None:
+        volumes = list(K5API.iter_volumes(projecttoken, project_id, region))
+    volume_az = {}
+    for volume in volumes:
+        az = volume.get('availability_zone')
+        volume_az[volume.get('id')] = az
+        add(az, 'Vols', 1)
+        add(az, 'Vol Size', volume.get('size'))
+
+    # snapshots live in the availability zone of the volume they were
+    # taken from
+    for snapshot in K5API.iter_snapshots(projecttoken, project_id, region):
+        az = volume_az.get(snapshot.get('volume_id'),
+                           snapshot.get('availability_zone'))
+        add(az, 'Snaps', 1)
+        add(az, 'Snap Size', snapshot.get('size'))
+
+    for floatingip in K5API.iter_global_ips(
+            projecttoken, region,
+            fields=['tenant_id', 'availability_zone']):
+        if floatingip.get('tenant_id') in (None, project_id):
+            add(floatingip.get('availability_zone'), 'Global IP', 1)
+
+    return usage
+
+
+def build_contract_report(contract_name, region, scans):
+    """Summary - assemble the bubbles tree from per project scan results
+
+    Args:
+        contract_name (string): K5 contract name
+        region (string): K5 region
+        scans (list): (project name, usage dict from scan_project) tuples
+
+    Returns:
+        dict: contract report tree
+    """
+    azs = (region + 'a', region + 'b')
+    report = K5API.initialise_contract_report(contract_name, azs[0], azs[1])
+    for project_name, usage in sorted(scans, key=lambda scan: scan[0]):
+        for index, az in enumerate(azs):
+            project_report = K5API.initialise_project_report(project_name)
+            totals = usage.get(az, {})
+            for resource in RESOURCES:
+                if totals.get(resource):
+                    K5API.add_resource_to_project_report(
+                        project_report, resource, str(totals[resource]))
+            K5API.add_project_to_contract_report(report, index,
+                                                 project_report)
+    return report
+
+
+def generate_contract_report(k5token, contract_name, contractid, region,
+                             max_workers=None, projects=None):
+    """Summary - scan every project in the contract concurrently and build
+    the bubbles report
+
+    Args:
+        k5token (string): K5 regional domain scoped token
+        contract_name (string): K5 contract name
+        contractid (string): K5 contract id
+        region (string): K5 region
+        max_workers (int): projects scanned at the same time
+        projects (list): keystone project dicts, default every project in
+        the contract
+
+    Returns:
+        tuple: (report tree, {project name: error} for projects that could
+        not be scanned - they are reported without resources)
+    """
+    if projects is None:
+        projects = list(K5API.iter_keystoneobjects(
+            k5token, region, contractid, 'projects'))
+    flavors = FlavorCache()
+    errors = {}
+
+    def scan(project):
+        try:
+            return project.get('name'), scan_project(k5token, region,
+                                                     project, flavors)
+        except Exception:
+            errors[project.get('name')] = repr(sys.exc_info()[1])
+            return project.get('name'), {}
+
+    scans = parallel_map(scan, projects, max_workers)
+    return build_contract_report(contract_name, region, scans), errors
+
+
+def load_report_state(state_path, contractid, region):
+    """Summary - read the saved per project totals, starting afresh if
+    there are none or they belong to another contract or region
+
+    Returns:
+        dict: report state
+    """
+    try:
+        with open(state_path) as state_file:
+            state = json.load(state_file)
+        if state.get('contractid') == contractid and \
+                state.get('region') == region:
+            return state
+    except (IOError, ValueError):
+        pass
+    return {'contractid': contractid, 'region': region, 'projects': {}}
+
+
+def refresh_contract_report(k5token, contract_name, contractid, region,
+                            state_path, max_workers=None, projects=None):
+    """Summary - incremental version of generate_contract_report that
+    only rescans projects whose servers or volumes have changed since the
+    last run, or that haven't been fully scanned for full_scan_age seconds
+
+    Args:
+        k5token (string): K5 regional domain scoped token
+        contract_name (string): K5 contract name
+        contractid (string): K5 contract id
+        region (string): K5 region
+        state_path (string): json file holding the per project state
+        max_workers (int): projects probed / scanned at the same time
+        projects (list): keystone project dicts, default every project in
+        the contract
+
+    Returns:
+        tuple: (report tree, {project name: error}, names of the projects
+        that were rescanned)
+    """
+    if projects is None:
+        projects = list(K5API.iter_keystoneobjects(
+            k5token, region, contractid, 'projects'))
+    state = load_report_state(state_path, contractid, region)
+    saved = state['projects']
+    flavors = FlavorCache()
+    errors = {}
+    started = time.time()
+
+    def refresh(project):
+        project_id = project.get('id')
+        entry = saved.get(project_id)
+        try:
+            projecttoken = project_token(k5token, project_id, region)
+            volumes = list(K5API.iter_volumes(projecttoken, project_id,
+                                              region))
+            fingerprint = volume_fingerprint(volumes)
+            if entry is not None and \
+                    started - entry['full_scan'] < full_scan_age and \
+                    fingerprint == entry['volumes']:
+                since = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(
+                    entry['scanned'] - CLOCK_SKEW))
+                changed = _json(K5API.list_servers(
+                    projecttoken, project_id, region, changes_since=since),
+                    'servers')
+                if not changed:
+                    entry = dict(entry, name=project.get('name'),
+                                 scanned=started)
+                    return project_id, entry, False
+            usage = scan_project(k5token, region, project, flavors, volumes)
+            return project_id, {'name': project.get('name'),
+                                'usage': usage,
+                                'volumes': fingerprint,
+                                'scanned': started,
+                                'full_scan': started}, True
+        except Exception:
+            errors[project.get('name')] = repr(sys.exc_info()[1])
+            if entry is None:
+                entry = {'name': project.get('name'), 'usage': {},
+                         'volumes': None, 'scanned': 0, 'full_scan': 0}
+            return project_id, entry, False
+
+    results = parallel_map(refresh, projects, max_workers)
+    state['projects'] = dict((project_id, entry)
+                             for project_id, entry, rescanned in results)
+    save_report_state(state, state_path)
+    report = build_contract_report(
+        contract_name, region,
+        [(entry['name'], entry['usage'])
+         for entry in state['projects'].values()])
+    rescanned = [entry['name'] for project_id, entry, rescanned in results
+                 if rescanned]
+    return report, errors, rescanned
+
+
+def save_report_state(state, state_path):
+    """Summary - save the per project state, replacing the old file in one
+    step
+
+    Args:
+        state (dict): report state
+        state_path (string): json file
+    """
+    temp_path = state_path + '.tmp'
+    with open(temp_path, 'w') as state_file:
+        json.dump(state, state_file)
+    os.rename(temp_path, state_path)
+
+
+def write_contract_report(report, report_path):
+    """Summary - save the report as json, replacing the old file in one
+    step so readers never see a half written report
+
+    Args:
+        report (dict): contract report tree
+        report_path (string): output file
+    """
+    temp_path = report_path + '.tmp'
+    with open(temp_path, 'w') as report_file:
+        json.dump(report, report_file)
+    os.rename(temp_path, report_path)
+
+
+def main():
+    """Summary - generate the report from the command line
+    """
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'o:w:i')
+    except getopt.GetoptError as err:
+        print err
+        sys.exit(2)
+    options = dict(opts)
+
+    contract = os.getenv('K5_CONTRACT')
+    region = os.getenv('K5_REGION', 'uk-1')
+    token = k5TokenCache.get_unscoped_token(
+        os.getenv('K5_USERNAME'), os.getenv('K5_PASSWORD'), contract, region)
+    if isinstance(token, str) or token.status_code != 201:
+        print 'Unable to authenticate with K5 - check credentials'
+        sys.exit(1)
+    contractid = token.json()['token']['project']['domain'].get('id')
+
+    workers = options.get('-w')
+    workers = int(workers) if workers else None
+    report_path = options.get('-o', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'static',
+        'bubbles.json'))
+    if '-i' in options:
+        report, errors, rescanned = refresh_contract_report(
+            token.headers['X-Subject-Token'], contract, contractid, region,
+            report_path + '.state', workers)
+        print 'Rescanned', len(rescanned), 'projects'
+    else:
+        report, errors = generate_contract_report(
+            token.headers['X-Subject-Token'], contract, contractid, region,
+            workers)
+    write_contract_report(report, report_path)
+    for project_name, error in sorted(errors.items()):
+        print 'Failed to scan', project_name, error
+    print 'Report written to', report_path
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/python
+"""Summary: Pooled keep-alive HTTP sessions shared by all the K5 API wrappers
+
+    Every K5 endpoint lives on its own host, e.g.
+    identity.uk-1.cloud.global.fujitsu.com or
+    networking.uk-1.cloud.global.fujitsu.com, so one requests.Session is
+    kept per host. Each session holds a pool of open TLS connections that
+    later calls to the same host reuse. That saves a DNS lookup, a TCP
+    connect and a TLS handshake on every call after the first.
+
+    The module mirrors the requests API (get/post/put/delete/head) so the
+    wrappers can call k5http.get(...) exactly as they used to call
+    requests.get(...).
+
+    Pool size and timeouts can be tuned via environment variables
+    or at runtime with configure():
+        K5_HTTP_POOL_SIZE       - connections kept open per host (default 20)
+        K5_HTTP_CONNECT_TIMEOUT - seconds allowed for a TCP connect (default 10)
+"""
+
+import cookielib
+import os
+import threading
+from urlparse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# number of keep-alive connections held open per K5 host - should be at
+# least as large as the number of worker threads talking to one service
+pool_size = int(os.getenv('K5_HTTP_POOL_SIZE', '20'))
+
+connect_timeout = float(os.getenv('K5_HTTP_CONNECT_TIMEOUT', '10'))
+
+# read timeouts (seconds) per K5 service - the service is the first label
+# of the endpoint host name e.g. 'identity' in identity.uk-1.cloud...
+service_read_timeouts = {
+    'identity': 30,
+    'auth-api': 30,
+    'k5-apiportal': 60,
+    'compute': 60,
+    'image': 60,
+    'blockstorage': 60,
+    'networking': 60,
+    'networking-ex': 60,
+    'orchestration': 60,
+    'objectstorage': 300,
+}
+default_read_timeout = 60
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def configure(size=None, connect=None, read_timeouts=None):
+    """Summary - change the pool size and/or timeouts used for new sessions.
+    Existing sessions are closed so that the new settings take effect.
+
+    Args:
+        size (int): keep-alive connections held open per K5 host
+        connect (float): TCP connect timeout in seconds
+        read_timeouts (dict): service name -> read timeout in seconds
+    """
+    global pool_size, connect_timeout
+    if size is not None:
+        pool_size = int(size)
+    if connect is not None:
+        connect_timeout = float(connect)
+    if read_timeouts:
+        service_read_timeouts.update(read_timeouts)
+    close_all()
+
+
+def service_name(url):
+    """Summary - derive the K5 service name from an endpoint url
+
+    Args:
+        url (string): full K5 API url
+
+    Returns:
+        string: service name e.g. 'identity' or 'objectstorage'
+    """
+    return urlparse(url).hostname.split('.')[0]
+
+
+def service_timeout(url):
+    """Summary - (connect, read) timeout tuple for the service behind a url
+
+    Args:
+        url (string): full K5 API url
+
+    Returns:
+        tuple: (connect timeout, read timeout) in seconds
+    """
+    return (connect_timeout,
+            service_read_timeouts.get(service_name(url), default_read_timeout))
+
+
+def _new_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    # sessions are shared by every user of the portal so never let a
+    # cookie set for one caller leak into another caller's request
+    session.cookies.set_policy(cookielib.DefaultCookiePolicy(
+        allowed_domains=[]))
+    return session
+
+
+def get_session(url):
+    """Summary - return the shared pooled session for the host in url,
+    creating it on first use
+
+    Args:
+        url (string): full K5 API url
+
+    Returns:
+        requests.Session: keep-alive session for that host
+    """
+    parsed = urlparse(url)
+    key = (parsed.scheme, parsed.netloc)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _new_session()
+                _sessions[key] = session
+    return session
+
+
+def close_all():
+    """Summary - close every pooled session and its open connections
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def request(method, url, **kwargs):
+    """Summary - send a request through the pooled session for url's host.
+    The service timeout is applied unless the caller supplies one.
+
+    Args:
+        method (string): HTTP method
+        url (string): full K5 API url
+        **kwargs: any keyword accepted by requests.request
+
+    Returns:
+        requests.Response: http response object
+    """
+    kwargs.setdefault('timeout', service_timeout(url))
+    return get_session(url).request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request('PUT', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
+
+
+def head(url, **kwargs):
+    return request('HEAD', url, **kwargs)
@@ -0,0 +1,478 @@
+#!/usr/bin/python
+"""Summary: Local inventory mirror of a contract's keystone identity objects
+
+    get_keystoneobject_list downloads the complete users, projects or
+    groups list of a domain on every call. For a large contract that is
+    megabytes just to check whether one name exists. This module mirrors
+    users, projects, groups, roles and role assignments into a local
+    SQLAlchemy store indexed by name and id. "Does this user exist" is
+    then a local index lookup.
+
+    sync() refreshes incrementally. Each object list is diffed against the
+    local copy, so only new, changed and removed rows are written. Types
+    synced more recently than max_age seconds are skipped. refresh()
+    updates a single object by name, e.g. straight after it was created.
+
+    seed_resolver() loads the mirror into k5Resolver's name -> id indexes,
+    so the onboarding flow and the assign_* wrappers resolve names
+    without calling keystone. Only types synced within
+    K5_INVENTORY_MAX_AGE seconds are loaded. A name the mirror doesn't
+    know is still looked up in keystone.
+
+    Command line -
+        k5Inventory.py -s [-t users,projects,...] [-a max_age]
+        k5Inventory.py -l objecttype [-n name_contains]
+    K5 admin credentials are read from the K5_USERNAME, K5_PASSWORD,
+    K5_CONTRACT and K5_REGION environment variables.
+
+    Store location and freshness:
+        K5_INVENTORY_DB      - database url (default
+                               sqlite:///<module dir>/k5_inventory.db)
+        K5_INVENTORY_MAX_AGE - seconds a synced type is trusted to seed
+                               the resolver (default 3600)
+"""
+
+import datetime
+import getopt
+import os
+import sys
+import threading
+
+from sqlalchemy import create_engine, Boolean, Column, DateTime, Index, \
+    Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+import k5APIwrappersV19 as K5API
+import k5HTTPPool as k5http
+import k5Resolver
+import k5TokenCache
+
+inventory_db = os.getenv('K5_INVENTORY_DB', 'sqlite:///' + os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'k5_inventory.db'))
+inventory_max_age = int(os.getenv('K5_INVENTORY_MAX_AGE', '3600'))
+
+OBJECT_TYPES = ('users', 'projects', 'groups', 'roles')
+
+Base = declarative_base()
+
+
+class KeystoneObject(Base):
+    """Summary - one user, project, group or role of a contract
+    """
+    __tablename__ = 'keystone_objects'
+    __table_args__ = (
+        Index('ix_keystone_objects_name', 'contractid', 'region',
+              'objecttype', 'name'),
+        Index('ix_keystone_objects_objid', 'contractid', 'region',
+              'objecttype', 'objid', unique=True),)
+
+    id = Column(Integer, primary_key=True)
+    region = Column(String(32), nullable=False)
+    contractid = Column(String(64), nullable=False)
+    objecttype = Column(String(16), nullable=False)
+    objid = Column(String(64), nullable=False)
+    name = Column(String(255), nullable=False)
+    email = Column(String(255))
+    enabled = Column(Boolean)
+    synced = Column(DateTime, nullable=False)
+
+    def to_dict(self):
+        return {'id': self.objid, 'name': self.name, 'email': self.email,
+                'enabled': self.enabled}
+
+
+class RoleAssignment(Base):
+    """Summary - a role held by a user or group on a project or domain
+    """
+    __tablename__ = 'keystone_role_assignments'
+    __table_args__ = (
+        Index('ix_role_assignments_actor', 'contractid', 'region',
+              'actor_id'),
+        Index('ix_role_assignments_scope', 'contractid', 'region',
+              'scope_id'),)
+
+    id = Column(Integer, primary_key=True)
+    region = Column(String(32), nullable=False)
+    contractid = Column(String(64), nullable=False)
+    role_id = Column(String(64), nullable=False)
+    actor_type = Column(String(8), nullable=False)
+    actor_id = Column(String(64), nullable=False)
+    scope_type = Column(String(8), nullable=False)
+    scope_id = Column(String(64), nullable=False)
+
+    def key(self):
+        return (self.role_id, self.actor_type, self.actor_id,
+                self.scope_type, self.scope_id)
+
+
+class InventorySync(Base):
+    """Summary - when an object type was last mirrored
+    """
+    __tablename__ = 'inventory_syncs'
+
+    region = Column(String(32), primary_key=True)
+    contractid = Column(String(64), primary_key=True)
+    objecttype = Column(String(32), primary_key=True)
+    synced = Column(DateTime, nullable=False)
+
+
+def _identity_get(k5token, region, path, params=None):
+    response = k5http.get('https://identity.' + region +
+                          '.cloud.global.fujitsu.com/v3/' + path,
+                          params=params,
+                          headers={
+                              'X-Auth-Token': k5token,
+                              'Content-Type': 'application/json',
+                              'Accept': 'application/json'})
+    if response.status_code != 200:
+        raise RuntimeError('Failed to list keystone ' + path + ' - ' +
+                           str(response.status_code))
+    return response.json()
+
+
+class Inventory(object):
+    """Summary - the local mirror and the sync logic that maintains it
+    """
+
+    def __init__(self, url=None):
+        self.url = url or inventory_db
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _sessionmaker(self):
+        if self._session is None:
+            connect_args = {}
+            if self.url.startswith('sqlite'):
+                connect_args['check_same_thread'] = False
+            engine = create_engine(self.url, connect_args=connect_args)
+            Base.metadata.create_all(engine)
+            self._session = sessionmaker(bind=engine)
+        return self._session
+
+    def _last_sync(self, session, region, contractid, objecttype):
+        row = session.query(InventorySync).get(
+            (region, contractid, objecttype))
+        return None if row is None else row.synced
+
+    def _mark_synced(self, session, region, contractid, objecttype, now):
+        row = session.query(InventorySync).get(
+            (region, contractid, objecttype))
+        if row is None:
+            session.add(InventorySync(region=region, contractid=contractid,
+                                      objecttype=objecttype, synced=now))
+        else:
+            row.synced = now
+
+    def _merge_objects(self, session, region, contractid, objecttype, items,
+                       now, remove_missing=True):
+        counts = {'added': 0, 'updated': 0, 'removed': 0}
+        local = dict((row.objid, row) for row in session.query(
+            KeystoneObject).filter_by(region=region, contractid=contractid,
+                                      objecttype=objecttype))
+        for item in items:
+            row = local.pop(item.get('id'), None)
+            values = (item.get('name'), item.get('email'),
+                      item.get('enabled'))
+            if row is None:
+                session.add(KeystoneObject(
+                    region=region, contractid=contractid,
+                    objecttype=objecttype, objid=item.get('id'),
+                    name=values[0], email=values[1], enabled=values[2],
+                    synced=now))
+                counts['added'] += 1
+            elif (row.name, row.email, row.enabled) != values:
+                row.name, row.email, row.enabled = values
+                row.synced = now
+                counts['updated'] += 1
+        if remove_missing:
+            for row in local.values():
+                session.delete(row)
+                counts['removed'] += 1
+        return counts
+
+    def _merge_assignments(self, session, region, contractid, items):
+        counts = {'added': 0, 'updated': 0, 'removed': 0}
+        local = dict((row.key(), row) for row in session.query(
+            RoleAssignment).filter_by(region=region, contractid=contractid))
+        for key in items:
+            if local.pop(key, None) is None:
+                session.add(RoleAssignment(
+                    region=region, contractid=contractid, role_id=key[0],
+                    actor_type=key[1], actor_id=key[2], scope_type=key[3],
+                    scope_id=key[4]))
+                counts['added'] += 1
+        for row in local.values():
+            session.delete(row)
+            counts['removed'] += 1
+        return counts
+
+    def _fetch_assignments(self, k5token, region, contractid, projectids):
+        assignments = set()
+        for item in K5API.iterate_k5_collection(
+                k5token, 'https://identity.' + region +
+                '.cloud.global.fujitsu.com/v3/role_assignments',
+                'role_assignments', marker_paging=False):
+            scope = item.get('scope', {})
+            if 'project' in scope:
+                scope_type, scope_id = 'project', scope['project'].get('id')
+                if scope_id not in projectids:
+                    continue
+            elif 'domain' in scope:
+                scope_type, scope_id = 'domain', scope['domain'].get('id')
+                if scope_id != contractid:
+                    continue
+            else:
+                continue
+            actor_type = 'user' if 'user' in item else 'group'
+            assignments.add((item['role'].get('id'), actor_type,
+                             item[actor_type].get('id'), scope_type,
+                             scope_id))
+        return assignments
+
+    def sync(self, k5token, region, contractid, objecttypes=None,
+             max_age=0):
+        """Summary - bring the mirror of a contract up to date
+
+        Args:
+            k5token (string): K5 regional domain scoped token
+            region (string): K5 region
+            contractid (string): K5 contract id
+            objecttypes (list): any of users/projects/groups/roles/
+            role_assignments, default all of them
+            max_age (int): skip types synced less than this many seconds ago
+
+        Returns:
+            dict: objecttype -> {'added': n, 'updated': n, 'removed': n},
+            only for the types that were synced
+        """
+        objecttypes = objecttypes or (OBJECT_TYPES + ('role_assignments',))
+        results = {}
+        with self._lock:
+            session = self._sessionmaker()()
+            try:
+                now = datetime.datetime.utcnow()
+                for objecttype in objecttypes:
+                    synced = self._last_sync(session, region, contractid,
+                                             objecttype)
+                    if synced is not None and max_age and \
+                            (now - synced).total_seconds() < max_age:
+                        continue
+                    if objecttype == 'role_assignments':
+                        projectids = set(
+                            row.objid for row in session.query(
+                                KeystoneObject).filter_by(
+                                    region=region, contractid=contractid,
+                                    objecttype='projects'))
+                        results[objecttype] = self._merge_assignments(
+                            session, region, contractid,
+                            self._fetch_assignments(k5token, region,
+                                                    contractid, projectids))
+                    else:
+                        items = K5API.iter_keystoneobjects(
+                            k5token, region, contractid, objecttype)
+                        results[objecttype] = self._merge_objects(
+                            session, region, contractid, objecttype, items,
+                            now)
+                    self._mark_synced(session, region, contractid,
+                                      objecttype, now)
+                    session.commit()
+            finally:
+                session.close()
+        return results
+
+    def refresh(self, k5token, region, contractid, objecttype, name):
+        """Summary - update a single object by name, e.g. after creating it
+
+        Returns:
+            string: object id or 'None' if keystone doesn't know it
+        """
+        items = _identity_get(k5token, region, objecttype,
+                              {'domain_id': contractid, 'name': name}
+                              )[objecttype]
+        with self._lock:
+            session = self._sessionmaker()()
+            try:
+                if not items:
+                    session.query(KeystoneObject).filter_by(
+                        region=region, contractid=contractid,
+                        objecttype=objecttype, name=name).delete(
+                            synchronize_session=False)
+                else:
+                    self._merge_objects(session, region, contractid,
+                                        objecttype, items,
+                                        datetime.datetime.utcnow(),
+                                        remove_missing=False)
+                session.commit()
+            finally:
+                session.close()
+        return items[0].get('id') if items else 'None'
+
+    def seed_resolver(self, region, contractid, objecttypes=None,
+                      max_age=None):
+        """Summary - load the mirror into the shared k5Resolver indexes
+        without calling K5
+
+        Args:
+            region (string): K5 region
+            contractid (string): K5 contract id
+            objecttypes (list): users/projects/groups/roles, default all
+            max_age (int): only load types synced less than this many
+            seconds ago, default K5_INVENTORY_MAX_AGE
+
+        Returns:
+            list: the object types loaded
+        """
+        max_age = inventory_max_age if max_age is None else max_age
+        now = datetime.datetime.utcnow()
+        fresh = []
+        with self._lock:
+            session = self._sessionmaker()()
+            try:
+                for objecttype in objecttypes or OBJECT_TYPES:
+                    synced = self._last_sync(session, region, contractid,
+                                             objecttype)
+                    if synced is not None and \
+                            (now - synced).total_seconds() < max_age:
+                        fresh.append(objecttype)
+            finally:
+                session.close()
+        resolver = k5Resolver.get_resolver(region, contractid)
+        for objecttype in fresh:
+            resolver.load(objecttype, self.find(region, contractid,
+                                                objecttype))
+        return fresh
+
+    def find(self, region, contractid, objecttype, name=None,
+             contains=None):
+        """Summary - query the local mirror
+
+        Args:
+            region (string): K5 region
+            contractid (string): K5 contract id
+            objecttype (string): users/projects/groups/roles
+            name (string): exact name to match
+            contains (string): substring the name must contain
+
+        Returns:
+            list: {'id', 'name', 'email', 'enabled'} dicts ordered by name
+        """
+        with self._lock:
+            session = self._sessionmaker()()
+            try:
+                query = session.query(KeystoneObject).filter_by(
+                    region=region, contractid=contractid,
+                    objecttype=objecttype)
+                if name is not None:
+                    query = query.filter_by(name=name)
+                if contains is not None:
+                    query = query.filter(
+                        KeystoneObject.name.contains(contains))
+                return [row.to_dict()
+                        for row in query.order_by(KeystoneObject.name)]
+            finally:
+                session.close()
+
+    def get_id(self, region, contractid, objecttype, name):
+        """Summary - local equivalent of get_itemid
+
+        Returns:
+            string: object id or 'None'
+        """
+        found = self.find(region, contractid, objecttype, name=name)
+        return found[0]['id'] if found else 'None'
+
+    def exists(self, region, contractid, objecttype, name):
+        """Summary - True if the mirror holds an object of that name
+        """
+        return self.get_id(region, contractid, objecttype, name) != 'None'
+
+    def assignments(self, region, contractid, actor_id=None, scope_id=None):
+        """Summary - role assignments held by an actor and/or on a scope
+
+        Returns:
+            list: (role_id, actor_type, actor_id, scope_type, scope_id)
+        """
+        with self._lock:
+            session = self._sessionmaker()()
+            try:
+                query = session.query(RoleAssignment).filter_by(
+                    region=region, contractid=contractid)
+                if actor_id is not None:
+                    query = query.filter_by(actor_id=actor_id)
+                if scope_id is not None:
+                    query = query.filter_by(scope_id=scope_id)
+                return [row.key() for row in query]
+            finally:
+                session.close()
+
+
+_inventory = Inventory()
+
+
+def sync(k5token, region, contractid, objecttypes=None, max_age=0):
+    return _inventory.sync(k5token, region, contractid, objecttypes, max_age)
+
+
+def refresh(k5token, region, contractid, objecttype, name):
+    return _inventory.refresh(k5token, region, contractid, objecttype, name)
+
+
+def seed_resolver(region, contractid, objecttypes=None, max_age=None):
+    return _inventory.seed_resolver(region, contractid, objecttypes, max_age)
+
+
+def find(region, contractid, objecttype, name=None, contains=None):
+    return _inventory.find(region, contractid, objecttype, name, contains)
+
+
+def get_id(region, contractid, objecttype, name):
+    return _inventory.get_id(region, contractid, objecttype, name)
+
+
+def exists(region, contractid, objecttype, name):
+    return _inventory.exists(region, contractid, objecttype, name)
+
+
+def assignments(region, contractid, actor_id=None, scope_id=None):
+    return _inventory.assignments(region, contractid, actor_id, scope_id)
+
+
+def main():
+    """Summary - sync or query the inventory from the command line
+    """
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'st:a:l:n:')
+    except getopt.GetoptError as err:
+        print err
+        sys.exit(2)
+    options = dict(opts)
+
+    contract = os.getenv('K5_CONTRACT')
+    region = os.getenv('K5_REGION', 'uk-1')
+    token = k5TokenCache.get_unscoped_token(
+        os.getenv('K5_USERNAME'), os.getenv('K5_PASSWORD'), contract, region)
+    if isinstance(token, str) or token.status_code != 201:
+        print 'Unable to authenticate with K5 - check credentials'
+        sys.exit(1)
+    k5token = token.headers['X-Subject-Token']
+    contractid = token.json()['token']['project']['domain'].get('id')
+
+    if '-s' in options:
+        objecttypes = None
+        if '-t' in options:
+            objecttypes = options['-t'].split(',')
+        for objecttype, counts in sorted(sync(
+                k5token, region, contractid, objecttypes,
+                int(options.get('-a', 0))).items()):
+            print objecttype, counts
+
+    if '-l' in options:
+        found = find(region, contractid, options['-l'],
+                     contains=options.get('-n'))
+        for count, item in enumerate(found, 1):
+            print count, item['name'], item['email'], item['id']
+
+
+if __name__ == "__main__":
+    main()
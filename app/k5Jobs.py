@@ -0,0 +1,161 @@
+#!/usr/bin/python
+"""Summary: Background job queue for long running onboarding requests
+
+    adduser_to_K5 can sit in portal sync retry loops for a long time, which
+    used to hold a web worker for the whole request. Work is now submitted
+    to a JobQueue. It returns a job id at once, and a small pool of worker
+    threads runs the work in the background. The job records every
+    'Step N - ...' status string the onboarding functions report, so the
+    portal can show progress at /jobs/<id>.
+
+    Tuning via environment variables:
+        K5_JOB_WORKERS   - worker threads per process (default 4)
+        K5_JOB_RETENTION - seconds finished jobs are kept (default 3600)
+"""
+
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+from Queue import Queue
+
+job_workers = int(os.getenv('K5_JOB_WORKERS', '4'))
+job_retention = int(os.getenv('K5_JOB_RETENTION', '3600'))
+
+
+class Job(object):
+    """Summary - one unit of background work and its progress
+    """
+
+    def __init__(self, func, args, kwargs, owner):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.state = 'queued'
+        self.status = 'Queued'
+        self.steps = []
+        self.projects = {}
+        self.result = None
+        self.created = time.time()
+        self.finished = None
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+
+    def progress(self, userProject, status):
+        """Summary - progress callback handed to the onboarding functions
+
+        Args:
+            userProject (string): project the status applies to
+            status (string): 'Step N - ...' status string
+        """
+        with self._lock:
+            self.status = status
+            self.projects[userProject] = status
+            self.steps.append({'project': userProject,
+                               'status': status,
+                               'time': time.time()})
+
+    def run(self):
+        self.state = 'running'
+        try:
+            self.result = self._func(progress=self.progress,
+                                     *self._args, **self._kwargs)
+            self.state = 'finished'
+        except Exception:
+            self.state = 'failed'
+            self.status = 'Failed - ' + repr(sys.exc_info()[1])
+            traceback.print_exc()
+        self.finished = time.time()
+
+    def to_dict(self):
+        """Summary - json friendly view of the job, without its result as
+        that can hold new user passwords
+
+        Returns:
+            dict: job id, state and progress
+        """
+        with self._lock:
+            return {'id': self.id,
+                    'state': self.state,
+                    'status': self.status,
+                    'projects': dict(self.projects),
+                    'steps': list(self.steps),
+                    'created': self.created,
+                    'finished': self.finished}
+
+
+class JobQueue(object):
+    """Summary - fixed pool of daemon worker threads fed from a queue
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or job_workers
+        self._queue = Queue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job.run()
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - job_retention
+        with self._lock:
+            for job_id, job in self._jobs.items():
+                if job.finished is not None and job.finished < cutoff:
+                    del self._jobs[job_id]
+
+    def submit(self, func, *args, **kwargs):
+        """Summary - queue func(*args, progress=callback, **kwargs)
+
+        Args:
+            func (function): work to run - must accept a progress keyword
+            *args: positional arguments for func
+            **kwargs: keyword arguments for func; 'owner' is kept on the job
+            to restrict who may read it
+
+        Returns:
+            Job: the queued job
+        """
+        owner = kwargs.pop('owner', None)
+        job = Job(func, args, kwargs, owner)
+        self._prune()
+        with self._lock:
+            self._jobs[job.id] = job
+        self._start()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id, owner=None):
+        """Summary - look up a job
+
+        Args:
+            job_id (string): id returned by submit
+            owner (TYPE): if given the job must belong to this owner
+
+        Returns:
+            Job: the job or None if unknown / not owned by owner
+        """
+        job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+
+onboarding_queue = JobQueue()
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+"""Summary: Run K5 list calls across several regions concurrently
+
+    Every wrapper in k5APIwrappersV19 takes one region and talks to
+    https://<service>.<region>.cloud.global.fujitsu.com, and each region
+    needs its own token. fan_out runs one list wrapper for every region
+    on the shared thread pool. It merges the returned objects into a
+    single list, with each object tagged with the region it came from.
+    It also records per-region latency, item count and errors, so a
+    global query takes about as long as the slowest region.
+
+    Regions and credentials are bound together by RegionCredentials.
+    It hands out cached per-region tokens and default project ids.
+
+    Tuning via environment variables:
+        K5_REGIONS - comma separated default region list
+"""
+
+import os
+import sys
+import time
+
+import k5APIwrappersV19 as K5API
+import k5TokenCache
+from k5Parallel import parallel_map
+
+default_regions = os.getenv(
+    'K5_REGIONS',
+    'uk-1,fi-1,de-1,es-1,us-1,jp-east-1,jp-west-1,jp-west-2').split(',')
+
+# resource name -> (paginated list generator, needs a project id)
+LIST_WRAPPERS = {
+    'servers': (K5API.iter_servers, True),
+    'volumes': (K5API.iter_volumes, True),
+    'snapshots': (K5API.iter_snapshots, True),
+    'networks': (K5API.iter_networks, False),
+    'subnets': (K5API.iter_subnets, False),
+    'ports': (K5API.iter_ports, False),
+    'routers': (K5API.iter_routers, False),
+    'security_groups': (K5API.iter_security_groups, False),
+    'global_ips': (K5API.iter_global_ips, False),
+}
+
+
+class RegionCredentials(object):
+    """Summary - per region tokens for one contract admin, authenticated
+    lazily and cached by k5TokenCache
+
+    Args:
+        adminUser (string): K5 user name
+        adminPassword (string): K5 password
+        contract (string): K5 contract name
+    """
+
+    def __init__(self, adminUser, adminPassword, contract):
+        self.adminUser = adminUser
+        self.adminPassword = adminPassword
+        self.contract = contract
+
+    def _token(self, region):
+        token = k5TokenCache.get_unscoped_token(
+            self.adminUser, self.adminPassword, self.contract, region)
+        if isinstance(token, basestring) or token.status_code != 201:
+            raise RuntimeError('Failed to authenticate in ' + region + ' - ' +
+                               str(getattr(token, 'status_code', token)))
+        return token
+
+    def token(self, region):
+        """Summary - regional token for region
+        """
+        return self._token(region).headers['X-Subject-Token']
+
+    def project_id(self, region):
+        """Summary - id of the default project the regional token is
+        scoped to
+        """
+        return self._token(region).json()['token']['project'].get('id')
+
+
+def _call_region(call, region):
+    started = time.time()
+    try:
+        items = call(region)
+        error = None
+    except Exception:
+        items = []
+        error = repr(sys.exc_info()[1])
+    return region, items, error, time.time() - started
+
+
+def _merge(merged, region, items, error, latency):
+    for item in items:
+        tagged = dict(item)
+        tagged['region'] = region
+        merged['items'].append(tagged)
+    merged['regions'][region] = {'latency': round(latency, 3),
+                                 'count': len(items),
+                                 'error': error}
+
+
+def fan_out(call, regions=None, max_workers=None):
+    """Summary - run call(region) for every region concurrently and merge
+    the results
+
+    Args:
+        call (function): takes a region and returns a list of dicts -
+        exceptions are recorded as that region's error
+        regions (list): regions to query, default K5_REGIONS
+        max_workers (int): regions queried at the same time, default one
+        thread per region
+
+    Returns:
+        dict: {'items': merged dicts each tagged with 'region',
+               'regions': {region: {'latency': seconds, 'count': n,
+                                    'error': None or message}}}
+    """
+    regions = list(regions or default_regions)
+    results = parallel_map(lambda region: _call_region(call, region),
+                           regions, max_workers or len(regions))
+    merged = {'items': [], 'regions': {}}
+    for result in results:
+        _merge(merged, *result)
+    return merged
+
+
+def list_in_region(resource, credentials, region, project_id=None,
+                   fields=None):
+    """Summary - list one resource type in one region
+
+    Args:
+        resource (string): a LIST_WRAPPERS key e.g. 'servers'
+        credentials (RegionCredentials): contract admin credentials
+        region (string): K5 region
+        project_id (string): project for compute/block storage lists,
+        default the token's project
+        fields (list): attributes to return for networking resources
+
+    Returns:
+        list: the resource dicts
+    """
+    iterator, needs_project = LIST_WRAPPERS[resource]
+    k5token = credentials.token(region)
+    if needs_project:
+        return list(iterator(k5token,
+                             project_id or credentials.project_id(region),
+                             region))
+    return list(iterator(k5token, region, fields=fields))
+
+
+def list_across_regions(resource, credentials, regions=None,
+                        project_ids=None, max_workers=None, fields=None):
+    """Summary - run one list wrapper in every region concurrently
+
+    Args:
+        resource (string): a LIST_WRAPPERS key e.g. 'servers'
+        credentials (RegionCredentials): contract admin credentials
+        regions (list): regions to query, default K5_REGIONS
+        project_ids (dict): region -> project id for compute/block storage
+        lists, default the token's project in each region
+        max_workers (int): regions queried at the same time
+        fields (list): attributes to return for networking resources
+
+    Returns:
+        dict: merged result as returned by fan_out
+    """
+    project_ids = project_ids or {}
+    return fan_out(lambda region: list_in_region(
+                       resource, credentials, region,
+                       project_ids.get(region), fields),
+                   regions, max_workers)
+
+
+def global_inventory(credentials, resources=None, regions=None,
+                     project_ids=None, max_workers=None):
+    """Summary - list several resource types in several regions, every
+    (resource, region) pair running concurrently
+
+    Args:
+        credentials (RegionCredentials): contract admin credentials
+        resources (list): LIST_WRAPPERS keys, default all of them
+        regions (list): regions to query, default K5_REGIONS
+        project_ids (dict): region -> project id for compute/block storage
+        max_workers (int): calls running at the same time
+
+    Returns:
+        dict: resource -> merged result as returned by fan_out
+    """
+    resources = list(resources or sorted(LIST_WRAPPERS))
+    regions = list(regions or default_regions)
+    project_ids = project_ids or {}
+    pairs = [(resource, region) for resource in resources
+             for region in regions]
+
+    def query(pair):
+        resource, region = pair
+        return resource, _call_region(
+            lambda region: list_in_region(resource, credentials, region,
+                                          project_ids.get(region)),
+            region)
+
+    inventory = dict((resource, {'items': [], 'regions': {}})
+                     for resource in resources)
+    for resource, result in parallel_map(query, pairs,
+                                         max_workers or len(pairs)):
+        _merge(inventory[resource], *result)
+    return inventory
@@ -0,0 +1,866 @@
+#!/usr/bin/python
+"""Summary: Large object transfers for K5 object storage (swift)
+
+    A single PUT is limited to one TCP stream and to swift's maximum
+    object size. upload_large_file splits a file into segments. The
+    segments are stored in a <container>_segments container and uploaded
+    concurrently, one pooled connection each. A static large object
+    manifest then joins them into a single object.
+
+    Each segment is read twice from disk, once to work out its MD5 and
+    once to stream it, so memory use stays at one read chunk per worker
+    however big the segments are. Segment names include the file's size
+    and modification time. A re-run of an interrupted upload lists the
+    segments already stored and skips every one whose ETag matches. Once
+    the new object is in place, the segments of the manifest it replaced
+    are deleted.
+
+    Downloads are streamed, never held in memory. iter_object yields an
+    object, or a byte range of it, in chunks. download_object writes an
+    object to a file and resumes a partial file with a Range request,
+    pinned with If-Range to the ETag recorded when the download began.
+    download_parallel fetches a big object as several ranges at once.
+    Each range is written straight into its place in the file and pinned
+    to the object's ETag with If-Match, so a concurrent overwrite can't
+    mix two versions.
+
+    iter_objects lists a container page by page with marker, prefix and
+    delimiter. ContainerManifest keeps a local copy of a container's
+    listing, with each object's ETag, size and last-modified time. A
+    refresh first HEADs the container and only lists it again when the
+    object count or bytes used have changed, or when the copy is older
+    than K5_MANIFEST_MAX_AGE. It reports which objects were added,
+    changed or removed, so jobs don't have to walk the whole listing
+    themselves.
+
+    sync_directory publishes a local directory to a container like
+    rsync. It compares local MD5s with the ETags from one listing, using
+    slo_etag for large objects. It uploads new and changed files
+    concurrently, and can delete objects that no longer exist locally.
+    Run the module with -h for the command line.
+
+    Tuning via environment variables:
+        K5_SEGMENT_SIZE    - bytes per segment (default 100MB)
+        K5_SEGMENT_WORKERS - segments uploaded or ranges downloaded at the
+                             same time (default 4)
+        K5_DOWNLOAD_CHUNK_SIZE - bytes per chunk read from a download
+                             stream (default 1MB)
+        K5_MANIFEST_DIR     - where container manifests are kept (default
+                             the system temp directory)
+        K5_MANIFEST_MAX_AGE - seconds before a manifest is re-listed even
+                             if the container counters match (default 300)
+"""
+
+import getopt
+import hashlib
+import json
+import mimetypes
+import ntpath
+import os
+import sys
+import tempfile
+import time
+import urllib
+
+import k5APIwrappersV19 as K5API
+import k5HTTPPool as k5http
+import k5TokenCache
+from k5Parallel import parallel_map
+
+segment_size = int(os.getenv('K5_SEGMENT_SIZE', str(100 * 1024 * 1024)))
+segment_workers = int(os.getenv('K5_SEGMENT_WORKERS', '4'))
+download_chunk_size = int(os.getenv('K5_DOWNLOAD_CHUNK_SIZE',
+                                    str(1024 * 1024)))
+manifest_dir = os.getenv('K5_MANIFEST_DIR', tempfile.gettempdir())
+manifest_max_age = int(os.getenv('K5_MANIFEST_MAX_AGE', '300'))
+
+# swift's default limit on the number of segments in one manifest
+MAX_SEGMENTS = 1000
+
+
+def storage_url(projectid, region):
+    return 'https://objectstorage.' + region + \
+        '.cloud.global.fujitsu.com/v1/AUTH_' + projectid
+
+
+def object_url(projectid, region, container_name, object_name=None):
+    """Summary - url of a container, or of an object in it, with the names
+    url quoted
+    """
+    url = storage_url(projectid, region) + '/' + _quote(container_name)
+    if object_name is not None:
+        url = url + '/' + _quote(object_name)
+    return url
+
+
+def _quote(name):
+    if isinstance(name, unicode):
+        name = name.encode('utf-8')
+    return urllib.quote(name, safe='/')
+
+
+def _headers(k5token, extra=None):
+    headers = {'X-Auth-Token': k5token}
+    headers.update(extra or {})
+    return headers
+
+
+def range_chunks(file_path, offset, length, chunk_size=None):
+    """Summary - read length bytes of a file from offset in fixed size
+    chunks
+
+    Returns:
+        generator: byte strings
+    """
+    chunk_size = chunk_size or K5API.upload_chunk_size
+    with open(file_path, 'rb') as source:
+        source.seek(offset)
+        while length > 0:
+            chunk = source.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length = length - len(chunk)
+            yield chunk
+
+
+def range_md5(file_path, offset, length):
+    """Summary - hex MD5 of a byte range of a file, which is the ETag swift
+    gives the segment
+    """
+    digest = hashlib.md5()
+    for chunk in range_chunks(file_path, offset, length):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_objects(k5token, projectid, container_name, region, prefix=None,
+                 delimiter=None, limit=None):
+    """Summary - every object in a container, following marker pagination
+
+    Args:
+        k5token (string): project scoped token
+        projectid (string): project id
+        container_name (string): container
+        region (string): K5 region
+        prefix (string): only names starting with prefix
+        delimiter (string): e.g. '/' to roll names up into
+        {'subdir': ...} entries like a directory listing
+        limit (int): page size, default swift's own (10000)
+
+    Returns:
+        generator: object dicts with name, hash, bytes, last_modified and
+        content_type - nothing if the container does not exist
+    """
+    marker = None
+    while True:
+        params = {'format': 'json'}
+        for name, value in (('prefix', prefix), ('delimiter', delimiter),
+                            ('limit', limit), ('marker', marker)):
+            if value:
+                params[name] = value
+        response = k5http.get(object_url(projectid, region, container_name),
+                              params=params, headers=_headers(k5token))
+        if response.status_code == 404:
+            return
+        if response.status_code not in (200, 204):
+            raise RuntimeError('list ' + container_name + ' - ' +
+                               str(response.status_code))
+        page = response.json() if response.status_code == 200 else []
+        if not page:
+            return
+        for item in page:
+            yield item
+        marker = page[-1].get('name') or page[-1].get('subdir')
+
+
+def plan_segments(size, size_per_segment=None):
+    """Summary - (offset, length) of every segment of a file, with the
+    segment size raised if needed to stay within MAX_SEGMENTS
+
+    Returns:
+        list: (offset, length) tuples
+    """
+    size_per_segment = size_per_segment or segment_size
+    size_per_segment = max(size_per_segment,
+                           (size + MAX_SEGMENTS - 1) // MAX_SEGMENTS, 1)
+    return [(offset, min(size_per_segment, size - offset))
+            for offset in range(0, size, size_per_segment)]
+
+
+def upload_large_file(k5token, projectid, container_name, file_path, region,
+                      object_name=None, size_per_segment=None,
+                      max_workers=None,
+                      content_type='application/octet-stream'):
+    """Summary - upload a file as a swift static large object, segments
+    in parallel, skipping segments already uploaded by an earlier run
+
+    Args:
+        k5token (string): project scoped token
+        projectid (string): project id
+        container_name (string): container for the object
+        file_path (string): local file
+        region (string): K5 region
+        object_name (string): default the file name
+        size_per_segment (int): default K5_SEGMENT_SIZE
+        max_workers (int): default K5_SEGMENT_WORKERS
+        content_type (string): Content-Type the object is served with
+
+    Returns:
+        dict: {'object', 'segments', 'uploaded', 'skipped', 'errors':
+               [(segment, status)], 'manifest': status or None when a
+               segment failed - a file smaller than one segment is sent
+               as a plain object and this is that PUT's status,
+               'removed': old segments deleted}
+    """
+    object_name = object_name or ntpath.basename(file_path)
+    segment_container = container_name + '_segments'
+    size = os.path.getsize(file_path)
+    segments = plan_segments(size, size_per_segment)
+    result = {'object': object_name, 'segments': len(segments),
+              'uploaded': 0, 'skipped': 0, 'errors': [], 'manifest': None,
+              'removed': 0}
+
+    containers = [container_name]
+    if len(segments) > 1:
+        containers.append(segment_container)
+    for container in containers:
+        # created private if missing - an existing container's ACL is left
+        # as it is
+        failed = K5API.ensure_storage_container(k5token, projectid,
+                                                container, region)
+        if failed is not None:
+            raise RuntimeError('create container ' + container + ' - ' +
+                               str(failed.status_code))
+
+    # segments of the object being replaced, deleted once it is
+    previous = manifest_segments(k5token, projectid, container_name,
+                                 object_name, region)
+
+    if len(segments) <= 1:
+        # too small to be worth segmenting
+        with open(file_path, 'rb') as source:
+            response = k5http.put(
+                object_url(projectid, region, container_name, object_name),
+                data=source,
+                headers=_headers(k5token, {
+                    'ETag': range_md5(file_path, 0, size),
+                    'Content-Type': content_type}))
+        result['manifest'] = response.status_code
+        result['uploaded'] = 1
+        if response.status_code == 201:
+            result['removed'] = remove_segments(
+                k5token, projectid, region, segment_container, object_name,
+                previous, (), max_workers)
+        return result
+
+    # size and mtime in the name so a changed file never reuses segments
+    prefix = '%s/slo/%d/%d/%d/' % (object_name,
+                                   int(os.path.getmtime(file_path)),
+                                   size, segments[0][1])
+    existing = dict((item['name'], item.get('hash')) for item in
+                    iter_objects(k5token, projectid, segment_container,
+                                 region, prefix))
+
+    def upload_segment(numbered):
+        number, (offset, length) = numbered
+        name = prefix + '%08d' % number
+        etag = range_md5(file_path, offset, length)
+        entry = {'path': '/' + segment_container + '/' + name,
+                 'etag': etag, 'size_bytes': length}
+        if existing.get(name) == etag:
+            return entry, 'skipped'
+        try:
+            response = k5http.put(
+                object_url(projectid, region, segment_container, name),
+                data=range_chunks(file_path, offset, length),
+                headers=_headers(k5token, {
+                    'ETag': etag,
+                    'Content-Type': 'application/octet-stream'}))
+            status = response.status_code
+        except Exception:
+            status = repr(sys.exc_info()[1])
+        return entry, 'uploaded' if status == 201 else status
+
+    outcomes = parallel_map(upload_segment, list(enumerate(segments)),
+                            max_workers or segment_workers)
+    for entry, outcome in outcomes:
+        if outcome in ('uploaded', 'skipped'):
+            result[outcome] = result[outcome] + 1
+        else:
+            result['errors'].append((entry['path'], outcome))
+    if result['errors']:
+        return result
+
+    response = k5http.put(
+        object_url(projectid, region, container_name, object_name),
+        params={'multipart-manifest': 'put'},
+        data=json.dumps([entry for entry, outcome in outcomes]),
+        # swift serves the joined object with the manifest's Content-Type
+        headers=_headers(k5token, {'Content-Type': content_type}))
+    result['manifest'] = response.status_code
+    if response.status_code == 201:
+        result['removed'] = remove_segments(
+            k5token, projectid, region, segment_container, object_name,
+            previous, [entry['path'] for entry, outcome in outcomes],
+            max_workers)
+    return result
+
+
+def manifest_segments(k5token, projectid, container_name, object_name,
+                      region):
+    """Summary - segment paths of an object's static large object
+    manifest
+
+    Returns:
+        list: '/<container>/<segment>' paths, empty if the object is
+              missing or is not a static large object
+    """
+    url = object_url(projectid, region, container_name, object_name)
+    head = k5http.head(url, headers=_headers(k5token))
+    if head.status_code != 200 or \
+            head.headers.get('X-Static-Large-Object', '').lower() != 'true':
+        return []
+    response = k5http.get(url, params={'multipart-manifest': 'get'},
+                          headers=_headers(k5token))
+    if response.status_code != 200:
+        return []
+    return [segment['name'] for segment in response.json()]
+
+
+def remove_segments(k5token, projectid, region, segment_container,
+                    object_name, previous, current, max_workers=None):
+    """Summary - delete an old manifest's segments that the new one does
+    not use. Only segments upload_large_file wrote for this object, under
+    <segment container>/<object>/slo/, are touched
+
+    Returns:
+        int: segments deleted
+    """
+    def text(path):
+        # the old manifest's paths come back from json as unicode
+        return path.decode('utf-8') if isinstance(path, str) else path
+
+    own = text('/' + segment_container + '/' + object_name + '/slo/')
+    stale = [path for path in set(map(text, previous)) -
+             set(map(text, current)) if path.startswith(own)]
+
+    def delete_segment(path):
+        try:
+            return k5http.delete(
+                storage_url(projectid, region) + _quote(path),
+                headers=_headers(k5token)).status_code in (204, 404)
+        except Exception:
+            return False
+
+    return len([deleted for deleted in parallel_map(
+        delete_segment, stale, max_workers or segment_workers) if deleted])
+
+
+def byte_range(offset=0, length=None):
+    """Summary - HTTP Range header value, None for the whole object
+    """
+    if not offset and length is None:
+        return None
+    if length is None:
+        return 'bytes=%d-' % offset
+    return 'bytes=%d-%d' % (offset, offset + length - 1)
+
+
+def open_object(k5token, projectid, container_name, object_name, region,
+                offset=0, length=None, etag=None, if_range=None):
+    """Summary - start a streamed GET of an object or a byte range of it.
+    The body is not read - close the response when done
+
+    Args:
+        k5token (string): project scoped token
+        projectid (string): project id
+        container_name (string): container
+        object_name (string): object
+        region (string): K5 region
+        offset (int): first byte wanted
+        length (int): bytes wanted, default to the end of the object
+        etag (string): only answer if the object still has this ETag
+        if_range (string): only send the range if the object still has
+        this ETag, otherwise send the whole object
+
+    Returns:
+        requests.Response: 200 for the whole object, 206 for a range
+    """
+    extra = {}
+    wanted = byte_range(offset, length)
+    if wanted:
+        extra['Range'] = wanted
+        if if_range:
+            extra['If-Range'] = if_range
+    if etag:
+        extra['If-Match'] = etag
+    return k5http.get(
+        object_url(projectid, region, container_name, object_name),
+        headers=_headers(k5token, extra), stream=True)
+
+
+def iter_object(k5token, projectid, container_name, object_name, region,
+                offset=0, length=None, chunk_size=None):
+    """Summary - yield an object, or a byte range of it, in chunks
+
+    Returns:
+        generator: byte strings
+    """
+    response = open_object(k5token, projectid, container_name, object_name,
+                           region, offset, length)
+    try:
+        if response.status_code not in (200, 206):
+            raise RuntimeError('download ' + object_name + ' - ' +
+                               str(response.status_code))
+        if response.status_code == 200 and (offset or length is not None):
+            raise RuntimeError('download ' + object_name +
+                               ' - range not honoured')
+        for chunk in response.iter_content(chunk_size or
+                                           download_chunk_size):
+            yield chunk
+    finally:
+        response.close()
+
+
+def download_object(k5token, projectid, container_name, object_name,
+                    file_path, region, resume=True):
+    """Summary - stream an object to a file, continuing a partial file
+    left by an interrupted download. The object's ETag is kept in
+    file_path.etag while the file is partial, and a resume only appends
+    if the object still has that ETag - otherwise it starts again
+
+    Args:
+        k5token (string): project scoped token
+        projectid (string): project id
+        container_name (string): container
+        object_name (string): object
+        file_path (string): local file
+        region (string): K5 region
+        resume (bool): False to always start from the beginning
+
+    Returns:
+        dict: {'bytes': bytes written by this call, 'resumed_from': offset}
+    """
+    etag_path = file_path + '.etag'
+    offset = 0
+    etag = None
+    if resume and os.path.exists(file_path) and os.path.exists(etag_path):
+        with open(etag_path) as saved:
+            etag = saved.read().strip() or None
+        if etag:
+            offset = os.path.getsize(file_path)
+    response = open_object(k5token, projectid, container_name, object_name,
+                           region, offset, if_range=etag)
+    try:
+        if response.status_code == 416:
+            # only complete if the object is the one the file was started
+            # from and the file holds all of it
+            head = k5http.head(
+                object_url(projectid, region, container_name, object_name),
+                headers=_headers(k5token))
+            if head.status_code == 200 and \
+                    head.headers.get('ETag') == etag and \
+                    int(head.headers.get('Content-Length', -1)) == offset:
+                os.remove(etag_path)
+                return {'bytes': 0, 'resumed_from': offset}
+            response.close()
+            return download_object(k5token, projectid, container_name,
+                                   object_name, file_path, region, False)
+        if response.status_code not in (200, 206):
+            raise RuntimeError('download ' + object_name + ' - ' +
+                               str(response.status_code))
+        if response.status_code == 200:
+            # new download, or the object changed since the file was
+            # started - the server sent the whole object
+            offset = 0
+            etag = response.headers.get('ETag')
+            if etag:
+                with open(etag_path, 'w') as saved:
+                    saved.write(etag)
+            elif os.path.exists(etag_path):
+                os.remove(etag_path)
+        written = 0
+        with open(file_path, 'ab' if offset else 'wb') as target:
+            for chunk in response.iter_content(download_chunk_size):
+                target.write(chunk)
+                written = written + len(chunk)
+        if os.path.exists(etag_path):
+            os.remove(etag_path)
+        return {'bytes': written, 'resumed_from': offset}
+    finally:
+        response.close()
+
+
+def download_parallel(k5token, projectid, container_name, object_name,
+                      file_path, region, part_size=None, max_workers=None):
+    """Summary - download a big object as several byte ranges at once,
+    each written into its place in the file. The file is built as
+    file_path.tmp and renamed when complete
+
+    Args:
+        k5token (string): project scoped token
+        projectid (string): project id
+        container_name (string): container
+        object_name (string): object
+        file_path (string): local file
+        region (string): K5 region
+        part_size (int): bytes per range, default K5_SEGMENT_SIZE
+        max_workers (int): ranges at the same time, default
+        K5_SEGMENT_WORKERS
+
+    Returns:
+        dict: {'bytes': object size, 'parts': number of ranges,
+               'etag': object ETag}
+    """
+    head = k5http.head(
+        object_url(projectid, region, container_name, object_name),
+        headers=_headers(k5token))
+    if head.status_code != 200:
+        raise RuntimeError('head ' + object_name + ' - ' +
+                           str(head.status_code))
+    size = int(head.headers['Content-Length'])
+    etag = head.headers.get('ETag')
+    parts = plan_segments(size, part_size)
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'wb') as target:
+        target.truncate(size)
+
+    def fetch(part):
+        offset, length = part
+        response = open_object(k5token, projectid, container_name,
+                               object_name, region, offset, length, etag)
+        try:
+            if response.status_code != 206:
+                return offset, response.status_code
+            with open(temp_path, 'r+b') as target:
+                target.seek(offset)
+                for chunk in response.iter_content(download_chunk_size):
+                    target.write(chunk)
+                    length = length - len(chunk)
+            return offset, None if length == 0 else 'short read'
+        except Exception:
+            return offset, repr(sys.exc_info()[1])
+        finally:
+            response.close()
+
+    if size:
+        errors = [(offset, error) for offset, error in
+                  parallel_map(fetch, parts, max_workers or segment_workers)
+                  if error is not None]
+        if errors:
+            os.remove(temp_path)
+            raise RuntimeError('download ' + object_name + ' - ranges ' +
+                               str(errors))
+    os.rename(temp_path, file_path)
+    return {'bytes': size, 'parts': len(parts), 'etag': etag}
+
+
+def container_fingerprint(k5token, projectid, container_name, region):
+    """Summary - cheap HEAD summary of a container that changes whenever an
+    object is added, removed or resized
+
+    Returns:
+        list: [object count, bytes used, last modified] or None if the
+        container does not exist
+    """
+    response = k5http.head(object_url(projectid, region, container_name),
+                           headers=_headers(k5token))
+    if response.status_code == 404:
+        return None
+    if response.status_code not in (200, 204):
+        raise RuntimeError('head ' + container_name + ' - ' +
+                           str(response.status_code))
+    return [response.headers.get('X-Container-Object-Count'),
+            response.headers.get('X-Container-Bytes-Used'),
+            response.headers.get('Last-Modified')]
+
+
+class ContainerManifest(object):
+    """Summary - local json copy of a container listing
+
+    Args:
+        projectid (string): project id
+        container_name (string): container
+        region (string): K5 region
+        path (string): manifest file, default under K5_MANIFEST_DIR
+    """
+
+    def __init__(self, projectid, container_name, region, path=None):
+        self.projectid = projectid
+        self.container_name = container_name
+        self.region = region
+        self.path = path or os.path.join(
+            manifest_dir, 'manifest-' + projectid + '-' + region + '-' +
+            _quote(container_name).replace('/', '_') + '.json')
+        self.state = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as manifest_file:
+                state = json.load(manifest_file)
+            if state.get('container') == self.container_name:
+                return state
+        except (IOError, ValueError):
+            pass
+        return {'container': self.container_name, 'fingerprint': None,
+                'listed': 0, 'objects': {}}
+
+    def save(self):
+        """Summary - write the manifest, replacing the old file in one step
+        """
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as manifest_file:
+            json.dump(self.state, manifest_file)
+        os.rename(temp_path, self.path)
+
+    @property
+    def objects(self):
+        """Summary - name -> {'hash', 'bytes', 'last_modified'}
+        """
+        return self.state['objects']
+
+    def refresh(self, k5token, max_age=None, force=False):
+        """Summary - bring the manifest up to date, re-listing the container
+        only if its HEAD counters changed or the listing is older than
+        max_age
+
+        Args:
+            k5token (string): project scoped token
+            max_age (int): seconds, default K5_MANIFEST_MAX_AGE
+            force (bool): always re-list
+
+        Returns:
+            dict: {'added': [names], 'changed': [names], 'removed': [names],
+                   'listed': True if the container was re-listed}
+        """
+        max_age = manifest_max_age if max_age is None else max_age
+        changes = {'added': [], 'changed': [], 'removed': [],
+                   'listed': False}
+        fingerprint = container_fingerprint(
+            k5token, self.projectid, self.container_name, self.region)
+        if not force and fingerprint == self.state['fingerprint'] and \
+                self.state['listed'] + max_age > time.time():
+            return changes
+
+        listed = time.time()
+        current = {}
+        if fingerprint is not None:
+            for item in iter_objects(k5token, self.projectid,
+                                     self.container_name, self.region):
+                current[item['name']] = {
+                    'hash': item.get('hash'), 'bytes': item.get('bytes'),
+                    'last_modified': item.get('last_modified')}
+        for name, item in current.items():
+            previous = self.objects.get(name)
+            if previous is None:
+                changes['added'].append(name)
+            elif previous != item:
+                changes['changed'].append(name)
+        changes['removed'] = [name for name in self.objects
+                              if name not in current]
+        changes['listed'] = True
+        self.state = {'container': self.container_name,
+                      'fingerprint': fingerprint, 'listed': listed,
+                      'objects': current}
+        self.save()
+        return changes
+
+    def modified_since(self, last_modified, prefix=''):
+        """Summary - names of objects modified after a swift last_modified
+        timestamp e.g. '2016-12-08T13:02:47.123450'
+
+        Returns:
+            list: object names
+        """
+        return sorted(name for name, item in self.objects.items()
+                      if name.startswith(prefix) and
+                      (item.get('last_modified') or '') > last_modified)
+
+
+def local_etag(file_path, size_per_segment=None):
+    """Summary - the ETag of a file once sent by upload_large_file: its
+    MD5, or for a file big enough to be segmented, the MD5 of its
+    segments' MD5s. Swift reports the latter as the object's ETag on HEAD
+    and GET and as slo_etag in a listing - the listing's hash is the MD5
+    of the manifest
+
+    Returns:
+        string: hex digest
+    """
+    size = os.path.getsize(file_path)
+    segments = plan_segments(size, size_per_segment)
+    if len(segments) <= 1:
+        return range_md5(file_path, 0, size)
+    digest = hashlib.md5()
+    for offset, length in segments:
+        digest.update(range_md5(file_path, offset, length))
+    return digest.hexdigest()
+
+
+def local_files(directory, prefix=''):
+    """Summary - object name -> local path for every file under directory
+
+    Returns:
+        dict: names use '/' separators and start with prefix
+    """
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory)
+            files[prefix + relative.replace(os.sep, '/')] = path
+    return files
+
+
+def sync_directory(k5token, projectid, container_name, directory, region,
+                   prefix='', delete=False, dry_run=False, max_workers=None):
+    """Summary - make a container (or a prefix of it) match a local
+    directory, uploading only new or changed files
+
+    Args:
+        k5token (string): project scoped token
+        projectid (string): project id
+        container_name (string): container
+        directory (string): local directory
+        region (string): K5 region
+        prefix (string): object name prefix e.g. 'static/'
+        delete (bool): delete objects under prefix with no local file
+        dry_run (bool): only work out the changes
+        max_workers (int): files hashed and uploaded at the same time,
+        default K5_SEGMENT_WORKERS
+
+    Returns:
+        dict: {'uploaded': [names], 'deleted': [names], 'unchanged': count,
+               'errors': [(name, status)]}
+    """
+    workers = max_workers or segment_workers
+    remote = dict((item['name'], item) for item in
+                  iter_objects(k5token, projectid, container_name, region,
+                               prefix))
+    files = local_files(directory, prefix)
+
+    def unchanged(name):
+        etag = local_etag(files[name])
+        item = remote[name]
+        if item.get('slo_etag'):
+            return name, item['slo_etag'].strip('"') == etag
+        if item.get('hash') == etag:
+            return name, True
+        if len(plan_segments(os.path.getsize(files[name]))) <= 1:
+            return name, False
+        # a static large object listed without slo_etag - only a HEAD
+        # gives the MD5 of its segments' MD5s
+        head = k5http.head(
+            object_url(projectid, region, container_name, name),
+            headers=_headers(k5token))
+        return name, head.status_code == 200 and \
+            head.headers.get('ETag', '').strip('"') == etag
+
+    same = set(name for name, same in parallel_map(
+        unchanged, [name for name in files if name in remote], workers)
+        if same)
+    upload = sorted(name for name in files if name not in same)
+    extra = sorted(name for name in remote if name not in files) \
+        if delete else []
+    result = {'uploaded': [], 'deleted': [], 'errors': [],
+              'unchanged': len(files) - len(upload)}
+    if dry_run:
+        result['uploaded'] = upload
+        result['deleted'] = extra
+        return result
+
+    def upload_file(name):
+        content_type = mimetypes.guess_type(name)[0] or \
+            'application/octet-stream'
+        try:
+            sent = upload_large_file(
+                k5token, projectid, container_name, files[name], region,
+                object_name=name, content_type=content_type)
+            status = sent['errors'] or sent['manifest']
+        except Exception:
+            status = repr(sys.exc_info()[1])
+        return 'upload', name, status
+
+    def delete_object(name):
+        # also removes the segments when the object is a large object
+        try:
+            status = k5http.delete(
+                object_url(projectid, region, container_name, name),
+                params={'multipart-manifest': 'delete'},
+                headers=_headers(k5token)).status_code
+        except Exception:
+            status = repr(sys.exc_info()[1])
+        return 'delete', name, status
+
+    calls = [(upload_file, name) for name in upload] + \
+        [(delete_object, name) for name in extra]
+    for action, name, status in parallel_map(
+            lambda call: call[0](call[1]), calls, workers):
+        if action == 'upload' and status == 201:
+            result['uploaded'].append(name)
+        elif action == 'delete' and status in (200, 204, 404):
+            result['deleted'].append(name)
+        else:
+            result['errors'].append((name, status))
+    return result
+
+
+def usage():
+    print 'k5ObjectStorage.py -p <project id> -c <container> -d <directory>' \
+        ' [-x <prefix>] [-D] [-n] [-w <workers>]'
+    print
+    print '  Uploads new and changed files from directory to the container.'
+    print '  -x  object name prefix for the files'
+    print '  -D  delete objects under the prefix that have no local file'
+    print '  -n  dry run - only print the changes'
+    print '  Credentials are read from K5_USERNAME, K5_PASSWORD,'
+    print '  K5_CONTRACT and K5_REGION.'
+
+
+def main():
+    """Summary - sync a directory to a container from the command line
+    """
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hp:c:d:x:Dnw:')
+    except getopt.GetoptError as err:
+        print err
+        usage()
+        sys.exit(2)
+    options = dict(opts)
+    if '-h' in options or not all(
+            option in options for option in ('-p', '-c', '-d')):
+        usage()
+        sys.exit(0 if '-h' in options else 2)
+
+    region = os.getenv('K5_REGION', 'uk-1')
+    token = k5TokenCache.get_unscoped_token(
+        os.getenv('K5_USERNAME'), os.getenv('K5_PASSWORD'),
+        os.getenv('K5_CONTRACT'), region)
+    if isinstance(token, str) or token.status_code != 201:
+        print 'Unable to authenticate with K5 - check credentials'
+        sys.exit(1)
+    scoped = k5TokenCache.get_rescoped_token(
+        token.headers['X-Subject-Token'], options['-p'], region)
+    if isinstance(scoped, tuple) or scoped.status_code != 201:
+        print 'Unable to scope a token to project', options['-p']
+        sys.exit(1)
+
+    workers = options.get('-w')
+    result = sync_directory(
+        scoped.headers['X-Subject-Token'], options['-p'], options['-c'],
+        options['-d'], region, prefix=options.get('-x', ''),
+        delete='-D' in options, dry_run='-n' in options,
+        max_workers=int(workers) if workers else None)
+    for name in result['uploaded']:
+        print 'upload', name
+    for name in result['deleted']:
+        print 'delete', name
+    for name, status in result['errors']:
+        print 'failed', name, status
+    print result['unchanged'], 'files unchanged'
+    if result['errors']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
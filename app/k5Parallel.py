@@ -0,0 +1,38 @@
+#!/usr/bin/python
+"""Summary: Bounded thread pool helper for running independent K5 API calls
+    concurrently
+
+    The K5 API calls are network bound so a small pool of threads gives
+    near linear speed ups while the pooled sessions in k5HTTPPool keep the
+    number of open connections in check. Keep max_workers at or below
+    k5HTTPPool.pool_size.
+"""
+
+import os
+from multiprocessing.pool import ThreadPool
+
+default_workers = int(os.getenv('K5_PARALLEL_WORKERS', '8'))
+
+
+def parallel_map(func, items, max_workers=None):
+    """Summary - call func on every item using up to max_workers threads
+
+    Args:
+        func (function): called once per item - should catch its own errors
+        and return them as a result, like the API wrappers do
+        items (iterable): arguments for func
+        max_workers (int): upper bound on concurrent calls
+
+    Returns:
+        list: func results in the same order as items
+    """
+    items = list(items)
+    workers = min(max_workers or default_workers, len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(func, items, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,149 @@
+#!/usr/bin/python
+"""Summary: Merged compute quota view for a K5 project
+
+    K5 reports compute limits per availability zone. get_quota_limits
+    fetches every AZ's /limits concurrently. quota_view merges the AZs
+    into one entry per resource: the limit, the usage summed across AZs,
+    what is still available, and the per-AZ breakdown. Views are cached
+    per project for a short TTL. A pre-flight check before a bulk launch
+    therefore costs one round trip, and repeat checks cost none.
+
+    Tuning via environment variables:
+        K5_QUOTA_TTL - seconds a quota view is reused (default 30)
+"""
+
+import os
+import threading
+import time
+
+import k5APIwrappersV19 as K5API
+
+quota_ttl = int(os.getenv('K5_QUOTA_TTL', '30'))
+
+# resource -> (limit attribute, usage attribute) in the nova absolute limits
+RESOURCES = {
+    'cores': ('maxTotalCores', 'totalCoresUsed'),
+    'instances': ('maxTotalInstances', 'totalInstancesUsed'),
+    'ram': ('maxTotalRAMSize', 'totalRAMUsed'),
+    'floating_ips': ('maxTotalFloatingIps', 'totalFloatingIpsUsed'),
+    'security_groups': ('maxSecurityGroups', 'totalSecurityGroupsUsed'),
+    'server_groups': ('maxServerGroups', 'totalServerGroupsUsed'),
+    'keypairs': ('maxTotalKeypairs', None),
+}
+
+
+def merge_limits(zones):
+    """Summary - merge per AZ nova limits into one view per resource.
+    Usage is summed across the AZs. The limit is the project quota, which
+    every AZ reports, so the largest reported value is used. -1 means
+    unlimited.
+
+    Args:
+        zones (dict): az -> /limits json as returned by get_quota_limits
+
+    Returns:
+        dict: resource -> {'limit': int, 'used': int,
+                           'available': int or None when unlimited,
+                           'zones': {az: {'limit': int, 'used': int}}}
+    """
+    view = {}
+    for resource, (limit_name, used_name) in RESOURCES.items():
+        entry = {'limit': None, 'used': 0, 'available': None, 'zones': {}}
+        for az, body in zones.items():
+            absolute = body.get('limits', {}).get('absolute', {})
+            if limit_name not in absolute:
+                continue
+            limit = int(absolute[limit_name])
+            used = int(absolute.get(used_name) or 0) if used_name else 0
+            entry['zones'][az] = {'limit': limit, 'used': used}
+            entry['used'] = entry['used'] + used
+            if limit == -1 or entry['limit'] is None:
+                entry['limit'] = limit
+            elif entry['limit'] != -1:
+                entry['limit'] = max(entry['limit'], limit)
+        if entry['limit'] is None:
+            continue
+        if entry['limit'] != -1:
+            entry['available'] = max(entry['limit'] - entry['used'], 0)
+        view[resource] = entry
+    return view
+
+
+class QuotaCache(object):
+    """Summary - per project TTL cache of merged quota views
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = quota_ttl if ttl is None else ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, k5token, projectid, region, availability_zones=None,
+            refresh=False):
+        """Summary - merged quota view for a project, fetched if it is
+        missing, older than the TTL or refresh is set
+
+        Args:
+            k5token (string): project scoped token
+            projectid (string): project id
+            region (string): K5 region
+            availability_zones (list): AZ names, default both region AZs
+            refresh (bool): ignore the cached view
+
+        Returns:
+            dict: view as returned by merge_limits
+        """
+        key = (region, projectid, tuple(availability_zones or ()))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and not refresh and entry[0] + self.ttl > now:
+            return entry[1]
+        limits = K5API.get_quota_limits(k5token, projectid, region,
+                                        availability_zones)
+        if not isinstance(limits, dict):
+            raise RuntimeError(str(limits))
+        view = merge_limits(limits['Availability_Zones'])
+        with self._lock:
+            self._entries[key] = (now, view)
+        return view
+
+    def invalidate(self, projectid=None):
+        """Summary - drop one project's views, or all of them - call after
+        launching or deleting servers
+        """
+        with self._lock:
+            if projectid is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries
+                            if key[1] == projectid]:
+                    del self._entries[key]
+
+
+quotas = QuotaCache()
+
+
+def quota_view(k5token, projectid, region, availability_zones=None,
+               refresh=False):
+    return quotas.get(k5token, projectid, region, availability_zones,
+                      refresh)
+
+
+def shortfall(view, **needed):
+    """Summary - resources a request would exceed, e.g.
+    shortfall(view, instances=40, cores=80, ram=163840)
+
+    Args:
+        view (dict): view as returned by quota_view
+        **needed: resource -> amount wanted
+
+    Returns:
+        dict: resource -> amount missing, empty if the request fits
+    """
+    missing = {}
+    for resource, amount in needed.items():
+        available = view.get(resource, {}).get('available')
+        if available is not None and amount > available:
+            missing[resource] = amount - available
+    return missing
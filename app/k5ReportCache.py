@@ -0,0 +1,140 @@
+#!/usr/bin/python
+"""Summary: In-process cache of the contract bubbles report for the portal
+
+    The report is held per (contract id, region) as json ready to send.
+    Each entry keeps the serialised bytes, a gzip copy made once when the
+    entry is stored, and a strong ETag. A page view never waits for K5.
+    When an entry is older than the TTL the stale copy is still served
+    while a single background thread regenerates it. Until the first
+    report for a contract has been built, an empty report tree for that
+    contract is served - never another contract's data.
+
+    Tuning via environment variables:
+        K5_REPORT_TTL       - seconds a report is fresh (default 300)
+        K5_REPORT_RETRY     - seconds to wait after a failed regeneration
+                              before trying again (default 60)
+        K5_REPORT_STATE_DIR - where incremental scan state is kept
+                              (default the system temp directory)
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+from StringIO import StringIO
+
+report_ttl = int(os.getenv('K5_REPORT_TTL', '300'))
+report_retry = int(os.getenv('K5_REPORT_RETRY', '60'))
+report_state_dir = os.getenv('K5_REPORT_STATE_DIR', tempfile.gettempdir())
+
+
+def state_path(contractid, region):
+    """Summary - incremental scan state file for a contract's report
+
+    Returns:
+        string: file path
+    """
+    return os.path.join(report_state_dir,
+                        'bubbles-' + contractid + '-' + region + '.state')
+
+
+class ReportPayload(object):
+    """Summary - a serialised report with its gzip copy and ETags
+
+    Args:
+        body (string): json bytes
+        generated (float): epoch time the report was built, 0 for a
+        placeholder
+    """
+
+    def __init__(self, body, generated):
+        self.body = body
+        self.generated = generated
+        buf = StringIO()
+        # a fixed mtime keeps the gzip bytes, and so the ETag, stable
+        gz = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6, mtime=0)
+        gz.write(body)
+        gz.close()
+        self.gzipped = buf.getvalue()
+        digest = hashlib.sha1(body).hexdigest()
+        # the two encodings are different representations so each needs
+        # its own strong validator
+        self.etag = digest
+        self.gzip_etag = digest + '-gzip'
+
+    @classmethod
+    def from_report(cls, report, generated=None):
+        return cls(json.dumps(report, separators=(',', ':')),
+                   time.time() if generated is None else generated)
+
+
+class ReportCache(object):
+    """Summary - TTL cache of report payloads with background regeneration
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = report_ttl if ttl is None else ttl
+        self._entries = {}
+        self._refreshing = set()
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def _regenerate(self, key, regenerate):
+        try:
+            payload = ReportPayload.from_report(regenerate())
+            with self._lock:
+                self._entries[key] = payload
+                self._failed.pop(key, None)
+        except Exception:
+            traceback.print_exc()
+            with self._lock:
+                self._failed[key] = time.time()
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key, regenerate, placeholder):
+        """Summary - current payload for key, starting a background
+        regeneration if it is missing or stale
+
+        Args:
+            key (tuple): (contract id, region)
+            regenerate (function): builds a fresh report dict, no arguments -
+            runs on a background thread so it must not touch the request
+            placeholder (function): builds the report dict served until the
+            first regeneration finishes, no arguments - must only describe
+            key's own contract
+
+        Returns:
+            ReportPayload: cached, stale or placeholder payload
+        """
+        now = time.time()
+        with self._lock:
+            payload = self._entries.get(key)
+            stale = payload is None or payload.generated + self.ttl < now
+            retry = self._failed.get(key, 0) + report_retry < now
+            start = stale and retry and key not in self._refreshing
+            if start:
+                self._refreshing.add(key)
+        if start:
+            thread = threading.Thread(target=self._regenerate,
+                                      args=(key, regenerate))
+            thread.daemon = True
+            thread.start()
+        return payload or ReportPayload.from_report(placeholder(), 0)
+
+    def invalidate(self, key=None):
+        """Summary - drop one contract's report, or all of them
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+reports = ReportCache()
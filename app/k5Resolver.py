@@ -0,0 +1,220 @@
+#!/usr/bin/python
+"""Summary: Indexed keystone name -> id resolver for K5 contracts
+
+    The assign_* wrappers used to download the complete users, groups,
+    projects and roles lists of a domain just to turn a single name into
+    an id with get_itemid. Here each (region, contract) pair keeps one
+    hash index per object type instead.
+
+    A name missing from the index is looked up with keystone's server-side
+    ?name= filter, so resolving one name only returns that one object.
+    prime() loads a full object list when the caller needs most of it,
+    e.g. batch onboarding. Roles are few, so their list is always loaded
+    in full.
+
+    Entries expire after K5_RESOLVER_TTL seconds (default 300). The
+    wrappers that create projects, groups and users also clear the
+    matching index straight away.
+"""
+
+import os
+import threading
+import time
+
+import k5HTTPPool as k5http
+
+ttl = int(os.getenv('K5_RESOLVER_TTL', '300'))
+
+# object types small enough that the whole list is fetched on first use
+FULL_LOAD_TYPES = ('roles',)
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+
+def _identity_url(region, objecttype):
+    return 'https://identity.' + region + \
+        '.cloud.global.fujitsu.com/v3/' + objecttype
+
+
+class KeystoneResolver(object):
+    """Summary - name -> id indexes for one contract in one region
+    """
+
+    def __init__(self, region, contractid):
+        self.region = region
+        self.contractid = contractid
+        # objecttype -> {name: (id, time indexed)}
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _query(self, k5token, objecttype, name=None):
+        params = {'domain_id': self.contractid}
+        if name is not None:
+            params['name'] = name
+        response = k5http.get(_identity_url(self.region, objecttype),
+                              params=params,
+                              headers={
+                                  'X-Auth-Token': k5token,
+                                  'Content-Type': 'application/json',
+                                  'Accept': 'application/json'})
+        if response.status_code != 200:
+            return None
+        return response.json().get(objecttype, [])
+
+    def _store(self, objecttype, items, replace=False):
+        now = time.time()
+        with self._lock:
+            if replace or objecttype not in self._indexes:
+                self._indexes[objecttype] = {}
+            index = self._indexes[objecttype]
+            for item in items:
+                index[item.get('name')] = (item.get('id'), now)
+
+    def load(self, objecttype, items):
+        """Summary - replace an index with a known list of objects, e.g. from
+        the local inventory, without calling K5
+
+        Args:
+            objecttype (string): users/groups/projects/roles
+            items (list): dicts with at least 'name' and 'id'
+        """
+        self._store(objecttype, items, replace=True)
+
+    def prime(self, k5token, objecttype):
+        """Summary - load the complete list of an object type into its index
+
+        Args:
+            k5token (string): K5 regional domain scoped token
+            objecttype (string): users/groups/projects/roles
+
+        Returns:
+            int: number of objects indexed, or None if the list call failed
+        """
+        items = self._query(k5token, objecttype)
+        if items is None:
+            return None
+        self.load(objecttype, items)
+        return len(items)
+
+    def lookup_remote(self, k5token, objecttype, name):
+        """Summary - ask keystone for a single object by name, bypassing the
+        index, and index the answer
+
+        Returns:
+            string: object id or 'None' if it doesn't exist (yet)
+        """
+        try:
+            items = self._query(k5token, objecttype, name)
+        except Exception:
+            items = None
+        if not items:
+            return 'None'
+        self._store(objecttype, items)
+        return items[0].get('id')
+
+    def get_id(self, k5token, objecttype, name):
+        """Summary - resolve a keystone object name to its id
+
+        Args:
+            k5token (string): K5 regional domain scoped token
+            objecttype (string): users/groups/projects/roles
+            name (string): object name
+
+        Returns:
+            string: object id or 'None' if it doesn't exist, matching
+            k5APIwrappersV19.get_itemid
+        """
+        entry = self._indexes.get(objecttype, {}).get(name)
+        if entry is not None and entry[1] + ttl > time.time():
+            return entry[0]
+        if objecttype in FULL_LOAD_TYPES:
+            try:
+                self.prime(k5token, objecttype)
+            except Exception:
+                pass
+            entry = self._indexes.get(objecttype, {}).get(name)
+            if entry is not None:
+                return entry[0]
+        return self.lookup_remote(k5token, objecttype, name)
+
+    def invalidate(self, objecttype=None):
+        """Summary - drop one index, or all of them
+
+        Args:
+            objecttype (string): users/groups/projects/roles or None for all
+        """
+        with self._lock:
+            if objecttype is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(objecttype, None)
+
+
+def get_resolver(region, contractid):
+    """Summary - shared resolver for a contract in a region
+
+    Args:
+        region (string): K5 region
+        contractid (string): K5 contract (domain) id
+
+    Returns:
+        KeystoneResolver: resolver for that contract and region
+    """
+    key = (region, contractid)
+    with _resolvers_lock:
+        resolver = _resolvers.get(key)
+        if resolver is None:
+            resolver = _resolvers[key] = KeystoneResolver(region, contractid)
+        return resolver
+
+
+def resolve_id(k5token, region, contractid, objecttype, name):
+    """Summary - indexed replacement for
+    get_itemid(get_keystoneobject_list(...), name, objecttype)
+
+    Args:
+        k5token (string): K5 regional domain scoped token
+        region (string): K5 region
+        contractid (string): K5 contract id
+        objecttype (string): users/groups/projects/roles
+        name (string): object name
+
+    Returns:
+        string: object id or 'None'
+    """
+    return get_resolver(region, contractid).get_id(k5token, objecttype, name)
+
+
+def prime(k5token, region, contractid, objecttypes):
+    """Summary - preload full indexes, e.g. before onboarding a batch
+
+    Args:
+        k5token (string): K5 regional domain scoped token
+        region (string): K5 region
+        contractid (string): K5 contract id
+        objecttypes (list): object types to load
+    """
+    resolver = get_resolver(region, contractid)
+    for objecttype in objecttypes:
+        resolver.prime(k5token, objecttype)
+
+
+def invalidate(contractid=None, objecttype=None, region=None):
+    """Summary - drop cached ids after objects are created or deleted. Groups
+    and users are global so by default every region of the contract is
+    cleared.
+
+    Args:
+        contractid (string): K5 contract id, None for every contract
+        objecttype (string): users/groups/projects/roles, None for all
+        region (string): only clear this region
+    """
+    with _resolvers_lock:
+        resolvers = _resolvers.items()
+    for (resolver_region, resolver_contract), resolver in resolvers:
+        if contractid is not None and resolver_contract != contractid:
+            continue
+        if region is not None and resolver_region != region:
+            continue
+        resolver.invalidate(objecttype)
@@ -0,0 +1,231 @@
+#!/usr/bin/python
+"""Summary: Apply a declared ruleset to a K5 security group
+
+    create_security_group_rule posts one rule per call. Building a policy
+    rule by rule means one sequential POST for every rule, and a re-run
+    hits a 409 conflict for every rule that already exists.
+
+    apply_ruleset fetches the group's existing rules once. It compares
+    them with the wanted rules by (direction, protocol, port range,
+    ethertype, remote) and only creates or deletes the difference, with
+    the calls running concurrently. A re-run of an unchanged ruleset
+    makes one GET and no writes. Rules that are in the group but not in
+    the ruleset are only deleted when prune is asked for.
+
+    A rule is a dict using the neutron attribute names, e.g.
+
+        {"direction": "ingress", "protocol": "tcp",
+         "port_range_min": 22, "port_range_max": 22,
+         "remote_ip_prefix": "0.0.0.0/0"}
+
+    Missing attributes default to the neutron defaults - IPv4, any
+    protocol, any port and any remote.
+"""
+
+import getopt
+import json
+import os
+import sys
+
+import k5APIwrappersV19 as K5API
+import k5TokenCache
+from k5Parallel import parallel_map
+
+
+def _port(value):
+    return None if value is None else int(value)
+
+
+def _text(value):
+    return None if value is None else unicode(value)
+
+
+def rule_key(rule):
+    """Summary - identity of a rule for comparison, ignoring its id and
+    description
+
+    Args:
+        rule (dict): wanted or existing rule
+
+    Returns:
+        tuple: (direction, protocol, port min, port max, ethertype,
+                remote ip prefix, remote group id)
+    """
+    protocol = rule.get('protocol')
+    if protocol is not None:
+        protocol = unicode(protocol).lower()
+        if protocol == u'any':
+            protocol = None
+    return (_text(rule.get('direction')),
+            protocol,
+            _port(rule.get('port_range_min')),
+            _port(rule.get('port_range_max')),
+            _text(rule.get('ethertype') or 'IPv4'),
+            _text(rule.get('remote_ip_prefix')),
+            _text(rule.get('remote_group_id')))
+
+
+def existing_rules(k5token, sgid, region):
+    """Summary - the security group's current rules
+
+    Returns:
+        list: rule dicts
+    """
+    response = K5API.list_security_group_rules(k5token, region, sg_id=sgid)
+    if isinstance(response, tuple) or response.status_code != 200:
+        raise RuntimeError('list security group rules - ' + str(
+            getattr(response, 'status_code', response)))
+    return [rule for rule in response.json()['security_group_rules']
+            if rule.get('security_group_id') == sgid]
+
+
+def diff_ruleset(existing, wanted, prune=False):
+    """Summary - work out which rules to create and delete
+
+    Args:
+        existing (list): rules currently in the group
+        wanted (list): rules the group should have - duplicates are ignored
+        prune (bool): also delete rules that are not in wanted
+
+    Returns:
+        tuple: (rules to create, existing rules to delete, unchanged count)
+    """
+    have = {}
+    delete = []
+    for rule in existing:
+        key = rule_key(rule)
+        if key in have:
+            # a redundant copy of a rule that is already present
+            delete.append(rule)
+        else:
+            have[key] = rule
+    create = []
+    keep = set()
+    for rule in wanted:
+        key = rule_key(rule)
+        if key in keep:
+            continue
+        keep.add(key)
+        if key not in have:
+            create.append(rule)
+    if prune:
+        delete.extend(rule for key, rule in have.items() if key not in keep)
+    else:
+        delete = []
+    return create, delete, len(keep) - len(create)
+
+
+def apply_ruleset(k5token, sgid, rules, region, prune=False, dry_run=False,
+                  max_workers=None):
+    """Summary - make a security group's rules match a declared ruleset
+
+    Args:
+        k5token (string): project scoped token
+        sgid (string): security group id
+        rules (list): wanted rule dicts
+        region (string): K5 region
+        prune (bool): delete existing rules that are not in the ruleset -
+        note this includes neutron's default egress rules unless they are
+        declared
+        dry_run (bool): only work out the changes
+        max_workers (int): calls running at the same time
+
+    Returns:
+        dict: {'created': [rules], 'deleted': [rule ids],
+               'unchanged': count, 'errors': [(rule or id, status)]}
+    """
+    create, delete, unchanged = diff_ruleset(
+        existing_rules(k5token, sgid, region), rules, prune)
+    result = {'created': [], 'deleted': [], 'unchanged': unchanged,
+              'errors': []}
+    if dry_run:
+        result['created'] = create
+        result['deleted'] = [rule['id'] for rule in delete]
+        return result
+
+    def create_rule(rule):
+        response = K5API.create_security_group_rule(
+            k5token, sgid, rule.get('direction'),
+            rule.get('port_range_min'), rule.get('port_range_max'),
+            rule.get('protocol'), region,
+            rule.get('ethertype') or 'IPv4',
+            rule.get('remote_ip_prefix'), rule.get('remote_group_id'))
+        return 'create', rule, getattr(response, 'status_code', response)
+
+    def delete_rule(rule):
+        response = K5API.delete_security_group_rule(k5token, rule['id'],
+                                                    region)
+        return 'delete', rule['id'], getattr(response, 'status_code',
+                                             response)
+
+    calls = ([(create_rule, rule) for rule in create] +
+             [(delete_rule, rule) for rule in delete])
+    for action, item, status in parallel_map(
+            lambda call: call[0](call[1]), calls, max_workers):
+        if action == 'create' and status in (201, 409):
+            result['created'].append(item)
+        elif action == 'delete' and status in (204, 404):
+            result['deleted'].append(item)
+        else:
+            result['errors'].append((item, status))
+    return result
+
+
+def usage():
+    print 'k5SecurityGroups.py -p <project id> -g <security group id> ' \
+        '-f <rules.json> [-P] [-n]'
+    print
+    print '  -f  json list of rules to apply'
+    print '  -P  prune - delete existing rules that are not in the file'
+    print '  -n  dry run - only print the changes'
+    print '  Credentials are read from K5_USERNAME, K5_PASSWORD,'
+    print '  K5_CONTRACT and K5_REGION.'
+
+
+def main():
+    """Summary - apply a ruleset file from the command line
+    """
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hp:g:f:Pn')
+    except getopt.GetoptError as err:
+        print err
+        usage()
+        sys.exit(2)
+    options = dict(opts)
+    if '-h' in options or not all(
+            option in options for option in ('-p', '-g', '-f')):
+        usage()
+        sys.exit(0 if '-h' in options else 2)
+
+    with open(options['-f']) as rules_file:
+        rules = json.load(rules_file)
+
+    region = os.getenv('K5_REGION', 'uk-1')
+    token = k5TokenCache.get_unscoped_token(
+        os.getenv('K5_USERNAME'), os.getenv('K5_PASSWORD'),
+        os.getenv('K5_CONTRACT'), region)
+    if isinstance(token, str) or token.status_code != 201:
+        print 'Unable to authenticate with K5 - check credentials'
+        sys.exit(1)
+    scoped = k5TokenCache.get_rescoped_token(
+        token.headers['X-Subject-Token'], options['-p'], region)
+    if isinstance(scoped, tuple) or scoped.status_code != 201:
+        print 'Unable to scope a token to project', options['-p']
+        sys.exit(1)
+
+    result = apply_ruleset(scoped.headers['X-Subject-Token'], options['-g'],
+                           rules, region, prune='-P' in options,
+                           dry_run='-n' in options)
+    for rule in result['created']:
+        print 'create', json.dumps(rule, sort_keys=True)
+    for rule_id in result['deleted']:
+        print 'delete', rule_id
+    for item, status in result['errors']:
+        print 'failed', item, status
+    print result['unchanged'], 'rules unchanged'
+    if result['errors']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/python
+"""Summary: Empty a K5 project by deleting its resources tier by tier
+
+    Resources can only be deleted once nothing depends on them. A subnet
+    with ports can't go, a router with interfaces can't go, and a volume
+    with snapshots can't go. Deleting them one at a time in a scripted
+    order spends most of its time waiting on each single delete.
+
+    teardown_project walks the tiers in dependency order:
+
+        stacks -> global ips -> servers -> router interfaces -> ports ->
+        routers -> subnets -> networks -> security groups -> keypairs ->
+        snapshots -> volumes
+
+    Every delete in a tier is sent concurrently on the shared thread pool.
+    The tier is then re-listed with backoff until the deleted resources
+    have gone, and only then does the next tier start. Networking
+    resources are filtered to the project's own tenant_id, so shared and
+    external networks are never touched.
+
+    Tuning via environment variables:
+        K5_TEARDOWN_DEADLINE - seconds to wait for a tier to drain
+                               (default 600)
+"""
+
+import getopt
+import os
+import sys
+import time
+
+import k5APIwrappersV19 as K5API
+import k5TokenCache
+from k5Parallel import parallel_map
+from k5Waiters import wait_until
+
+tier_deadline = float(os.getenv('K5_TEARDOWN_DEADLINE', '600'))
+
+# neutron owned ports that go away with their router, network or global ip
+AUTOMATIC_PORT_OWNERS = ('network:dhcp', 'network:router_gateway',
+                         'network:router_interface', 'network:floatingip')
+
+# a missing resource has already been deleted
+DELETED = (200, 202, 204, 404)
+
+# stack states that can be deleted without interrupting a build
+DELETABLE_STACKS = ('CREATE_COMPLETE', 'CREATE_FAILED', 'DELETE_FAILED')
+
+
+def _key(item):
+    return item.get('id') or item.get('name')
+
+
+def _status(response):
+    return getattr(response, 'status_code', response)
+
+
+def _project_networking(resource, project_id, region):
+    def list_items(k5token):
+        return list(K5API.iter_networking(
+            k5token, resource, region, params={'tenant_id': project_id}))
+    return list_items
+
+
+def _stacks(k5token, project_id, region):
+    response = K5API.list_heat_stacks(k5token, project_id, region)
+    if isinstance(response, tuple) or response.status_code != 200:
+        raise RuntimeError('list stacks - ' + str(_status(response)))
+    return response.json().get('stacks', [])
+
+
+def _delete_stack(k5token, stack, project_id, region):
+    status = stack.get('stack_status')
+    if status == 'DELETE_IN_PROGRESS':
+        return 202
+    if status not in DELETABLE_STACKS:
+        # still building - reported rather than interrupted
+        return status
+    return K5API.delete_heat_stack_by_id(k5token, stack.get('stack_name'),
+                                         stack.get('id'), project_id, region)
+
+
+def _keypairs(k5token, project_id, region):
+    response = K5API.list_keypairs(k5token, project_id, region)
+    if isinstance(response, tuple) or response.status_code != 200:
+        raise RuntimeError('list keypairs - ' + str(_status(response)))
+    return [keypair['keypair'] for keypair in response.json()['keypairs']]
+
+
+def tiers(project_id, region):
+    """Summary - the teardown tiers for a project in dependency order
+
+    Args:
+        project_id (string): project id
+        region (string): K5 region
+
+    Returns:
+        list: (name, list function taking a project scoped token,
+               delete function taking the token and an item,
+               predicate for items still present that need deleting again)
+    """
+    ports = _project_networking('ports', project_id, region)
+    return [
+        ('stacks',
+         lambda k5token: _stacks(k5token, project_id, region),
+         lambda k5token, stack: _delete_stack(k5token, stack, project_id,
+                                              region),
+         lambda stack: stack.get('stack_status') == 'DELETE_FAILED'),
+        ('global_ips',
+         _project_networking('floatingips', project_id, region),
+         lambda k5token, ip: K5API.delete_global_ip(k5token, ip['id'],
+                                                    region),
+         None),
+        ('servers',
+         lambda k5token: list(K5API.iter_servers(k5token, project_id,
+                                                 region)),
+         lambda k5token, server: K5API.delete_server(k5token, server['id'],
+                                                     project_id, region),
+         None),
+        ('router_interfaces',
+         lambda k5token: [port for port in ports(k5token)
+                          if port.get('device_owner') ==
+                          'network:router_interface'],
+         lambda k5token, port: K5API.remove_interface_from_router(
+             k5token, port['device_id'], port['id'], region),
+         None),
+        ('ports',
+         lambda k5token: [port for port in ports(k5token)
+                          if port.get('device_owner') not in
+                          AUTOMATIC_PORT_OWNERS],
+         lambda k5token, port: K5API.delete_port(k5token, port['id'],
+                                                 region),
+         None),
+        ('routers',
+         _project_networking('routers', project_id, region),
+         lambda k5token, router: K5API.delete_router(k5token, router['id'],
+                                                     region),
+         None),
+        ('subnets',
+         _project_networking('subnets', project_id, region),
+         lambda k5token, subnet: K5API.delete_subnet(k5token, subnet['id'],
+                                                     region),
+         None),
+        ('networks',
+         _project_networking('networks', project_id, region),
+         lambda k5token, network: K5API.delete_network(
+             k5token, network['id'], region),
+         None),
+        ('security_groups',
+         lambda k5token: [group for group in _project_networking(
+             'security-groups', project_id, region)(k5token)
+                          if group.get('name') != 'default'],
+         lambda k5token, group: K5API.delete_security_group(
+             k5token, group['id'], region),
+         None),
+        ('keypairs',
+         lambda k5token: _keypairs(k5token, project_id, region),
+         lambda k5token, keypair: K5API.delete_keypair(
+             k5token, keypair['name'], project_id, region),
+         None),
+        ('snapshots',
+         lambda k5token: list(K5API.iter_snapshots(k5token, project_id,
+                                                   region)),
+         lambda k5token, snapshot: K5API.delete_snapshot(
+             k5token, snapshot['id'], project_id, region),
+         lambda snapshot: snapshot.get('status') == 'error_deleting'),
+        ('volumes',
+         lambda k5token: list(K5API.iter_volumes(k5token, project_id,
+                                                 region)),
+         lambda k5token, volume: K5API.delete_volume(
+             k5token, volume['id'], project_id, region),
+         lambda volume: volume.get('status') == 'error_deleting'),
+    ]
+
+
+def plan_teardown(k5token, project_id, region):
+    """Summary - list what teardown_project would delete, without deleting
+    anything
+
+    Args:
+        k5token (string): project scoped token
+        project_id (string): project id
+        region (string): K5 region
+
+    Returns:
+        list: (tier name, [resource ids or names]) in deletion order
+    """
+    return [(name, [_key(item) for item in list_items(k5token)])
+            for name, list_items, delete, redelete
+            in tiers(project_id, region)]
+
+
+def _run_tier(k5token, list_items, delete, redelete, deadline, max_workers):
+    started = time.time()
+    items = list_items(k5token)
+
+    def delete_item(item):
+        try:
+            return _key(item), _status(delete(k5token, item))
+        except Exception:
+            return _key(item), repr(sys.exc_info()[1])
+
+    results = parallel_map(delete_item, items, max_workers)
+    errors = dict((key, status) for key, status in results
+                  if status not in DELETED)
+    pending = set(key for key, status in results if status in DELETED)
+    state = {'remaining': pending}
+
+    def drained():
+        present = dict((_key(item), item) for item in list_items(k5token))
+        state['remaining'] = pending & set(present)
+        if redelete is not None:
+            retry = [present[key] for key in state['remaining']
+                     if redelete(present[key])]
+            parallel_map(delete_item, retry, max_workers)
+        return not state['remaining']
+
+    if pending:
+        wait_until(drained, deadline)
+    return {'deleted': len(pending - state['remaining']),
+            'remaining': sorted(state['remaining']),
+            'errors': errors,
+            'seconds': round(time.time() - started, 3)}
+
+
+def teardown_project(k5token, project_id, region, deadline=None,
+                     max_workers=None, progress=None):
+    """Summary - delete every resource in a project, tier by tier, each
+    tier's deletes running concurrently
+
+    Args:
+        k5token (string): project scoped token
+        project_id (string): project id
+        region (string): K5 region
+        deadline (float): seconds to wait for each tier to drain, default
+        K5_TEARDOWN_DEADLINE
+        max_workers (int): deletes running at the same time
+        progress (function): called with (tier name, tier result) as each
+        tier finishes
+
+    Returns:
+        list: (tier name, {'deleted': n, 'remaining': [ids still present
+               at the deadline], 'errors': {id: status},
+               'seconds': elapsed}) in deletion order
+    """
+    deadline = tier_deadline if deadline is None else deadline
+    report = []
+    for name, list_items, delete, redelete in tiers(project_id, region):
+        try:
+            result = _run_tier(k5token, list_items, delete, redelete,
+                               deadline, max_workers)
+        except Exception:
+            result = {'deleted': 0, 'remaining': [],
+                      'errors': {name: repr(sys.exc_info()[1])},
+                      'seconds': 0}
+        report.append((name, result))
+        if progress is not None:
+            progress(name, result)
+    return report
+
+
+def usage():
+    print 'k5Teardown.py -p <project id> [-y] [-d <seconds>] [-w <workers>]'
+    print
+    print '  Deletes every resource in a K5 project. Without -y the'
+    print '  resources are only listed.'
+    print '  Credentials are read from K5_USERNAME, K5_PASSWORD,'
+    print '  K5_CONTRACT and K5_REGION.'
+
+
+def main():
+    """Summary - tear down a project from the command line
+    """
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hp:yd:w:')
+    except getopt.GetoptError as err:
+        print err
+        usage()
+        sys.exit(2)
+    options = dict(opts)
+    if '-h' in options or '-p' not in options:
+        usage()
+        sys.exit(0 if '-h' in options else 2)
+
+    region = os.getenv('K5_REGION', 'uk-1')
+    token = k5TokenCache.get_unscoped_token(
+        os.getenv('K5_USERNAME'), os.getenv('K5_PASSWORD'),
+        os.getenv('K5_CONTRACT'), region)
+    if isinstance(token, str) or token.status_code != 201:
+        print 'Unable to authenticate with K5 - check credentials'
+        sys.exit(1)
+    project_id = options['-p']
+    scoped = k5TokenCache.get_rescoped_token(
+        token.headers['X-Subject-Token'], project_id, region)
+    if isinstance(scoped, tuple) or scoped.status_code != 201:
+        print 'Unable to scope a token to project', project_id
+        sys.exit(1)
+    k5token = scoped.headers['X-Subject-Token']
+
+    if '-y' not in options:
+        for name, keys in plan_teardown(k5token, project_id, region):
+            print name, len(keys), ' '.join(keys)
+        print 'Dry run - rerun with -y to delete'
+        return
+
+    def progress(name, result):
+        print name, 'deleted', result['deleted'], 'in', \
+            result['seconds'], 'seconds'
+        for key in result['remaining']:
+            print '  still present', key
+        for key, status in sorted(result['errors'].items()):
+            print '  failed', key, status
+
+    workers = options.get('-w')
+    deadline = options.get('-d')
+    teardown_project(k5token, project_id, region,
+                     float(deadline) if deadline else None,
+                     int(workers) if workers else None, progress)
+
+
+if __name__ == "__main__":
+    main()
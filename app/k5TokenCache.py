@@ -0,0 +1,236 @@
+#!/usr/bin/python
+"""Summary: Expiry aware cache for K5 authentication tokens
+
+    Keystone tokens are valid for hours, but the portal used to mint fresh
+    regional, global and PaaS ID tokens with a username and password on
+    every request. The functions here have the same signatures as the
+    token wrappers in k5APIwrappersV19. They hand back the cached response
+    until it is close to its expires_at time, and only then authenticate
+    again.
+
+    Entries are keyed by (user, contract, region, scope). The key also
+    holds a digest of the password, so a wrong password can never be
+    answered from the cache. When several threads need the same missing
+    or expiring token at once, only one of them authenticates and the
+    others wait for its result. Expired entries are swept out at most
+    once a minute, so a long running portal doesn't keep a token for
+    every login it has ever seen. Logging out of the portal drops that
+    user's tokens.
+
+    Tuning via environment variables:
+        K5_TOKEN_REFRESH_MARGIN - seconds before expiry to refresh (default 300)
+        K5_IDTOKEN_TTL          - lifetime assumed for PaaS ID tokens, whose
+                                  expiry isn't returned (default 1800)
+"""
+
+import calendar
+import hashlib
+import os
+import threading
+import time
+
+import k5APIwrappersV19 as K5API
+
+refresh_margin = int(os.getenv('K5_TOKEN_REFRESH_MARGIN', '300'))
+idtoken_ttl = int(os.getenv('K5_IDTOKEN_TTL', '1800'))
+
+# seconds between sweeps of expired entries
+SWEEP_INTERVAL = 60
+
+
+def parse_expires_at(expires_at):
+    """Summary - convert a keystone expires_at timestamp to epoch seconds
+
+    Args:
+        expires_at (string): e.g. '2016-12-08T13:02:47.000000Z'
+
+    Returns:
+        float: seconds since the epoch (UTC)
+    """
+    stamp = expires_at.rstrip('Z').split('.')[0]
+    return calendar.timegm(time.strptime(stamp, '%Y-%m-%dT%H:%M:%S'))
+
+
+class TokenCache(object):
+    """Summary - thread safe store of token responses with their expiry
+    """
+
+    def __init__(self, margin=None):
+        self.margin = refresh_margin if margin is None else margin
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._swept = time.time()
+
+    def _fresh(self, entry):
+        return entry is not None and entry[1] - self.margin > time.time()
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _forget(self, key):
+        # caller holds self._lock - a key lock still in use is kept
+        self._entries.pop(key, None)
+        lock = self._key_locks.get(key)
+        if lock is not None and not lock.locked():
+            del self._key_locks[key]
+
+    def _sweep(self):
+        now = time.time()
+        with self._lock:
+            if self._swept + SWEEP_INTERVAL > now:
+                return
+            self._swept = now
+            for key, entry in self._entries.items():
+                if entry[1] <= now:
+                    self._forget(key)
+
+    def get(self, key, fetch):
+        """Summary - return the cached value for key, calling fetch to
+        (re)authenticate when it is missing or about to expire
+
+        Args:
+            key (tuple): cache key
+            fetch (function): returns (value, expires epoch) - an expiry of
+                None means the value is an error and must not be cached
+
+        Returns:
+            TYPE: cached or freshly fetched value
+        """
+        entry = self._entries.get(key)
+        if self._fresh(entry):
+            return entry[0]
+        self._sweep()
+        # only one thread per key re-authenticates, the rest wait on the
+        # lock and then pick up the token it stored
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if self._fresh(entry):
+                return entry[0]
+            value, expires = fetch()
+            if expires is not None:
+                self._entries[key] = (value, expires)
+            else:
+                self._entries.pop(key, None)
+            return value
+
+    def invalidate(self, user=None, contract=None):
+        """Summary - drop cached tokens, all of them or just one user's
+
+        Args:
+            user (string): K5 user name
+            contract (string): K5 contract name
+        """
+        with self._lock:
+            for key in self._entries.keys():
+                if user is None or key[:2] == (user, contract):
+                    self._forget(key)
+
+
+_cache = TokenCache()
+
+
+def _key(adminUser, adminPassword, contract, region, scope):
+    secret = adminPassword or ''
+    if isinstance(secret, unicode):
+        secret = secret.encode('utf-8')
+    digest = hashlib.sha256(secret).hexdigest()
+    return (adminUser, contract, region, scope, digest)
+
+
+def _keystone_fetch(call):
+    def fetch():
+        response = call()
+        try:
+            if response.status_code == 201:
+                return response, parse_expires_at(
+                    response.json()['token']['expires_at'])
+        except Exception:
+            pass
+        return response, None
+    return fetch
+
+
+def get_unscoped_token(adminUser, adminPassword, contract, region):
+    """Summary - cached version of K5API.get_unscoped_token
+
+    Returns:
+        TYPE: Regional UnScoped Token Object
+    """
+    return _cache.get(
+        _key(adminUser, adminPassword, contract, region, 'unscoped'),
+        _keystone_fetch(lambda: K5API.get_unscoped_token(
+            adminUser, adminPassword, contract, region)))
+
+
+def get_scoped_token(adminUser, adminPassword, contract, projectid, region):
+    """Summary - cached version of K5API.get_scoped_token
+
+    Returns:
+        Object: Regionally Scoped Project  Token Object
+    """
+    return _cache.get(
+        _key(adminUser, adminPassword, contract, region,
+             'project:' + projectid),
+        _keystone_fetch(lambda: K5API.get_scoped_token(
+            adminUser, adminPassword, contract, projectid, region)))
+
+
+def get_globally_scoped_token(adminUser, adminPassword, contract,
+                              defaultid, region):
+    """Summary - cached version of K5API.get_globally_scoped_token
+
+    Returns:
+        Python Object: Globally Project Scoped Object
+    """
+    return _cache.get(
+        _key(adminUser, adminPassword, contract, 'gls',
+             'project:' + defaultid),
+        _keystone_fetch(lambda: K5API.get_globally_scoped_token(
+            adminUser, adminPassword, contract, defaultid, region)))
+
+
+def get_rescoped_token(k5token, projectid, region):
+    """Summary - cached version of K5API.get_rescoped_token, keyed on a
+    digest of the token being rescoped
+
+    Returns:
+        STRING: Regionally Scoped Project  Token
+    """
+    return _cache.get(
+        _key(None, k5token, None, region, 'rescoped:' + projectid),
+        _keystone_fetch(lambda: K5API.get_rescoped_token(
+            k5token, projectid, region)))
+
+
+def get_unscoped_idtoken(adminUser, adminPassword, contract):
+    """Summary - cached version of K5API.get_unscoped_idtoken. The wrapper
+    only returns the token header so a fixed lifetime is assumed.
+
+    Returns:
+        TYPE: Central Identity Token Header
+    """
+    def fetch():
+        idtoken = K5API.get_unscoped_idtoken(adminUser, adminPassword,
+                                             contract)
+        if idtoken == 'ID Token Failure':
+            return idtoken, None
+        return idtoken, time.time() + idtoken_ttl
+
+    return _cache.get(
+        _key(adminUser, adminPassword, contract, 'paas', 'idtoken'), fetch)
+
+
+def invalidate(adminUser=None, contract=None):
+    """Summary - forget cached tokens, e.g. on logout or after a 401 from
+    K5
+
+    Args:
+        adminUser (string): only drop this user's tokens
+        contract (string): contract the user belongs to
+    """
+    _cache.invalidate(adminUser, contract)
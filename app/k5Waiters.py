@@ -0,0 +1,304 @@
+#!/usr/bin/python
+"""Summary: Wait until ready helpers with jittered exponential backoff
+
+    Users, groups and projects created through the central portal take a
+    variable time to appear in the regional K5 IaaS keystone. Onboarding
+    used to retry the role or group PUT every 5 seconds, 4 times at most.
+    That always cost a whole 5 seconds even when sync finished in a few
+    hundred milliseconds, and it gave up after 20 seconds when sync was
+    just slow.
+
+    wait_until polls a readiness check. The first delay is sub-second and
+    each later delay is doubled, with random jitter so that concurrent
+    onboarding threads don't poll in lock step, up to a cap. It gives up
+    at a deadline. retry_until does the same for a call whose result says
+    whether it worked. When given a cheap probe, such as a filtered
+    keystone lookup, it only repeats the expensive call once the probe
+    passes.
+
+    wait_for_states waits for many resources at once, for example servers
+    booting or stacks building. Each interval costs a single list call for
+    the whole batch, instead of one show call per resource. Every
+    resource resolves to a ready state, a failed state or its last seen
+    state at the deadline.
+
+    Tuning via environment variables:
+        K5_WAIT_INITIAL  - first delay in seconds (default 0.25)
+        K5_WAIT_MAX      - longest single delay in seconds (default 5)
+        K5_WAIT_DEADLINE - seconds before giving up (default 60)
+"""
+
+import os
+import random
+import time
+
+import k5APIwrappersV19 as K5API
+import k5Resolver
+
+initial_delay = float(os.getenv('K5_WAIT_INITIAL', '0.25'))
+max_delay = float(os.getenv('K5_WAIT_MAX', '5'))
+default_deadline = float(os.getenv('K5_WAIT_DEADLINE', '60'))
+
+
+def backoff_delays(initial=None, maximum=None, factor=2.0):
+    """Summary - endless series of jittered exponential delays. Each delay
+    is drawn between half and all of the current backoff step.
+
+    Args:
+        initial (float): first backoff step in seconds
+        maximum (float): largest backoff step in seconds
+        factor (float): growth of the backoff step per attempt
+
+    Returns:
+        generator: delays in seconds
+    """
+    step = initial_delay if initial is None else initial
+    maximum = max_delay if maximum is None else maximum
+    while True:
+        yield random.uniform(step / 2.0, step)
+        step = min(step * factor, maximum)
+
+
+def wait_until(check, deadline=None, initial=None, maximum=None,
+               on_retry=None, check_first=True):
+    """Summary - call check() until it returns a true value or the
+    deadline passes
+
+    Args:
+        check (function): readiness check, no arguments
+        deadline (float): seconds to keep trying
+        initial (float): first delay in seconds
+        maximum (float): longest single delay in seconds
+        on_retry (function): called with the attempt number before each
+        wait
+        check_first (bool): False to wait before the first check, when the
+        caller has just seen it fail
+
+    Returns:
+        TYPE: the last value returned by check - false if the deadline passed
+    """
+    deadline = default_deadline if deadline is None else deadline
+    stop_at = time.time() + deadline
+    attempt = 0
+    result = check() if check_first else None
+    for delay in backoff_delays(initial, maximum):
+        if result:
+            break
+        remaining = stop_at - time.time()
+        if remaining <= 0:
+            break
+        attempt = attempt + 1
+        if on_retry is not None:
+            on_retry(attempt)
+        time.sleep(min(delay, remaining))
+        result = check()
+    return result
+
+
+def retry_until(call, succeeded, probe=None, deadline=None, initial=None,
+                maximum=None, on_retry=None):
+    """Summary - call call() until succeeded(result) is true or the
+    deadline passes. If probe is given the call is only repeated once
+    probe() returns true, which keeps slow or rate limited calls off the
+    wire while the regional portal is still syncing.
+
+    Args:
+        call (function): the operation to perform, no arguments
+        succeeded (function): takes call's result and says if it worked
+        probe (function): optional cheap readiness check, no arguments
+        deadline (float): seconds to keep trying
+        initial (float): first delay in seconds
+        maximum (float): longest single delay in seconds
+        on_retry (function): called with the attempt number before each
+        wait
+
+    Returns:
+        TYPE: the last result of call
+    """
+    state = {'result': call()}
+
+    def check():
+        if succeeded(state['result']):
+            return True
+        if probe is not None and not probe():
+            return False
+        state['result'] = call()
+        return succeeded(state['result'])
+
+    if not succeeded(state['result']):
+        wait_until(check, deadline, initial, maximum, on_retry,
+                   check_first=False)
+    return state['result']
+
+
+def keystone_probe(k5token, region, contractid, objecttype, name):
+    """Summary - readiness probe that is true once a named keystone object
+    is visible in the region, using a server side ?name= filtered lookup
+
+    Args:
+        k5token (string): K5 regional domain scoped token
+        region (string): K5 region
+        contractid (string): K5 contract id
+        objecttype (string): users/groups/projects
+        name (string): object name
+
+    Returns:
+        function: probe taking no arguments
+    """
+    resolver = k5Resolver.get_resolver(region, contractid)
+    return lambda: resolver.lookup_remote(k5token, objecttype, name) != 'None'
+
+
+def all_of(*probes):
+    """Summary - combine probes, true when every one of them is true
+
+    Returns:
+        function: probe taking no arguments
+    """
+    return lambda: all(probe() for probe in probes)
+
+
+def wait_for_states(list_states, ids, ready, failed=(), deadline=None,
+                    initial=None, maximum=None, on_retry=None):
+    """Summary - poll a batched status listing until every resource has
+    reached a ready or failed state, or the deadline passes
+
+    Args:
+        list_states (function): no arguments, returns {id: status} for
+        the whole collection in one call - an exception counts as a missed
+        poll
+        ids (list): resource ids to wait for
+        ready (tuple): states that mean the resource is done
+        failed (tuple): states that mean the resource will never be ready
+        deadline (float): seconds to keep trying
+        initial (float): first delay in seconds
+        maximum (float): longest single delay in seconds
+        on_retry (function): called with the attempt number before each
+        wait
+
+    Returns:
+        dict: id -> last seen status, 'DELETED' if a resource is missing
+        from the listing - a status in neither ready nor failed, other than
+        DELETED, means the deadline passed
+    """
+    states = dict((resource_id, None) for resource_id in ids)
+    pending = set(states)
+    # a resource that has dropped out of the listing won't come back
+    terminal = tuple(ready) + tuple(failed) + ('DELETED',)
+
+    def check():
+        try:
+            current = list_states()
+        except Exception:
+            return False
+        for resource_id in list(pending):
+            states[resource_id] = current.get(resource_id, 'DELETED')
+            if states[resource_id] in terminal:
+                pending.discard(resource_id)
+        return not pending
+
+    if pending:
+        wait_until(check, deadline, initial, maximum, on_retry)
+    return states
+
+
+def _response_states(response, key, status):
+    if isinstance(response, tuple) or response.status_code != 200:
+        raise RuntimeError(key + ' - ' + str(
+            getattr(response, 'status_code', response)))
+    return dict((item.get('id'), item.get(status))
+                for item in response.json()[key])
+
+
+def server_states(k5token, project_id, region):
+    """Summary - status of every server in a project, one paginated list
+
+    Returns:
+        function: list_states for wait_for_states
+    """
+    return lambda: dict((server.get('id'), server.get('status')) for server
+                        in K5API.iter_servers(k5token, project_id, region))
+
+
+def volume_states(k5token, project_id, region):
+    """Summary - status of every volume in a project, one paginated list
+
+    Returns:
+        function: list_states for wait_for_states
+    """
+    return lambda: dict((volume.get('id'), volume.get('status')) for volume
+                        in K5API.iter_volumes(k5token, project_id, region))
+
+
+def stack_states(k5token, project_id, region):
+    """Summary - status of every heat stack in a project
+
+    Returns:
+        function: list_states for wait_for_states
+    """
+    return lambda: _response_states(
+        K5API.list_heat_stacks(k5token, project_id, region), 'stacks',
+        'stack_status')
+
+
+def vpn_connection_states(k5token, region):
+    """Summary - status of every ipsec site connection, projected down to
+    id and status
+
+    Returns:
+        function: list_states for wait_for_states
+    """
+    return lambda: _response_states(
+        K5API.list_ipsec_site_connections(k5token, region,
+                                          fields=['id', 'status']),
+        'ipsec_site_connections', 'status')
+
+
+def wait_for_servers(k5token, project_id, region, server_ids,
+                     ready=('ACTIVE',), failed=('ERROR',), deadline=None):
+    """Summary - wait for servers to boot, or pass ready=('SHUTOFF',) etc.
+    to wait for a server_action to finish
+
+    Returns:
+        dict: server id -> status as returned by wait_for_states
+    """
+    return wait_for_states(server_states(k5token, project_id, region),
+                           server_ids, ready, failed, deadline)
+
+
+def wait_for_volumes(k5token, project_id, region, volume_ids,
+                     ready=('available', 'in-use'), failed=('error',),
+                     deadline=None):
+    """Summary - wait for volumes to finish creating or attaching
+
+    Returns:
+        dict: volume id -> status as returned by wait_for_states
+    """
+    return wait_for_states(volume_states(k5token, project_id, region),
+                           volume_ids, ready, failed, deadline)
+
+
+def wait_for_stacks(k5token, project_id, region, stack_ids,
+                    ready=('CREATE_COMPLETE', 'UPDATE_COMPLETE'),
+                    failed=('CREATE_FAILED', 'UPDATE_FAILED'),
+                    deadline=None):
+    """Summary - wait for heat stacks to finish building
+
+    Returns:
+        dict: stack id -> status as returned by wait_for_states
+    """
+    return wait_for_states(stack_states(k5token, project_id, region),
+                           stack_ids, ready, failed, deadline)
+
+
+def wait_for_vpn_connections(k5token, region, connection_ids,
+                             ready=('ACTIVE',), failed=('ERROR',),
+                             deadline=None):
+    """Summary - wait for ipsec site connections to come up. A connection
+    whose peer is not answering stays DOWN until the deadline
+
+    Returns:
+        dict: connection id -> status as returned by wait_for_states
+    """
+    return wait_for_states(vpn_connection_states(k5token, region),
+                           connection_ids, ready, failed, deadline)
@@ -8,12 +8,16 @@
     Github: https://github.com/allthingscloud
     Blog: https://allthingscloud.eu
 """
-from flask import render_template, session, request, redirect, url_for, json
+from flask import render_template, session, request, redirect, url_for, json, \
+                  jsonify, abort, make_response
 from app import app
 import os
 import AddUserToProjectv3 as K5User
 #import k5APIwrappersV3 as K5API
-import k5APIwrappersV19 as K5API
+import k5TokenCache as K5Tokens
+import k5Jobs as K5Jobs
+import k5ContractReport as K5Report
+import k5ReportCache as K5ReportCache
 from functools import wraps
 #from k5APIwrappersV13 import upload_object_to_container, \
 #                        view_items_in_storage_container, download_item_in_storage_container
@@ -36,6 +40,39 @@ def login_required(f):
     return decorated_function
 
 
+def job_owner():
+    """Summary - identifies the portal admin that submitted a job so only
+        they can read its progress and results
+
+    """
+    return (session.get('contractid'), session.get('adminUser'))
+
+
+def contract_report():
+    """Summary - cached bubbles report payload for the session's contract.
+        A stale or missing report is rebuilt on a background thread with
+        the incremental contract scanner
+
+    """
+    adminUser = session['adminUser']
+    adminPassword = session['adminPassword']
+    contract = session['contract']
+    contractid = session['contractid']
+    region = session['region']
+
+    def regenerate():
+        regional_token = K5Tokens.get_unscoped_token(
+            adminUser, adminPassword, contract, region)
+        report, errors, rescanned = K5Report.refresh_contract_report(
+            regional_token.headers['X-Subject-Token'], contract, contractid,
+            region, K5ReportCache.state_path(contractid, region))
+        return report
+
+    return K5ReportCache.reports.get(
+        (contractid, region), regenerate,
+        lambda: K5Report.build_contract_report(contract, region, []))
+
+
 @app.route('/', methods=['GET', 'POST'])
 @app.route('/login', methods=['GET', 'POST'])
 def index():
@@ -51,12 +88,12 @@ def index():
         region = request.form.get('k5region', None)
         #print adminUser, adminPassword, contract, region
         try:
-            regional_token = K5API.get_unscoped_token(
+            regional_token = K5Tokens.get_unscoped_token(
                 adminUser, adminPassword, contract, region)
             #print regional_token
             #print regional_token.json()
             defaultid = regional_token.json()['token']['project'].get('id')
-            global_token = K5API.get_globally_scoped_token(
+            global_token = K5Tokens.get_globally_scoped_token(
              adminUser, adminPassword, contract, defaultid, region)
 
             if not isinstance(regional_token, str):
@@ -110,11 +147,13 @@ def adduser():
             defaultprjid = session['defaultprjid']
 
             try:
-                regional_token = K5API.get_unscoped_token(
+                # tokens are cached until shortly before they expire so
+                # repeat onboarding requests don't re-authenticate
+                regional_token = K5Tokens.get_unscoped_token(
                     adminUser, adminPassword, contract, region)
-                global_token = K5API.get_globally_scoped_token(
+                global_token = K5Tokens.get_globally_scoped_token(
                     adminUser, adminPassword, contract, defaultprjid, region)
-                id_token = K5API.get_unscoped_idtoken(
+                id_token = K5Tokens.get_unscoped_idtoken(
                     adminUser, adminPassword, contract)
             except:
                 return render_template('hello-flask-login.html',
@@ -126,60 +165,44 @@ def adduser():
             userProject = request.form.get('k5project', None)
             userProjectA = unicode(userProject) + unicode('a')
             userProjectB = unicode(userProject) + unicode('b')
-            try:
-                resultprojecta = K5User.adduser_to_K5(id_token,
-                                              newglobaltoken,
-                                              newregionaltoken,
-                                              contractid,
-                                              contract,
-                                              region,
-                                              email,
-                                              userProjectA)
-                resultprojectb = K5User.adduser_to_K5(id_token,
-                                              newglobaltoken,
-                                              newregionaltoken,
-                                              contractid,
-                                              contract,
-                                              region,
-                                              email,
-                                              userProjectB)
-                #print result
-            except:
-                return render_template('hello-flask-login.html',
-                                       title='K5 User Onboarding Portal (Demo)')
+            # onboarding runs as a background job so this request returns
+            # straight away - progress is read from /jobs/<id>
+            job = K5Jobs.onboarding_queue.submit(
+                                          K5User.adduser_to_K5_projects,
+                                          id_token,
+                                          newglobaltoken,
+                                          newregionaltoken,
+                                          contractid,
+                                          contract,
+                                          region,
+                                          email,
+                                          [userProjectA, userProjectB],
+                                          owner=job_owner())
 
-            if resultprojecta is not None:
-                #print result
-                session['newuserlogin'] = resultprojecta[2]
-                session['newuserpassword'] = resultprojecta[4]
-                session['newuserstatusa'] = resultprojecta[5]
-                session['newuserprojecta'] = userProjectA
-                session['newuserstatusb'] = resultprojectb[5]
-                session['newuserprojectb'] = userProjectB
-                session['newusercontract'] = contract
-                session['newuserregion'] = region
+            session['jobid'] = job.id
+            session['newuserprojecta'] = userProjectA
+            session['newuserprojectb'] = userProjectB
+            session['newusercontract'] = contract
+            session['newuserregion'] = region
 
+            if request.accept_mimetypes.best_match(
+                    ['text/html', 'application/json']) == 'application/json':
+                return jsonify(id=job.id,
+                               status_url=url_for('jobstatus',
+                                                  job_id=job.id)), 202
             return redirect(url_for('userstatus'))
         else:
             if request.form.get('Logout', None) == "Logout":
                 return redirect(url_for('logout'))
 
     if request.method == 'GET':
-        region = session['region']
-        defaultprjid = session['defaultprjid']
-        regionaltoken = session['regionaltoken']
-        # report_bubbles = json.dumps(download_item_in_storage_container(
-        #                     regionaltoken,
-        #                     defaultprjid,
-        #                     "Bubbles",
-        #                     "Bubbles.json", region).json())
-        report_bubbles = [{ "name": "Test"}]
-       #print "\n\n\nLoading JSON Details..................\n\n\n"
-       #print "The actual JSON File.................."
-       #print report_bubbles
+        # the report is served from /bubbles.json - asking for it here
+        # just starts a background refresh if it is stale so the chart
+        # is warm by the time it's opened
+        contract_report()
         return render_template('hello-flask-adduser.html',
                                title='K5 Add User',
-                               bubbles=report_bubbles)
+                               bubbles=url_for('bubbles'))
 
 
 @app.route('/userstatus', methods=['GET', 'POST'])
@@ -196,15 +219,36 @@ def userstatus():
                 return redirect(url_for('logout'))
 
     if request.method == 'GET':
-        username = session['newuserlogin']
-        userpassword = session['newuserpassword']
-        userstatusa = session['newuserstatusa']
+        job = K5Jobs.onboarding_queue.get(session.get('jobid'), job_owner())
+        if job is None:
+            return redirect(url_for('adduser'))
+
         userprojecta = session['newuserprojecta']
-        userstatusb = session['newuserstatusb']
         userprojectb = session['newuserprojectb']
         usercontract = session['newusercontract']
         usercontractid = session['contractid']
         userregion = session['newuserregion']
+
+        if job.state in ('queued', 'running'):
+            return render_template('hello-flask-result.html',
+                                   title='K5 New User Details',
+                                   refresh=3,
+                                   userstatus=('Onboarding in progress' +
+                                                    ' | Project 1 : ' + userprojecta +
+                                                    ' | Status : ' + job.projects.get(userprojecta, job.status) +
+                                                    ' | Project 2 : ' + userprojectb +
+                                                    ' | Status : ' + job.projects.get(userprojectb, job.status)))
+
+        if job.state == 'failed':
+            return render_template('hello-flask-result.html',
+                                   title='K5 New User Details',
+                                   userstatus=job.status)
+
+        resultprojecta, resultprojectb = job.result
+        username = resultprojecta[2]
+        userpassword = resultprojecta[4]
+        userstatusa = resultprojecta[5]
+        userstatusb = resultprojectb[5]
         return render_template('hello-flask-result.html',
                                title='K5 New User Details',
                                userstatus=( 'Username : ' + username +
@@ -218,6 +262,52 @@ def userstatus():
                                                     ' | Region : ' + userregion))
 
 
+@app.route('/jobs/<job_id>')
+@login_required
+def jobstatus(job_id):
+    """Summary - Report the progress of a background onboarding job as json
+
+    """
+    job = K5Jobs.onboarding_queue.get(job_id, job_owner())
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+
+@app.route('/bubbles.json')
+@login_required
+def bubbles():
+    """Summary - Serve the contract bubbles report from the in-process
+        cache, gzipped when the browser accepts it, answering
+        If-None-Match with 304
+
+    """
+    payload = contract_report()
+    use_gzip = 'gzip' in request.accept_encodings
+    etag = payload.gzip_etag if use_gzip else payload.etag
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(payload.gzipped if use_gzip
+                                 else payload.body)
+        response.headers['Content-Type'] = 'application/json'
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@app.route('/report')
+@login_required
+def report():
+    """Summary - Display the contract bubbles chart
+
+    """
+    return render_template('index.html')
+
+
 @app.route('/logout')
 @login_required
 def logout():
@@ -225,7 +315,8 @@ def logout():
 
 
     """
-    # remove session vars
+    # drop the user's cached K5 tokens and remove session vars
+    K5Tokens.invalidate(session.get('adminUser'), session.get('contract'))
     session.pop('regionaltoken', None)
     session.pop('globaltoken', None)
     session.pop('adminUser', None)
@@ -0,0 +1,86 @@
+"""Summary: iterate_k5_collection paging against fake K5 list services
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'app'))
+
+import k5APIwrappersV19 as K5API
+
+
+class FakeResponse(object):
+
+    def __init__(self, body):
+        self.status_code = 200
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeService(object):
+    """Summary - stands in for k5HTTPPool, serving a list of objects
+    either like keystone (limit and marker ignored, links.next null) or
+    like nova (limit and marker honoured, no next links)
+    """
+
+    def __init__(self, key, count, honours_marker):
+        self.key = key
+        self.items = [{'id': 'id%04d' % number} for number in range(count)]
+        self.honours_marker = honours_marker
+        self.calls = 0
+
+    def get(self, url, params=None, headers=None):
+        self.calls += 1
+        params = params or {}
+        if not self.honours_marker:
+            return FakeResponse({self.key: self.items,
+                                 'links': {'next': None}})
+        ids = [item['id'] for item in self.items]
+        start = ids.index(params['marker']) + 1 if 'marker' in params else 0
+        return FakeResponse(
+            {self.key: self.items[start:start + params['limit']]})
+
+
+class IterateK5CollectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.k5http = K5API.k5http
+
+    def tearDown(self):
+        K5API.k5http = self.k5http
+
+    def ids(self, service, **kwargs):
+        K5API.k5http = service
+        return [item['id'] for item in K5API.iterate_k5_collection(
+            'token', 'https://identity.uk-1.cloud.global.fujitsu.com/v3/users',
+            service.key, **kwargs)]
+
+    def test_keystone_listing_is_not_marker_paged(self):
+        service = FakeService('users', 250, honours_marker=False)
+        K5API.k5http = service
+        ids = [item['id'] for item in K5API.iter_keystoneobjects(
+            'token', 'uk-1', 'contract', 'users', limit=200)]
+        self.assertEqual(len(ids), 250)
+        self.assertEqual(len(set(ids)), 250)
+        self.assertEqual(service.calls, 1)
+
+    def test_repeated_page_is_dropped(self):
+        service = FakeService('users', 250, honours_marker=False)
+        ids = self.ids(service, limit=200)
+        self.assertEqual(len(ids), 250)
+        self.assertEqual(len(set(ids)), 250)
+        self.assertEqual(service.calls, 2)
+
+    def test_marker_paging(self):
+        service = FakeService('servers', 450, honours_marker=True)
+        ids = self.ids(service, limit=200)
+        self.assertEqual(ids, [item['id'] for item in service.items])
+        self.assertEqual(service.calls, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()